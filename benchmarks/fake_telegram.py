@@ -0,0 +1,307 @@
+"""
+תחליף מקומי ל-Client ול-Message של Pyrogram, לבדיקות עומס בלי טלגרם אמיתי
+
+הרשת מדומה: רוחב פס משותף להורדה ולהעלאה, השהיה לכל בקשה,
+שגיאות FloodWait וניתוקים באמצע הזרמה - לפי הסתברויות שנקבעות מראש.
+"""
+import os
+import random
+import asyncio
+import itertools
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from pyrogram.enums import ChatType
+from pyrogram.errors import FloodWait
+
+# stream_media עובד ביחידות של 1MB, כמו בטלגרם
+CHUNK_SIZE = 1024 * 1024
+
+# גודל חלק בהעלאה (כמו ב-services/upload_service)
+UPLOAD_PART_SIZE = 512 * 1024
+
+_ZERO_CHUNK = bytes(CHUNK_SIZE)
+
+
+class Link:
+    """ערוץ עם רוחב פס משותף - העברות במקביל מתחלקות ברוחב הפס לפי סדר הגעה"""
+
+    def __init__(self, bytes_per_second: float):
+        self.bytes_per_second = bytes_per_second
+        self._free_at = 0.0
+
+    async def transfer(self, size: int) -> None:
+        if self.bytes_per_second <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self._free_at = max(now, self._free_at) + size / self.bytes_per_second
+        await asyncio.sleep(self._free_at - now)
+
+
+@dataclass
+class NetworkStats:
+    requests: int = 0
+    flood_waits: int = 0
+    drops: int = 0
+    downloaded_bytes: int = 0
+    uploaded_bytes: int = 0
+
+
+class FakeNetwork:
+    """
+    מודל הרשת של טלגרם המדומה
+    - download_bps / upload_bps - רוחב פס כולל (בתים לשנייה) שמשותף לכל ההעברות
+    - latency - השהיה בשניות לכל בקשה
+    - flood_rate - הסתברות ל-FloodWait בכל בקשה, flood_seconds - משך ההמתנה
+      (כמו ב-Pyrogram, המתנה עד sleep_threshold שניות נבלעת בתוך הבקשה ולא מגיעה לקוד הבוט)
+    - drop_rate - הסתברות לניתוק בכל יחידת העברה (1MB בהורדה, חלק בהעלאה)
+    """
+
+    def __init__(self, download_bps: float, upload_bps: float, latency: float = 0.05,
+                 flood_rate: float = 0.0, flood_seconds: int = 3, drop_rate: float = 0.0,
+                 sleep_threshold: int = 10, seed: Optional[int] = None):
+        self.download = Link(download_bps)
+        self.upload = Link(upload_bps)
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.drop_rate = drop_rate
+        self.sleep_threshold = sleep_threshold
+        self.random = random.Random(seed)
+        self.stats = NetworkStats()
+
+    async def request(self) -> None:
+        """בקשה אחת לשרת: השהיה, ואולי FloodWait"""
+        self.stats.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.flood_rate and self.random.random() < self.flood_rate:
+            self.stats.flood_waits += 1
+            if self.flood_seconds > self.sleep_threshold:
+                raise FloodWait(value=self.flood_seconds)
+            await asyncio.sleep(self.flood_seconds)
+
+    def maybe_drop(self) -> None:
+        if self.drop_rate and self.random.random() < self.drop_rate:
+            self.stats.drops += 1
+            raise ConnectionError("החיבור נותק (מדומה)")
+
+
+@dataclass
+class FakeUser:
+    id: int
+
+
+@dataclass
+class FakeChat:
+    id: int
+    type: ChatType = ChatType.PRIVATE
+
+
+@dataclass
+class FakeFile:
+    file_name: str
+    file_size: int
+    file_unique_id: str
+    file_id: str
+    mime_type: str = 'video/mp4'
+
+
+class FakeMessage:
+    """הודעה מדומה עם התכונות והפעולות שהבוט משתמש בהן"""
+
+    def __init__(self, client: 'FakeClient', chat: FakeChat, from_user: FakeUser, message_id: int,
+                 text: str = '', video: Optional[FakeFile] = None, document: Optional[FakeFile] = None):
+        self._client = client
+        self.chat = chat
+        self.from_user = from_user
+        self.id = message_id
+        self.text = text
+        self.video = video
+        self.document = document
+        self.empty = False
+        self.deleted = False
+
+    @property
+    def command(self):
+        return self.text.split() if self.text.startswith('/') else None
+
+    async def reply(self, text: str, reply_markup=None, **kwargs) -> 'FakeMessage':
+        await self._client.network.request()
+        return self._client.new_message(self.chat, self._client.me, text=text)
+
+    reply_text = reply
+
+    async def reply_video(self, video: str, caption: str = '', **kwargs) -> 'FakeMessage':
+        # שליחה לפי file_id - טלגרם לא מעביר את הקובץ שוב
+        await self._client.network.request()
+        return self._client.new_message(self.chat, self._client.me, text=caption,
+                                        video=self._client.files.get(video))
+
+    async def edit_text(self, text: str, reply_markup=None, **kwargs) -> 'FakeMessage':
+        await self._client.network.request()
+        self.text = text
+        return self
+
+    async def delete(self) -> None:
+        await self._client.network.request()
+        self.deleted = True
+
+    async def download(self, file_name: str, progress=None, max_retries: int = 3) -> str:
+        """הורדה רגילה (לקבצים קטנים) - רצף אחד של stream_media, מההתחלה בכל ניסיון"""
+        file = self.video or self.document
+        for attempt in range(1, max_retries + 1):
+            downloaded = 0
+            try:
+                with open(file_name, 'wb') as output:
+                    async for chunk in self._client.stream_media(self):
+                        output.write(chunk)
+                        downloaded += len(chunk)
+                        if progress:
+                            await progress(downloaded, file.file_size)
+                return file_name
+            except ConnectionError:
+                if attempt == max_retries:
+                    raise
+                await asyncio.sleep(attempt)
+
+
+@dataclass
+class FakeCallbackQuery:
+    from_user: FakeUser
+    data: str
+    answers: list = field(default_factory=list)
+
+    async def answer(self, text: str = '', show_alert: bool = False) -> None:
+        self.answers.append(text)
+
+
+class FakeClient:
+    """
+    תחליף ל-Client של Pyrogram
+    מממש רק את מה שהבוט משתמש בו: stream_media, get_messages ויצירת הודעות
+    """
+
+    def __init__(self, network: FakeNetwork):
+        self.network = network
+        self.me = FakeUser(id=0)
+        self.messages: Dict[tuple, FakeMessage] = {}
+        self.files: Dict[str, FakeFile] = {}  # קבצים שהועלו, לפי file_id
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+
+    def new_message(self, chat: FakeChat, from_user: FakeUser, **kwargs) -> FakeMessage:
+        message = FakeMessage(self, chat, from_user, next(self._message_ids), **kwargs)
+        self.messages[(chat.id, message.id)] = message
+        return message
+
+    def new_file(self, file_name: str, file_size: int, mime_type: str = 'video/mp4',
+                 file_unique_id: Optional[str] = None) -> FakeFile:
+        number = next(self._file_ids)
+        return FakeFile(file_name=file_name, file_size=file_size, mime_type=mime_type,
+                        file_unique_id=file_unique_id or f"fake-uid-{number}", file_id=f"fake-file-{number}")
+
+    def user_message(self, user_id: int, file_name: str, file_size: int,
+                     file_unique_id: Optional[str] = None, as_document: bool = True) -> FakeMessage:
+        """
+        הודעה נכנסת ממשתמש עם קובץ וידאו
+        file_unique_id - אותו ערך לאותו תוכן (למשל קובץ שהועבר שוב), כמו בטלגרם
+        """
+        file = self.new_file(file_name, file_size, file_unique_id=file_unique_id)
+        chat = FakeChat(id=user_id)
+        if as_document:
+            return self.new_message(chat, FakeUser(id=user_id), document=file)
+        return self.new_message(chat, FakeUser(id=user_id), video=file)
+
+    async def get_messages(self, chat_id: int, message_ids: int):
+        message = self.messages.get((chat_id, message_ids))
+        if message is None:
+            message = FakeMessage(self, FakeChat(id=chat_id), FakeUser(id=chat_id), message_ids)
+            message.empty = True
+        return message
+
+    async def stream_media(self, message: FakeMessage, limit: int = 0, offset: int = 0):
+        """הזרמת הקובץ ביחידות של 1MB, עם רוחב פס, FloodWait וניתוקים"""
+        file = message.video or message.document
+        total_chunks = (file.file_size + CHUNK_SIZE - 1) // CHUNK_SIZE
+        last = total_chunks if not limit else min(total_chunks, offset + limit)
+
+        await self.network.request()
+        for index in range(offset, last):
+            size = min(CHUNK_SIZE, file.file_size - index * CHUNK_SIZE)
+            await self.network.download.transfer(size)
+            self.network.maybe_drop()
+            self.network.stats.downloaded_bytes += size
+            yield self._chunk(file, index, size)
+
+    @staticmethod
+    def _chunk(file: FakeFile, index: int, size: int) -> bytes:
+        if index:
+            return _ZERO_CHUNK[:size]
+        # תחילת הקובץ ייחודית לכל קובץ, כדי שטביעות האצבע לא יתנגשו
+        header = file.file_unique_id.encode()
+        return (header + _ZERO_CHUNK[len(header):])[:size]
+
+
+class FakeUploader:
+    """
+    תחליף ל-ParallelUploader: העלאה בחלקים במקביל על הרשת המדומה
+    חלק שנכשל נשלח שוב (עם המתנה קצרה), ו-FloodWait נכבד כמו בקוד האמיתי
+    """
+
+    def __init__(self, client: FakeClient, workers: int = 8, max_retries: int = 5):
+        self.client = client
+        self.workers = max(1, workers)
+        self.max_retries = max(1, max_retries)
+
+    async def send_video(self, chat_id, video: str, thumb: Optional[str] = None, duration: int = 0,
+                         width: int = 0, height: int = 0, caption: str = '',
+                         reply_to_message_id: Optional[int] = None, progress=None) -> FakeMessage:
+        network = self.client.network
+        file_size = os.path.getsize(video)
+        parts = asyncio.Queue()
+        for part in range((file_size + UPLOAD_PART_SIZE - 1) // UPLOAD_PART_SIZE):
+            parts.put_nowait(part)
+        uploaded = 0
+
+        async def worker() -> None:
+            nonlocal uploaded
+            while not parts.empty():
+                part = parts.get_nowait()
+                size = min(UPLOAD_PART_SIZE, file_size - part * UPLOAD_PART_SIZE)
+                await self._send_part(size)
+                uploaded += size
+                if progress:
+                    await progress(uploaded, file_size)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(min(self.workers, parts.qsize()) or 1)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        await network.request()
+        file = self.client.new_file(os.path.basename(video), file_size)
+        self.client.files[file.file_id] = file
+        return self.client.new_message(FakeChat(id=int(chat_id or 0), type=ChatType.SUPERGROUP),
+                                       self.client.me, text=caption, video=file)
+
+    async def _send_part(self, size: int) -> None:
+        network = self.client.network
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await network.request()
+                await network.upload.transfer(size)
+                network.maybe_drop()
+                network.stats.uploaded_bytes += size
+                return
+            except FloodWait as e:
+                await asyncio.sleep(e.value)
+            except ConnectionError:
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(0.5 * attempt)
+        raise ConnectionError("העלאת חלק נכשלה")
@@ -0,0 +1,361 @@
+"""
+בדיקת עומס מקצה לקצה מול טלגרם מדומה (benchmarks/fake_telegram.py)
+
+ההודעות עוברות דרך ה-handlers של main.py, VideoService ו-QueueService האמיתיים.
+הרשת מדומה (רוחב פס, השהיה, FloodWait, ניתוקים), וגם ffmpeg מדומה: ההמרה תופסת
+מקום במנהל תהליכי ffmpeg לזמן שמחושב לפי גודל הקובץ, כך שהתזמון נשמר.
+הכל רץ בתיקייה זמנית - מאגרי הנתונים של הבוט לא נגעים.
+
+שימוש:
+    python benchmarks/load_test.py [--users 20] [--files-per-user 2] [--arrival burst]
+        [--size-mb 32] [--download-mbps 40] [--upload-mbps 20] [--flood-rate 0.01]
+        [--set MAX_CONCURRENT_JOBS=5] [--json results.json] [--max-p95 120]
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import Counter, defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+MB = 1024 * 1024
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="בדיקת עומס של הבוט מול טלגרם מדומה")
+
+    traffic = parser.add_argument_group("תעבורה")
+    traffic.add_argument('--users', type=int, default=20, help="מספר משתמשים")
+    traffic.add_argument('--files-per-user', type=int, default=2, help="קבצים לכל משתמש")
+    traffic.add_argument('--arrival', choices=('burst', 'poisson'), default='burst',
+                         help="burst - קבוצות שמגיעות יחד, poisson - הגעה אקראית בקצב קבוע")
+    traffic.add_argument('--burst-size', type=int, default=10, help="קבצים בכל פרץ")
+    traffic.add_argument('--burst-interval', type=float, default=5.0, help="שניות בין פרצים")
+    traffic.add_argument('--rate', type=float, default=1.0, help="קבצים לשנייה (במצב poisson)")
+    traffic.add_argument('--size-mb', type=float, default=32, help="גודל קובץ חציוני (MB)")
+    traffic.add_argument('--size-sigma', type=float, default=0.8,
+                         help="פיזור לוג-נורמלי של הגדלים (0 = כל הקבצים באותו גודל)")
+    traffic.add_argument('--max-size-mb', type=float, default=512, help="גודל קובץ מקסימלי (MB)")
+    traffic.add_argument('--ext-mix', default='mp4=0.5,mkv=0.3,avi=0.2',
+                         help="התפלגות סוגי הקבצים, למשל mp4=0.5,mkv=0.3,avi=0.2")
+    traffic.add_argument('--duplicate-rate', type=float, default=0.0, help="חלק הקבצים שנשלחים שוב")
+    traffic.add_argument('--cancel-rate', type=float, default=0.0, help="חלק המשתמשים שמבטלים")
+    traffic.add_argument('--cancel-after', type=float, default=3.0, help="שניות עד הביטול")
+
+    network = parser.add_argument_group("רשת")
+    network.add_argument('--download-mbps', type=float, default=40, help="רוחב פס הורדה כולל (MB/s)")
+    network.add_argument('--upload-mbps', type=float, default=20, help="רוחב פס העלאה כולל (MB/s)")
+    network.add_argument('--latency', type=float, default=0.05, help="השהיה לכל בקשה (שניות)")
+    network.add_argument('--flood-rate', type=float, default=0.0, help="הסתברות ל-FloodWait בכל בקשה")
+    network.add_argument('--flood-seconds', type=int, default=3, help="משך FloodWait (שניות)")
+    network.add_argument('--drop-rate', type=float, default=0.0, help="הסתברות לניתוק בכל יחידת העברה")
+
+    ffmpeg = parser.add_argument_group("ffmpeg מדומה")
+    ffmpeg.add_argument('--remux-mbps', type=float, default=200, help="מהירות העתקת זרמים (MB/s)")
+    ffmpeg.add_argument('--transcode-mbps', type=float, default=8, help="מהירות קידוד מלא (MB/s)")
+    ffmpeg.add_argument('--thumbnail-seconds', type=float, default=0.3, help="זמן יצירת תמונה ממוזערת")
+    ffmpeg.add_argument('--bitrate-mbps', type=float, default=1.0, help="קצב וידאו לחישוב המשך (MB/s)")
+
+    run = parser.add_argument_group("הרצה")
+    run.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                     help="דריסת הגדרה מ-config/settings.py (למשל MAX_CONCURRENT_JOBS=5)")
+    run.add_argument('--disk-gb', type=float, default=200, help="גודל הדיסק המדומה (GB)")
+    run.add_argument('--timeout', type=float, default=3600, help="זמן מקסימלי לכל הבדיקה (שניות)")
+    run.add_argument('--seed', type=int, default=1, help="זרע אקראי (לשחזור)")
+    run.add_argument('--workdir', help="תיקיית עבודה (ברירת מחדל: תיקייה זמנית)")
+    run.add_argument('--keep', action='store_true', help="לא למחוק את תיקיית העבודה בסיום")
+    run.add_argument('--log-level', default='WARNING', help="רמת הלוג של הבוט")
+    run.add_argument('--json', help="שמירת התוצאות כ-JSON")
+    run.add_argument('--max-p95', type=float, help="כישלון אם p95 של זמן העבודה גבוה מזה (שניות)")
+    run.add_argument('--min-jobs-per-hour', type=float, help="כישלון אם התפוקה נמוכה מזה")
+    return parser.parse_args(argv)
+
+
+def parse_mix(text):
+    """'mp4=0.5,mkv=0.3' -> [('.mp4', 0.5), ('.mkv', 0.3)]"""
+    mix = []
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        mix.append(('.' + name.strip().lstrip('.'), float(weight or 1)))
+    return mix
+
+
+def build_traffic(args, rng):
+    """רשימת הגעות מסודרת לפי זמן: (שנייה, משתמש, שם קובץ, גודל, מזהה תוכן)"""
+    total = args.users * args.files_per_user
+    users = [1000 + index for index in range(args.users) for _ in range(args.files_per_user)]
+    rng.shuffle(users)
+    extensions, weights = zip(*parse_mix(args.ext_mix))
+
+    traffic = []
+    sent = []
+    clock = 0.0
+    for index in range(total):
+        if args.arrival == 'burst':
+            clock = (index // max(1, args.burst_size)) * args.burst_interval
+        elif index:
+            clock += rng.expovariate(args.rate)
+
+        if sent and rng.random() < args.duplicate_rate:
+            # אותו קובץ שוב (העברה של הודעה קיימת) - אותו שם ואותו תוכן
+            file_name, size, content_id = rng.choice(sent)
+        else:
+            size = args.size_mb * MB
+            if args.size_sigma:
+                size *= math.exp(rng.gauss(0, args.size_sigma))
+            size = int(min(max(size, 64 * 1024), args.max_size_mb * MB))
+            file_name = f"Load.Test.{index:05d}.2023.720p{rng.choices(extensions, weights)[0]}"
+            content_id = f"load-test-{index:05d}"
+            sent.append((file_name, size, content_id))
+        traffic.append((clock, users[index], file_name, size, content_id))
+    return traffic
+
+
+def prepare_environment(workdir, overrides):
+    """הגדרות שנקראות בזמן הייבוא של config.settings - חייב לרוץ לפני ייבוא הבוט"""
+    os.environ['DOWNLOAD_PATH'] = os.path.join(workdir, 'downloads')
+    os.environ['TRACE_LOG_FILE'] = os.path.join(workdir, 'trace.log')
+    os.environ['STREAMING_TRANSCODE'] = 'false'  # ההמרה בזרימה מריצה ffmpeg אמיתי
+    for override in overrides:
+        name, _, value = override.partition('=')
+        os.environ[name.strip()] = value.strip()
+    os.makedirs(os.environ['DOWNLOAD_PATH'], exist_ok=True)
+    os.makedirs(os.path.join(workdir, 'data'), exist_ok=True)
+
+
+def directory_size(path):
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+            except OSError:
+                pass
+    return total
+
+
+class SimulatedFFmpeg:
+    """
+    ffprobe/ffmpeg מדומים: כל המרה תופסת מקום במנהל התהליכים (ffmpeg_runner)
+    לזמן שמחושב לפי גודל הקובץ וסוג העבודה, ויוצרת קובץ יעד באותו גודל
+    """
+
+    def __init__(self, args):
+        self.args = args
+
+    async def _busy(self, seconds, priority):
+        from utils.ffmpeg_runner import ffmpeg_runner
+        await ffmpeg_runner.run(
+            [sys.executable, '-c', f"import time; time.sleep({max(0.0, seconds):.3f})"],
+            priority=priority
+        )
+
+    async def probe(self, file_path):
+        duration = os.path.getsize(file_path) / (self.args.bitrate_mbps * MB)
+        return {
+            'duration': int(duration), 'duration_exact': duration, 'width': 1280, 'height': 720,
+            'fps': 25.0, 'video_codec': 'h264', 'pix_fmt': 'yuv420p', 'audio_codec': 'aac', 'audio': True
+        }
+
+    async def convert(self, input_file, output_file, video_info=None, progress=None):
+        from utils.ffmpeg_runner import PRIORITY_NORMAL
+        from utils.conversion_planner import MODE_COPY, MODE_TRANSCODE
+        from services.admission_service import AdmissionController, KIND_REMUX
+        size = os.path.getsize(input_file)
+        mode = MODE_COPY if AdmissionController.job_kind(input_file) == KIND_REMUX else MODE_TRANSCODE
+        rate = self.args.remux_mbps if mode == MODE_COPY else self.args.transcode_mbps
+        await self._busy(size / (rate * MB), PRIORITY_NORMAL)
+        with open(output_file, 'wb') as output:
+            output.truncate(size)
+        return mode
+
+    async def thumbnail(self, input_file, thumbnail_file, duration=0, fingerprint=None):
+        from utils.ffmpeg_runner import PRIORITY_HIGH
+        await self._busy(self.args.thumbnail_seconds, PRIORITY_HIGH)
+        with open(thumbnail_file, 'wb') as output:
+            output.write(b'\xff\xd8\xff\xd9')
+        return thumbnail_file
+
+
+def summarize(values):
+    from tools.trace_report import percentile
+    if not values:
+        return {'count': 0, 'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 3),
+        'p50': round(percentile(values, 0.5), 3),
+        'p95': round(percentile(values, 0.95), 3),
+        'max': round(max(values), 3),
+    }
+
+
+def collect_results(trace_file, elapsed, network_stats):
+    from tools.trace_report import read_events, group_traces
+    traces = group_traces(read_events(trace_file)) if os.path.exists(trace_file) else {}
+
+    outcomes = Counter()
+    latencies = []
+    stages = defaultdict(list)
+    for trace in traces.values():
+        if 'end' not in trace:
+            outcomes['unfinished'] += 1
+            continue
+        outcome = trace['end'].get('outcome', 'unknown')
+        outcomes[outcome] += 1
+        if outcome == 'done':
+            latencies.append(trace['end'].get('duration', 0))
+        for span in trace['spans']:
+            stages[span['name']].append(span.get('duration', 0))
+
+    return {
+        'elapsed_seconds': round(elapsed, 3),
+        'outcomes': dict(outcomes),
+        'jobs_per_hour': round(outcomes['done'] / elapsed * 3600, 1) if elapsed else 0.0,
+        'latency': summarize(latencies),
+        'queue_wait': summarize(stages.get('queue_wait', [])),
+        'stages': {name: summarize(values) for name, values in sorted(stages.items())},
+        'network': vars(network_stats),
+    }, traces
+
+
+def print_results(results, traces):
+    from tools.trace_report import print_stage_breakdown
+    latency = results['latency']
+    queue_wait = results['queue_wait']
+    network = results['network']
+    print(f"זמן ריצה: {results['elapsed_seconds']:.1f}s")
+    print("תוצאות: " + ', '.join(f"{name}={count}" for name, count in sorted(results['outcomes'].items())))
+    print(f"תפוקה: {results['jobs_per_hour']:.1f} עבודות לשעה")
+    print(f"זמן עבודה מקצה לקצה: p50={latency['p50']:.1f}s p95={latency['p95']:.1f}s max={latency['max']:.1f}s")
+    print(f"המתנה בתור: p50={queue_wait['p50']:.1f}s p95={queue_wait['p95']:.1f}s max={queue_wait['max']:.1f}s")
+    print(f"רשת: {network['requests']} בקשות, {network['flood_waits']} FloodWait, {network['drops']} ניתוקים, "
+          f"{network['downloaded_bytes'] / MB:.0f}MB הורדה, {network['uploaded_bytes'] / MB:.0f}MB העלאה")
+    print_stage_breakdown(traces)
+
+
+async def run(args, workdir):
+    # הייבוא כאן ולא בראש הקובץ - ההגדרות נקראות מהסביבה שהוכנה קודם
+    import main as bot
+    from config import settings
+    from services import video_service as video_module
+    from services.download_service import ChunkedDownloader
+    from utils.file_id_store import file_id_store, content_index_store
+    from utils.job_store import job_store
+    from utils.janitor import janitor
+    from benchmarks.fake_telegram import FakeNetwork, FakeClient, FakeUploader, FakeCallbackQuery, FakeUser
+
+    logging.getLogger().setLevel(getattr(logging, args.log_level.upper(), logging.WARNING))
+
+    # מאגרי הנתונים בתיקיית העבודה
+    data_dir = os.path.join(workdir, 'data')
+    file_id_store.snapshot_file = os.path.join(data_dir, 'file_ids.yaml')
+    file_id_store.journal_file = os.path.join(data_dir, 'file_ids.journal')
+    content_index_store.snapshot_file = os.path.join(data_dir, 'content_index.yaml')
+    content_index_store.journal_file = os.path.join(data_dir, 'content_index.journal')
+    job_store.db_file = os.path.join(data_dir, 'jobs.db')
+    file_id_store.load()
+    content_index_store.load()
+    job_store.load()
+
+    # דיסק מדומה: המקום הפנוי יורד לפי מה שנמצא בתיקיית ההורדות
+    disk_bytes = int(args.disk_gb * 1024 * MB)
+    janitor.free_bytes = lambda path: max(0, disk_bytes - directory_size(settings.DOWNLOAD_PATH))
+
+    # ffmpeg מדומה
+    ffmpeg = SimulatedFFmpeg(args)
+    video_module.probe_video = ffmpeg.probe
+    video_module.convert_to_mp4 = ffmpeg.convert
+    video_module.create_thumbnail = ffmpeg.thumbnail
+
+    # טלגרם מדומה
+    network = FakeNetwork(
+        download_bps=args.download_mbps * MB, upload_bps=args.upload_mbps * MB, latency=args.latency,
+        flood_rate=args.flood_rate, flood_seconds=args.flood_seconds, drop_rate=args.drop_rate, seed=args.seed
+    )
+    client = FakeClient(network)
+    service = bot.video_service
+    service.app = client
+    service.downloader = ChunkedDownloader(client)
+    service.uploader = FakeUploader(client, settings.UPLOAD_PARALLEL_PARTS, settings.UPLOAD_MAX_RETRIES)
+    bot.user_service.is_user_allowed = lambda user_id: True
+
+    rng = random.Random(args.seed)
+    traffic = build_traffic(args, rng)
+    cancelling = {entry[1] for entry in traffic if rng.random() < args.cancel_rate}
+
+    async def cancel_later(user_id):
+        await asyncio.sleep(args.cancel_after)
+        await bot.handle_cancel_download(client, FakeCallbackQuery(FakeUser(user_id), f"cancel_download_{user_id}"))
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + args.timeout
+    handlers = []
+    for arrival, user_id, file_name, size, content_id in traffic:
+        delay = started + arrival - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        message = client.user_message(user_id, file_name, size, file_unique_id=content_id)
+        handlers.append(asyncio.create_task(bot.handle_video(client, message)))
+        if user_id in cancelling:
+            cancelling.discard(user_id)
+            handlers.append(asyncio.create_task(cancel_later(user_id)))
+    await asyncio.gather(*handlers)
+
+    # המתנה עד שהתור ומאגר העובדים מתרוקנים
+    # (כולל הורדות שנקטעו ומחכות לחזור לתור)
+    while ((len(service.queue_service) or service.worker_pool.active_jobs or service.scheduled_resumes)
+           and loop.time() < deadline):
+        await asyncio.sleep(0.2)
+    elapsed = loop.time() - started
+    if loop.time() >= deadline:
+        print(f"הבדיקה נעצרה אחרי {args.timeout:.0f} שניות - חלק מהעבודות לא הסתיימו", file=sys.stderr)
+    await janitor.drain()
+
+    return collect_results(settings.TRACE_LOG_FILE, elapsed, network.stats)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='video_bot_load_')
+    prepare_environment(workdir, args.set)
+
+    try:
+        wall_start = time.time()
+        results, traces = asyncio.run(run(args, workdir))
+        results['config'] = {key: value for key, value in vars(args).items() if key not in ('json', 'workdir')}
+        results['started_at'] = wall_start
+    finally:
+        if args.keep or args.workdir:
+            print(f"תיקיית העבודה נשמרה: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results, traces)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+    failed = False
+    if args.max_p95 is not None and results['latency']['p95'] > args.max_p95:
+        print(f"נכשל: p95={results['latency']['p95']:.1f}s גבוה מ-{args.max_p95:.1f}s", file=sys.stderr)
+        failed = True
+    if args.min_jobs_per_hour is not None and results['jobs_per_hour'] < args.min_jobs_per_hour:
+        print(f"נכשל: {results['jobs_per_hour']:.1f} עבודות לשעה, נדרש {args.min_jobs_per_hour:.1f}", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
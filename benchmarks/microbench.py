@@ -0,0 +1,302 @@
+"""
+מדידות ביצועים לפונקציות שרצות על כל הודעה: ניתוח שמות קבצים, בדיקת כפילויות, חיפוש ופעולות התור
+
+הנתונים סינתטיים וקבועים (זרע אקראי קבוע), כך שהמדידות ניתנות להשוואה בין הרצות.
+תוצאה אחת (מאגר תוצאות בסיס) נשמרת עם --save, והרצות הבאות מושוות אליה עם --compare.
+
+שימוש:
+    python benchmarks/microbench.py [--filter queue] [--store-sizes 10000,100000,1000000]
+        [--queue-depth 1000] [--save baseline.json] [--compare baseline.json] [--threshold 0.1]
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'microbench_baseline.json')
+
+# שמות סינתטיים בסגנון של קבצים שהבוט מקבל
+_WORDS = ['The', 'Last', 'Night', 'City', 'Of', 'Shadows', 'Return', 'Empire', 'Lost', 'Island',
+          'Dark', 'Star', 'Man', 'Story', 'Game', 'House', 'King', 'River', 'Fire', 'Ice']
+_QUALITIES = ['720p', '1080p', '480p', '2160p', '1080P', '360p', '']
+_SOURCES = ['WEB-DL', 'BluRay', 'HDTV', 'WEBRip', 'DVDRip', 'HDRip', 'CAM', '']
+_EXTENSIONS = ['.mkv', '.mp4', '.avi', '.mov', '.ts']
+
+
+def synthetic_names(count, seed=1):
+    rng = random.Random(seed)
+    names = []
+    for index in range(count):
+        title = rng.choice(['.', ' ', '_']).join(rng.sample(_WORDS, rng.randint(2, 5)))
+        parts = [title, str(rng.randint(1960, 2024))]
+        if rng.random() < 0.3:
+            parts.append(f"S{rng.randint(1, 12):02d}E{rng.randint(1, 24):02d}")
+        parts.extend(part for part in (rng.choice(_QUALITIES), rng.choice(_SOURCES)) if part)
+        if rng.random() < 0.2:
+            parts.append('x264-GROUP:"?"')
+        names.append('.'.join(parts) + f".{index}" + rng.choice(_EXTENSIONS))
+    return names
+
+
+def fake_message(message_id, user_id):
+    return SimpleNamespace(id=message_id, from_user=SimpleNamespace(id=user_id), chat=SimpleNamespace(id=user_id))
+
+
+class Bench:
+    """מדידה אחת: setup מחזיר פונקציה בלי ארגומנטים שמבצעת ops פעולות"""
+
+    def __init__(self, name, setup, ops, repeat=None):
+        self.name = name
+        self.setup = setup
+        self.ops = ops
+        self.repeat = repeat
+
+
+def measure(fn, ops, repeat, min_time):
+    """זמן לפעולה (ננו-שניות): כיול מספר הקריאות לכל דגימה, ואז repeat דגימות"""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - started) / (number * ops) * 1e9)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return {'best_ns': round(min(samples), 1), 'median_ns': round(statistics.median(samples), 1),
+            'ops': ops, 'calls': number, 'repeat': repeat}
+
+
+def build_store(workdir, size, names):
+    """מאגר מזהים עם size רשומות (נכתב כיומן ונטען דרך FileIdStore)"""
+    from utils.file_id_store import FileIdStore
+    snapshot = os.path.join(workdir, f"file_ids_{size}.yaml")
+    journal = os.path.join(workdir, f"file_ids_{size}.journal")
+    with open(journal, 'w', encoding='utf-8') as file:
+        for index in range(size):
+            key = names[index % len(names)] if index < len(names) else f"{index}.{names[index % len(names)]}"
+            file.write(json.dumps({'k': key, 'v': f"BAACAgQAAxkBAAI{index:012d}"}, ensure_ascii=False) + '\n')
+    store = FileIdStore(snapshot, journal, compact_threshold=10 ** 9)
+    store.load()
+    return store
+
+
+def collect_benchmarks(args, workdir):
+    from utils import helpers, file_handlers
+    from services import file_service
+    from services.queue_service import QueueService
+
+    names = synthetic_names(1000)
+    loop = asyncio.new_event_loop()
+    benches = []
+
+    def over_names(fn):
+        return lambda: [fn(name) for name in names]
+
+    benches += [
+        Bench('clean_filename[helpers]', lambda: over_names(helpers.clean_filename), len(names)),
+        Bench('clean_filename[file_handlers]', lambda: over_names(file_handlers.clean_filename), len(names)),
+        Bench('get_video_quality', lambda: over_names(file_handlers.get_video_quality), len(names)),
+        Bench('get_video_caption[helpers]', lambda: over_names(helpers.get_video_caption), len(names)),
+        Bench('get_video_caption[file_handlers]', lambda: over_names(file_handlers.get_video_caption), len(names)),
+    ]
+
+    # בדיקת כפילות לפי שם מול מאגרים בגדלים שונים (חצי מהשמות קיימים במאגר)
+    lookups = synthetic_names(500) + [f"missing.{name}" for name in synthetic_names(500, seed=2)]
+    for size in args.store_sizes:
+        def setup_lookup(size=size):
+            file_service.file_id_store = build_store(workdir, size, names)
+            return lambda: [file_service.check_existing_file(name) for name in lookups]
+
+        def setup_load(size=size):
+            from utils.file_id_store import FileIdStore
+            store = build_store(workdir, size, names)
+            snapshot, journal = store.snapshot_file, store.journal_file
+            del store
+            return lambda: FileIdStore(snapshot, journal).load()
+
+        benches.append(Bench(f'check_existing_file[{size}]', setup_lookup, len(lookups)))
+        benches.append(Bench(f'file_id_store.load[{size}]', setup_load, 1, repeat=3))
+
+    def setup_store_set():
+        store = build_store(workdir, min(args.store_sizes), names)
+        counter = iter(range(10 ** 9))
+        return lambda: [store.set(f"new.{next(counter)}.mkv", "BAACAgQAAxkBAAI") for _ in range(20)]
+
+    benches.append(Bench('file_id_store.set', setup_store_set, 20, repeat=3))
+
+    # חיפוש בספרייה: מילה אחת, כותרת + שנה, תחילית של מילה ואיכות
+    queries = ['night', 'lost island', 'empire 1999', 'sha', 'king 1080p web-dl', 'river s03']
+
+    def setup_search():
+        from utils.search_index import SearchIndex
+        index = SearchIndex()
+        index.build(build_store(workdir, min(args.store_sizes), names).items())
+        return lambda: [index.search(query) for query in queries]
+
+    benches.append(Bench(f'search_index.search[{min(args.store_sizes)}]', setup_search, len(queries)))
+
+    # פעולות התור בעומק queue_depth, מפוזר על users משתמשים
+    depth = args.queue_depth
+    users = max(1, depth // 10)
+    messages = [fake_message(index + 1, 1000 + index % users) for index in range(depth)]
+
+    def filled_queue():
+        queue = QueueService()
+
+        async def fill():
+            for message in messages:
+                await queue.add_to_queue(message)
+        loop.run_until_complete(fill())
+        return queue
+
+    def setup_add():
+        return filled_queue
+
+    def setup_pop_remove():
+        def cycle():
+            queue = filled_queue()
+
+            async def drain():
+                while len(queue):
+                    message = queue.pop_next()
+                    await queue.remove_from_queue(message.id, message.from_user.id)
+            loop.run_until_complete(drain())
+        return cycle
+
+    def setup_position():
+        queue = filled_queue()
+        ids = [message.id for message in random.Random(3).sample(messages, min(200, depth))]
+        return lambda: [queue.get_message_position(message_id) for message_id in ids]
+
+    def setup_cancel():
+        def cycle():
+            queue = filled_queue()
+
+            async def cancel_all():
+                for user_id in range(1000, 1000 + users):
+                    await queue.cancel_user_downloads(user_id)
+            loop.run_until_complete(cancel_all())
+        return cycle
+
+    benches += [
+        Bench(f'queue.add[{depth}]', setup_add, depth),
+        Bench(f'queue.fill+pop+remove[{depth}]', setup_pop_remove, depth),
+        Bench(f'queue.position[{depth}]', setup_position, min(200, depth)),
+        Bench(f'queue.fill+cancel[{depth}]', setup_cancel, depth),
+    ]
+    return benches
+
+
+def compare(results, baseline, threshold):
+    """השוואה לתוצאות הבסיס. מחזיר את רשימת המדידות שהאטו"""
+    regressions = []
+    print(f"\nהשוואה לבסיס ({baseline.get('meta', {}).get('created', '?')}), סף {threshold:.0%}:")
+    print(f"{'benchmark':<34} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, current in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            print(f"{name:<34} {'-':>12} {current['best_ns']:>12.1f} {'new':>9}")
+            continue
+        ratio = current['best_ns'] / base['best_ns'] if base['best_ns'] else 1.0
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  << איטי יותר'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = '  מהיר יותר'
+        print(f"{name:<34} {base['best_ns']:>12.1f} {current['best_ns']:>12.1f} {ratio - 1:>+8.1%}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="מדידות ביצועים לפונקציות החמות של הבוט")
+    parser.add_argument('--filter', help="הרצת מדידות ששמן מכיל את המחרוזת בלבד")
+    parser.add_argument('--store-sizes', default='10000,100000,1000000',
+                        help="גדלי מאגר המזהים (רשומות), מופרדים בפסיקים")
+    parser.add_argument('--queue-depth', type=int, default=1000, help="מספר הקבצים בתור")
+    parser.add_argument('--repeat', type=int, default=5, help="מספר דגימות לכל מדידה")
+    parser.add_argument('--min-time', type=float, default=0.2, help="זמן מינימלי לכל דגימה (שניות)")
+    parser.add_argument('--save', nargs='?', const=DEFAULT_BASELINE, help="שמירת התוצאות כבסיס")
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, help="השוואה לקובץ בסיס")
+    parser.add_argument('--threshold', type=float, default=0.10, help="האטה יחסית שנחשבת רגרסיה")
+    args = parser.parse_args(argv)
+    args.store_sizes = [int(size) for size in args.store_sizes.split(',') if size.strip()]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # הלוגים של הבוט לא נמדדים
+    logging.disable(logging.CRITICAL)
+
+    workdir = tempfile.mkdtemp(prefix='video_bot_bench_')
+    results = {}
+    try:
+        print(f"{'benchmark':<34} {'best ns/op':>12} {'median ns/op':>13} {'calls':>7}")
+        for bench in collect_benchmarks(args, workdir):
+            if args.filter and args.filter not in bench.name:
+                continue
+            fn = bench.setup()
+            result = measure(fn, bench.ops, bench.repeat or args.repeat, args.min_time)
+            results[bench.name] = result
+            print(f"{bench.name:<34} {result['best_ns']:>12.1f} {result['median_ns']:>13.1f} {result['calls']:>7}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    meta = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'store_sizes': args.store_sizes,
+        'queue_depth': args.queue_depth,
+    }
+
+    regressions = []
+    if args.compare:
+        if not os.path.exists(args.compare):
+            print(f"קובץ הבסיס לא נמצא: {args.compare}", file=sys.stderr)
+            return 2
+        with open(args.compare, 'r', encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump({'meta': meta, 'results': results}, file, ensure_ascii=False, indent=2)
+        print(f"\nהתוצאות נשמרו ב-{args.save}")
+
+    if regressions:
+        print(f"\nנמצאו {len(regressions)} מדידות איטיות יותר: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
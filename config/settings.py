@@ -17,9 +17,86 @@ TEMP_PATH = os.path.join(BASE_DIR, "temp")
 # הגדרות קבוצה
 TARGET_GROUP_ID = os.getenv("TARGET_GROUP_ID")
 
+# הגדרות עיבוד במקביל
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "3"))  # עבודות פעילות בו-זמנית
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "2"))        # הורדות במקביל
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))  # המרות במקביל
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))            # העלאות במקביל
+STATUS_DELETE_DELAY = float(os.getenv("STATUS_DELETE_DELAY", "3"))  # שניות עד מחיקת הודעת סטטוס שהסתיימה
+
+# הגדרות הורדה במקטעים
+DOWNLOAD_PARALLEL_PARTS = int(os.getenv("DOWNLOAD_PARALLEL_PARTS", "4"))  # קטעים שמורדים במקביל לכל קובץ
+DOWNLOAD_SEGMENT_MB = int(os.getenv("DOWNLOAD_SEGMENT_MB", "16"))          # גודל קטע (MB) בנקודת הביקורת
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "5"))        # ניסיונות חוזרים לכל קטע
+DOWNLOAD_RESUME_ATTEMPTS = int(os.getenv("DOWNLOAD_RESUME_ATTEMPTS", "5"))      # החזרות אוטומטיות לתור אחרי שגיאת רשת
+DOWNLOAD_RESUME_BACKOFF = float(os.getenv("DOWNLOAD_RESUME_BACKOFF", "60"))     # המתנה (שניות) לפני ההחזרה הראשונה, מוכפלת בכל ניסיון
+DOWNLOAD_RESUME_MAX_BACKOFF = float(os.getenv("DOWNLOAD_RESUME_MAX_BACKOFF", "900"))  # המתנה מקסימלית בין ניסיונות
+
+# הגדרות העלאה בחלקים
+UPLOAD_PARALLEL_PARTS = int(os.getenv("UPLOAD_PARALLEL_PARTS", "8"))  # חלקים שנשלחים במקביל לכל קובץ
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "5"))        # ניסיונות חוזרים לכל חלק
+
+# הגדרות המרה
+FFMPEG_PRESET = os.getenv("FFMPEG_PRESET", "veryfast")  # preset של libx264 בקידוד מלא
+FFMPEG_CRF = int(os.getenv("FFMPEG_CRF", "23"))          # איכות קידוד (נמוך = איכות גבוהה)
+
+# הגדרות מנהל תהליכי ffmpeg
+_CPU_COUNT = os.cpu_count() or 2
+FFMPEG_THREADS = int(os.getenv("FFMPEG_THREADS", str(max(1, _CPU_COUNT // 2))))  # threads לכל תהליך
+FFMPEG_MAX_PROCESSES = int(os.getenv("FFMPEG_MAX_PROCESSES", str(max(2, _CPU_COUNT // max(1, FFMPEG_THREADS)))))  # תהליכים במקביל
+FFMPEG_NICE = int(os.getenv("FFMPEG_NICE", "10"))                       # עדיפות מערכת להמרות (0 = ללא)
+FFMPEG_TIMEOUT = int(os.getenv("FFMPEG_TIMEOUT", str(6 * 3600)))         # זמן מקסימלי להמרה בשניות
+FFMPEG_THUMBNAIL_TIMEOUT = int(os.getenv("FFMPEG_THUMBNAIL_TIMEOUT", "120"))  # זמן מקסימלי לתמונה ממוזערת
+FFPROBE_TIMEOUT = int(os.getenv("FFPROBE_TIMEOUT", "60"))                # זמן מקסימלי לבדיקת קובץ
+
+# הגדרות תמונות ממוזערות
+THUMBNAIL_MAX_SIZE = 320  # מגבלת טלגרם לרוחב/גובה של תמונה ממוזערת
+THUMBNAIL_MIN_LUMA = int(os.getenv("THUMBNAIL_MIN_LUMA", "24"))  # בהירות ממוצעת מינימלית (0-255) - מתחת לזה הפריים נחשב שחור
+THUMBNAIL_CACHE_DIR = os.path.join(TEMP_PATH, "thumbs")  # מטמון תמונות לפי טביעת האצבע של התוכן
+THUMBNAIL_CACHE_MAX_FILES = int(os.getenv("THUMBNAIL_CACHE_MAX_FILES", "1000"))  # מספר התמונות המקסימלי במטמון
+
+# המרה בזרימה - הפעלת ffmpeg כבר בזמן ההורדה (כבוי כברירת מחדל)
+STREAMING_TRANSCODE = os.getenv("STREAMING_TRANSCODE", "false").lower() in ("1", "true", "yes")
+STREAMABLE_EXTENSIONS = ('.ts', '.mts', '.mkv', '.webm', '.flv', '.mpg')
+
 # הגדרות קבצים
 FILE_IDS_FILE = os.path.join(BASE_DIR, "data", "file_ids.yaml")
+FILE_IDS_JOURNAL_FILE = os.path.join(BASE_DIR, "data", "file_ids.journal")
+CONTENT_INDEX_FILE = os.path.join(BASE_DIR, "data", "content_index.yaml")
+CONTENT_INDEX_JOURNAL_FILE = os.path.join(BASE_DIR, "data", "content_index.journal")
+FILE_IDS_COMPACT_THRESHOLD = int(os.getenv("FILE_IDS_COMPACT_THRESHOLD", "1000"))  # רשומות ביומן לפני דחיסה
 USERS_FILE = os.path.join(BASE_DIR, "data", "allowed_users.yaml")
+USERS_RELOAD_INTERVAL = float(os.getenv("USERS_RELOAD_INTERVAL", "5"))  # שניות בין בדיקות שינוי של קובץ המשתמשים (0 = כבוי)
+JOBS_DB_FILE = os.path.join(BASE_DIR, "data", "jobs.db")  # מאגר העבודות שלא הסתיימו
+
+# ניקוי קבצים ושמירה על מקום פנוי בדיסק
+JANITOR_MAX_RETRIES = int(os.getenv("JANITOR_MAX_RETRIES", "5"))      # ניסיונות מחיקה לכל קובץ
+JANITOR_RETRY_DELAY = float(os.getenv("JANITOR_RETRY_DELAY", "2"))    # שניות בין ניסיונות
+MIN_FREE_DISK_BYTES = int(os.getenv("MIN_FREE_DISK_BYTES", str(5 * 1024 ** 3)))  # מתחת לזה לא מתחילים עבודות חדשות
+DISK_CHECK_INTERVAL = float(os.getenv("DISK_CHECK_INTERVAL", "30"))   # בדיקה חוזרת כשהקבלה מושהית
+STALLED_JOB_MAX_AGE = float(os.getenv("STALLED_JOB_MAX_AGE", str(24 * 3600)))  # אחרי כמה שניות בלי התקדמות עבודה שנקטעה נמחקת
+
+# בקרת קבלה ועומס
+MAX_FILE_SIZE_BYTES = int(os.getenv("MAX_FILE_SIZE_BYTES", str(4 * 1024 ** 3)))      # קובץ גדול מזה נדחה
+MAX_INFLIGHT_BYTES = int(os.getenv("MAX_INFLIGHT_BYTES", str(20 * 1024 ** 3)))       # בתים בדיסק לכל העבודות הפעילות
+MAX_QUEUED_CPU_SECONDS = int(os.getenv("MAX_QUEUED_CPU_SECONDS", str(12 * 3600)))   # זמן המרה משוער מקסימלי בתור
+# מהירויות התחלתיות להערכת זמנים (בתים לשנייה), מתעדכנות לפי מדידות בפועל
+EST_DOWNLOAD_BPS = int(os.getenv("EST_DOWNLOAD_BPS", str(10 * 1024 * 1024)))
+EST_UPLOAD_BPS = int(os.getenv("EST_UPLOAD_BPS", str(5 * 1024 * 1024)))
+EST_REMUX_BPS = int(os.getenv("EST_REMUX_BPS", str(100 * 1024 * 1024)))
+EST_TRANSCODE_BPS = int(os.getenv("EST_TRANSCODE_BPS", str(2 * 1024 * 1024)))
+
+# נקודת הקצה של המדדים (0 = כבוי)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# קובץ המעקב אחרי עבודות (שורת JSON לכל אירוע, ריק = כבוי)
+TRACE_LOG_FILE = os.getenv("TRACE_LOG_FILE", os.path.join(BASE_DIR, "data", "trace.log"))
+
+# חיפוש בספרייה (/search ומצב inline)
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "10"))            # מספר התוצאות בפקודת /search
+SEARCH_INLINE_RESULTS = int(os.getenv("SEARCH_INLINE_RESULTS", "20"))      # מספר התוצאות בחיפוש inline (עד 50)
+SEARCH_INLINE_CACHE_TIME = int(os.getenv("SEARCH_INLINE_CACHE_TIME", "30"))  # זמן שמירת תשובת inline בשרתי טלגרם (שניות)
 
 # הגדרות קבצים
 AUTH_CONFIG_FILE = os.path.join(BASE_DIR, 'config', 'authorized_users.yaml')
@@ -36,10 +113,10 @@ VIDEO_FORMATS = {
     ]
 }
 
-# מזהה מנהל הבוט
-ADMIN_USER_ID = "1681880347"  # שנה למזהה שלך
+# מזהה מנהל הבוט - תמיד מנהל, גם אם לא מופיע בקובץ המשתמשים
+ADMIN_USER_ID = os.getenv("ADMIN_USER_ID", "1681880347")  # שנה למזהה שלך
 
 # יצירת תיקיות נדרשות
-for path in [DOWNLOAD_PATH, TEMP_PATH, os.path.dirname(FILE_IDS_FILE), os.path.dirname(AUTH_CONFIG_FILE)]:
+for path in [DOWNLOAD_PATH, TEMP_PATH, THUMBNAIL_CACHE_DIR, os.path.dirname(FILE_IDS_FILE), os.path.dirname(AUTH_CONFIG_FILE)]:
     if not os.path.exists(path):
         os.makedirs(path)
@@ -9,6 +9,10 @@ class CommandHandler:
     def __init__(self, app: Client, user_service: UserService):
         self.app = app
         self.user_service = user_service
+        # מנהלים לפי רשימת המשתמשים (כולל ADMIN_USER_ID), אותה בדיקה כמו ב-/update
+        self.admin_only = filters.create(
+            lambda _, __, message: bool(message.from_user) and self.user_service.is_admin(message.from_user.id)
+        )
         self._register_handlers()
         
     def _register_handlers(self):
@@ -64,7 +68,7 @@ class CommandHandler:
                 "📅 **גרסה:** 2.0.0\n"
             )
             
-        @self.app.on_message(filters.command(["adduser", "removeuser"]) & filters.user(1681880347))
+        @self.app.on_message(filters.command(["adduser", "removeuser"]) & self.admin_only)
         async def manage_users(client: Client, message: Message):
             """טיפול בפקודות ניהול משתמשים"""
             try:
@@ -85,12 +89,12 @@ class CommandHandler:
                 else:
                     await message.reply_text(f"❌ משתמש {user_id} לא נמצא במערכת")
                     
-        @self.app.on_message(filters.command("users") & filters.user(1681880347))
+        @self.app.on_message(filters.command("users") & self.admin_only)
         async def list_users(client: Client, message: Message):
             """הצגת רשימת משתמשים מורשים"""
-            users = self.user_service.get_allowed_users()
+            users = self.user_service.get_users()
             if users:
-                users_text = "\n".join([f"• `{user}`" for user in users])
+                users_text = "\n".join([f"• `{user}` ({role})" for user, role in sorted(users.items())])
                 await message.reply_text(
                     f"👥 **משתמשים מורשים:**\n\n{users_text}\n\n"
                     f"סה\"כ: {len(users)} משתמשים"
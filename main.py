@@ -1,10 +1,19 @@
 import os
+import asyncio
 import logging
-from pyrogram import Client, filters
-from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from config.settings import API_ID, API_HASH, BOT_TOKEN, DOWNLOAD_PATH, TARGET_GROUP_ID, ADMIN_USER_ID
+from pyrogram import Client, filters, idle
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, InlineQueryResultCachedVideo
+from config.settings import (
+    API_ID, API_HASH, BOT_TOKEN, DOWNLOAD_PATH, TARGET_GROUP_ID, METRICS_HOST, METRICS_PORT, USERS_RELOAD_INTERVAL,
+    SEARCH_MAX_RESULTS, SEARCH_INLINE_RESULTS, SEARCH_INLINE_CACHE_TIME
+)
 from services.video_service import VideoService
-from services.user_service import UserService
+from services.user_service import UserService, ROLES
+from utils.file_id_store import file_id_store, content_index_store
+from utils.job_store import job_store
+from utils.metrics import start_metrics_server, SEARCH_SECONDS
+from utils.search_index import search_index
+from utils.helpers import get_video_caption
 
 # הגדרת הלוגר
 logging.basicConfig(
@@ -42,20 +51,20 @@ async def handle_video(client, message):
 @app.on_message(filters.private & filters.command("update"))
 async def update_users(client, message):
     """עדכון רשימת המשתמשים המורשים"""
-    user_id_str = str(message.from_user.id)
-    if user_id_str != ADMIN_USER_ID:
+    if not user_service.is_admin(message.from_user.id):
         await message.reply_text("אין לך הרשאה לעדכן את רשימת המשתמשים. 🚫")
         return
 
     try:
-        # קבלת רשימת המשתמשים החדשה
+        # קבלת רשימת המשתמשים החדשה, עם תפקיד אופציונלי בהתחלה (/update admin 123 456)
         new_users = message.text.split()[1:]
+        role = new_users.pop(0) if new_users and new_users[0] in ROLES else None
         if not new_users:
             await message.reply_text("אנא ציין רשימת מזהי משתמשים לעדכון.")
             return
 
-        # עדכון רשימת המשתמשים
-        added_count, invalid_ids = user_service.add_users(','.join(new_users))
+        # עדכון רשימת המשתמשים - כתיבה אחת לקובץ לכל הרשימה
+        added_count, invalid_ids = user_service.add_users(','.join(new_users), role=role)
         
         # יצירת הודעת תשובה
         response = f"נוספו {added_count} משתמשים בהצלחה."
@@ -87,6 +96,111 @@ async def handle_cancel_download(client, callback_query):
         logging.error(f"שגיאה בביטול ההורדה: {e}")
         await callback_query.answer("אירעה שגיאה בביטול ההורדה", show_alert=True)
 
+@app.on_callback_query(filters.regex("^resume_download_"))
+async def handle_resume_download(client, callback_query):
+    """טיפול בלחיצה על כפתור המשך הורדה שנקטעה"""
+    try:
+        # חילוץ מזהה הצ'אט ומזהה ההודעה מה-callback_data
+        chat_id, message_id = map(int, callback_query.data.split('_')[-2:])
+
+        if await video_service.retry_download(callback_query.from_user.id, chat_id, message_id):
+            await callback_query.answer("ההורדה חוזרת לתור וממשיכה מאותה נקודה 🔄", show_alert=True)
+        else:
+            await callback_query.answer("ההורדה הזו כבר לא ממתינה להמשך", show_alert=True)
+
+    except Exception as e:
+        logging.error(f"שגיאה בהמשך ההורדה: {e}")
+        await callback_query.answer("אירעה שגיאה בהמשך ההורדה", show_alert=True)
+
+@app.on_message(filters.command("search"))
+async def search_library(client, message):
+    """חיפוש בקבצים שכבר הועלו - שליחה לפי file_id, בלי הורדה והמרה"""
+    if not user_service.is_user_allowed(str(message.from_user.id)):
+        await message.reply_text("אין לך הרשאה להשתמש בבוט זה. 🚫")
+        return
+
+    query = ' '.join(message.command[1:]).strip()
+    if not query:
+        await message.reply_text("שימוש: /search <שם הסרט או הסדרה> (אפשר להוסיף שנה, S01E02 או 1080p)")
+        return
+
+    with SEARCH_SECONDS.time(mode='command'):
+        hits = search_index.search(query, SEARCH_MAX_RESULTS)
+    if not hits:
+        await message.reply_text(f"לא נמצאו קבצים עבור \"{query}\". 🔍")
+        return
+
+    if len(hits) == 1:
+        await message.reply_video(hits[0].file_id, caption=get_video_caption(hits[0].file_name))
+        return
+
+    buttons = [
+        [InlineKeyboardButton(
+            f"{hit.info.display_name} {hit.quality}".strip(), callback_data=f"search_send_{hit.key}"
+        )]
+        for hit in hits
+    ]
+    await message.reply_text(
+        f"נמצאו {len(hits)} קבצים עבור \"{query}\" - בחר קובץ לשליחה:",
+        reply_markup=InlineKeyboardMarkup(buttons)
+    )
+
+@app.on_callback_query(filters.regex("^search_send_"))
+async def handle_search_send(client, callback_query):
+    """שליחת קובץ שנבחר מתוצאות החיפוש"""
+    if not user_service.is_user_allowed(str(callback_query.from_user.id)):
+        await callback_query.answer("אין לך הרשאה להשתמש בבוט זה. 🚫", show_alert=True)
+        return
+
+    hit = search_index.get(callback_query.data[len('search_send_'):])
+    if hit is None:
+        await callback_query.answer("הקובץ לא נמצא, נסה לחפש שוב", show_alert=True)
+        return
+
+    try:
+        await callback_query.message.reply_video(hit.file_id, caption=get_video_caption(hit.file_name))
+        await callback_query.answer()
+    except Exception as e:
+        logging.error(f"שגיאה בשליחת תוצאת חיפוש {hit.file_name}: {e}")
+        await callback_query.answer("אירעה שגיאה בשליחת הקובץ", show_alert=True)
+
+@app.on_inline_query()
+async def inline_search(client, inline_query):
+    """חיפוש inline (@bot שם) - התוצאות נשלחות כסרטונים שמורים לפי file_id"""
+    if not user_service.is_user_allowed(str(inline_query.from_user.id)):
+        await inline_query.answer([], cache_time=SEARCH_INLINE_CACHE_TIME, is_personal=True)
+        return
+
+    with SEARCH_SECONDS.time(mode='inline'):
+        hits = search_index.search(inline_query.query, SEARCH_INLINE_RESULTS)
+    results = [
+        InlineQueryResultCachedVideo(
+            video_file_id=hit.file_id,
+            title=hit.info.display_name,
+            id=hit.key,
+            description=hit.quality or None,
+            caption=get_video_caption(hit.file_name)
+        )
+        for hit in hits
+    ]
+    # is_personal - התשובה תלויה בהרשאות של המשתמש ולא נשמרת לאחרים
+    await inline_query.answer(results, cache_time=SEARCH_INLINE_CACHE_TIME, is_personal=True)
+
+async def main():
+    """הפעלת הבוט והמשך עבודות שלא הסתיימו לפני העצירה הקודמת"""
+    file_id_store.load()
+    content_index_store.load()
+    search_index.attach(file_id_store)
+    job_store.load()
+    video_service.sweep_orphans()
+    await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    users_watcher = asyncio.create_task(user_service.watch(USERS_RELOAD_INTERVAL))
+    await app.start()
+    await video_service.resume_jobs()
+    await idle()
+    users_watcher.cancel()
+    await app.stop()
+
 if __name__ == "__main__":
     logging.info("מתחיל את הבוט")
-    app.run()
+    app.run(main())
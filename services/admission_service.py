@@ -0,0 +1,185 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from config.settings import (
+    MAX_FILE_SIZE_BYTES, MAX_INFLIGHT_BYTES, MAX_QUEUED_CPU_SECONDS, MAX_CONCURRENT_JOBS,
+    EST_DOWNLOAD_BPS, EST_UPLOAD_BPS, EST_REMUX_BPS, EST_TRANSCODE_BPS
+)
+from utils.janitor import janitor
+from utils.conversion_planner import MODE_TRANSCODE
+
+# סוגי עבודה לפי המכולה (הקודקים עצמם ידועים רק אחרי ההורדה)
+KIND_MP4 = 'mp4'              # ללא המרה
+KIND_REMUX = 'remux'          # מכולות שבדרך כלל מכילות h264/aac - העתקת זרמים
+KIND_TRANSCODE = 'transcode'  # מכולות ישנות שבדרך כלל דורשות קידוד מלא
+
+REMUX_EXTENSIONS = {'.mkv', '.mov', '.m4v', '.ts', '.mts'}
+
+# החלטות קבלה
+ADMIT = 'admit'
+REJECT = 'reject'
+
+# משקל המדידה החדשה בממוצע הנע של המהירויות
+EMA_WEIGHT = 0.3
+
+
+@dataclass
+class JobCost:
+    """הערכת העלות של עבודה"""
+    kind: str
+    size: int              # גודל הקובץ שמורד
+    disk_bytes: int        # מקום בדיסק בשיא העבודה (מקור + MP4)
+    cpu_seconds: float     # זמן המרה משוער
+    transfer_seconds: float  # זמן הורדה והעלאה משוער
+
+    @property
+    def total_seconds(self) -> float:
+        return self.cpu_seconds + self.transfer_seconds
+
+
+@dataclass
+class AdmissionDecision:
+    decision: str
+    reason: str = ''
+
+
+class AdmissionController:
+    """
+    בקרת קבלה ועומס
+    - הערכת עלות לכל עבודה לפי גודל ומכולה (בתים בדיסק, זמן המרה, זמן העברה)
+    - תקציב של בתים בעבודות פעילות וזמן המרה בתור; עבודה חדשה מעבר לתקציב נדחית
+    - עבודה שלא נכנסת כרגע בתקציב הבתים ממתינה בתור עד שמתפנה מקום
+    - הערכת זמן המתנה לפי מהירויות שנמדדות בפועל
+    """
+
+    def __init__(self, download_path: str):
+        self.download_path = download_path
+        self._queued: Dict[Tuple[int, int], JobCost] = {}
+        self._active: Dict[Tuple[int, int], JobCost] = {}
+        self._rates = {
+            'download': float(EST_DOWNLOAD_BPS),
+            'upload': float(EST_UPLOAD_BPS),
+            KIND_REMUX: float(EST_REMUX_BPS),
+            KIND_TRANSCODE: float(EST_TRANSCODE_BPS),
+        }
+
+    @staticmethod
+    def _key(message) -> Tuple[int, int]:
+        return message.chat.id, message.id
+
+    @staticmethod
+    def job_kind(file_name: str) -> str:
+        ext = os.path.splitext(file_name)[1].lower()
+        if ext == '.mp4':
+            return KIND_MP4
+        if ext in REMUX_EXTENSIONS:
+            return KIND_REMUX
+        return KIND_TRANSCODE
+
+    @staticmethod
+    def conversion_kind(mode: str) -> str:
+        """סוג העבודה לפי ההמרה שבוצעה בפועל (העתקת וידאו = remux, קידוד מלא = transcode)"""
+        return KIND_TRANSCODE if mode == MODE_TRANSCODE else KIND_REMUX
+
+    def estimate(self, file_name: str, size: Optional[int]) -> JobCost:
+        """הערכת העלות של קובץ"""
+        size = size or 0
+        kind = self.job_kind(file_name)
+        cpu_seconds = 0.0 if kind == KIND_MP4 else size / self._rates[kind]
+        return JobCost(
+            kind=kind,
+            size=size,
+            disk_bytes=size if kind == KIND_MP4 else size * 2,
+            cpu_seconds=cpu_seconds,
+            transfer_seconds=size / self._rates['download'] + size / self._rates['upload']
+        )
+
+    @property
+    def reserved_bytes(self) -> int:
+        """בתים בדיסק ששמורים לעבודות פעילות"""
+        return sum(cost.disk_bytes for cost in self._active.values())
+
+    @property
+    def queued_cpu_seconds(self) -> float:
+        """זמן המרה משוער של כל העבודות בתור ובעיבוד"""
+        return sum(cost.cpu_seconds for cost in self._queued.values()) + \
+            sum(cost.cpu_seconds for cost in self._active.values())
+
+    def check(self, cost: JobCost) -> AdmissionDecision:
+        """האם לקבל עבודה חדשה לתור"""
+        if MAX_FILE_SIZE_BYTES and cost.size > MAX_FILE_SIZE_BYTES:
+            return AdmissionDecision(REJECT, f"הקובץ גדול מדי (מקסימום {MAX_FILE_SIZE_BYTES // (1024 ** 3)} GB)")
+
+        if MAX_INFLIGHT_BYTES and cost.disk_bytes > MAX_INFLIGHT_BYTES:
+            return AdmissionDecision(REJECT, "הקובץ גדול מדי לעיבוד בשרת")
+
+        # אם גם אחרי סיום כל העבודות הפעילות לא יהיה מספיק מקום - אין טעם לחכות
+        try:
+            available = janitor.free_bytes(self.download_path) + self.reserved_bytes - janitor.min_free_bytes
+        except OSError:
+            available = cost.disk_bytes
+        if cost.disk_bytes > available:
+            return AdmissionDecision(REJECT, "אין מספיק מקום פנוי בשרת לקובץ הזה")
+
+        if MAX_QUEUED_CPU_SECONDS and self._queued and \
+                self.queued_cpu_seconds + cost.cpu_seconds > MAX_QUEUED_CPU_SECONDS:
+            return AdmissionDecision(REJECT, "התור עמוס כרגע, אנא נסה שוב מאוחר יותר")
+
+        return AdmissionDecision(ADMIT)
+
+    def register(self, message, cost: JobCost) -> None:
+        """רישום עבודה שהתקבלה לתור"""
+        self._queued[self._key(message)] = cost
+
+    def cost_of(self, message) -> Optional[JobCost]:
+        key = self._key(message)
+        return self._queued.get(key) or self._active.get(key)
+
+    def can_start(self, message) -> bool:
+        """האם יש מספיק תקציב בתים (ומקום בדיסק) כדי להתחיל את העבודה עכשיו"""
+        cost = self._queued.get(self._key(message))
+        if cost is None:
+            return True
+        if not janitor.has_free_space(self.download_path, needed=cost.disk_bytes):
+            return not self._active and janitor.has_free_space(self.download_path)
+        # עבודה אחת תמיד יכולה לרוץ, גם אם היא לבדה גדולה מהתקציב
+        return not self._active or self.reserved_bytes + cost.disk_bytes <= MAX_INFLIGHT_BYTES
+
+    def start(self, message) -> None:
+        """העברת עבודה מהתור לעבודות הפעילות"""
+        key = self._key(message)
+        cost = self._queued.pop(key, None)
+        if cost is not None:
+            self._active[key] = cost
+
+    def release(self, message) -> None:
+        """שחרור התקציב של עבודה שהסתיימה או בוטלה"""
+        key = self._key(message)
+        self._queued.pop(key, None)
+        self._active.pop(key, None)
+
+    def observe(self, kind: str, size: int, seconds: float) -> None:
+        """עדכון המהירות המשוערת לפי מדידה בפועל (download / upload / remux / transcode)"""
+        if kind not in self._rates or size <= 0 or seconds <= 0:
+            return
+        self._rates[kind] = (1 - EMA_WEIGHT) * self._rates[kind] + EMA_WEIGHT * (size / seconds)
+
+    def eta_seconds(self, message, position: int) -> float:
+        """הערכת זמן עד סיום העבודה: עבודות פעילות, העבודות שלפניה בתור והעבודה עצמה"""
+        cost = self.cost_of(message)
+        own = cost.total_seconds if cost else 0.0
+        queued = [c.total_seconds for key, c in self._queued.items() if key != self._key(message)]
+        average_queued = sum(queued) / len(queued) if queued else 0.0
+        ahead = sum(c.total_seconds for c in self._active.values()) + average_queued * max(0, position - 1)
+        return ahead / max(1, MAX_CONCURRENT_JOBS) + own
+
+
+def format_eta(seconds: float) -> str:
+    """הצגת זמן משוער בצורה קריאה"""
+    minutes = int(seconds // 60)
+    if minutes < 1:
+        return "פחות מדקה"
+    if minutes < 60:
+        return f"כ-{minutes} דקות"
+    hours, minutes = divmod(minutes, 60)
+    return f"כ-{hours} שעות ו-{minutes} דקות"
@@ -0,0 +1,167 @@
+import os
+import json
+import math
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, Set
+from pyrogram.errors import FloodWait
+from config.settings import DOWNLOAD_PARALLEL_PARTS, DOWNLOAD_SEGMENT_MB, DOWNLOAD_MAX_RETRIES
+from utils.metrics import record_flood_wait
+
+# גודל מקטע בהורדה מטלגרם (stream_media עובד ביחידות של 1MB)
+CHUNK_SIZE = 1024 * 1024
+
+
+class ChunkedDownloader:
+    """
+    הורדת קבצים במקטעים במקביל עם אפשרות להמשך
+    - הקובץ מחולק לקטעים קבועים שמורדים בכמה בקשות במקביל
+    - הקטעים שהושלמו נרשמים בקובץ נקודת ביקורת (.part.json) ליד הקובץ
+    - אחרי שגיאה או הפעלה מחדש של הבוט ההורדה ממשיכה מהקטעים שחסרים
+    - כל קטע שנכשל מנוסה שוב עם המתנה הולכת וגדלה
+    """
+
+    def __init__(self, app, workers: int = DOWNLOAD_PARALLEL_PARTS,
+                 segment_mb: int = DOWNLOAD_SEGMENT_MB, max_retries: int = DOWNLOAD_MAX_RETRIES):
+        self.app = app
+        self.workers = max(1, workers)
+        self.segment_chunks = max(1, segment_mb)
+        self.segment_size = self.segment_chunks * CHUNK_SIZE
+        self.max_retries = max(1, max_retries)
+
+    @staticmethod
+    def checkpoint_path(file_path: str) -> str:
+        return f"{file_path}.part.json"
+
+    async def download(self, message, file_path: str,
+                       progress: Optional[Callable[[int, int], Awaitable[None]]] = None) -> str:
+        """הורדת הקובץ של ההודעה אל file_path"""
+        file = message.video or message.document
+        total = file.file_size or 0
+
+        # קבצים קטנים (או בגודל לא ידוע) מורדים כרגיל
+        if total <= self.segment_size:
+            return await message.download(file_name=file_path, progress=progress)
+
+        segments = math.ceil(total / self.segment_size)
+        done = self._load_checkpoint(file_path, file.file_unique_id, total)
+        if done:
+            logging.info(f"ממשיך הורדה מנקודת ביקורת: {len(done)}/{segments} קטעים הושלמו")
+        if not self._preallocate(file_path, total, keep=bool(done)) and done:
+            # הקובץ הוקצה מחדש (אפסים) - הקטעים שבנקודת הביקורת כבר לא בדיסק
+            logging.warning(f"גודל הקובץ לא תואם לנקודת הביקורת, מוריד מההתחלה: {file_path}")
+            done = set()
+            self._save_checkpoint(file_path, file.file_unique_id, total, done)
+
+        downloaded = sum(self._segment_length(index, total) for index in done)
+        pending = asyncio.Queue()
+        for index in range(segments):
+            if index not in done:
+                pending.put_nowait(index)
+
+        async def report(delta: int) -> None:
+            nonlocal downloaded
+            downloaded += delta
+            if progress:
+                await progress(downloaded, total)
+
+        with open(file_path, 'r+b') as output:
+            async def worker() -> None:
+                while not pending.empty():
+                    index = pending.get_nowait()
+                    await self._fetch_segment(message, output, index, total, report)
+                    done.add(index)
+                    self._save_checkpoint(file_path, file.file_unique_id, total, done)
+
+            tasks = [asyncio.create_task(worker()) for _ in range(min(self.workers, segments))]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                # נקודת הביקורת נשמרת כדי שאפשר יהיה להמשיך מאותו מקום
+                raise
+
+        os.remove(self.checkpoint_path(file_path))
+        return file_path
+
+    def _segment_length(self, index: int, total: int) -> int:
+        return min(self.segment_size, total - index * self.segment_size)
+
+    async def _fetch_segment(self, message, output, index: int, total: int,
+                             report: Callable[[int], Awaitable[None]]) -> None:
+        """הורדת קטע אחד, עם ניסיונות חוזרים"""
+        base_offset = index * self.segment_size
+        for attempt in range(1, self.max_retries + 1):
+            written = 0
+            try:
+                async for chunk in self.app.stream_media(
+                    message, limit=self.segment_chunks, offset=index * self.segment_chunks
+                ):
+                    # seek+write ללא await ביניהם, כך שעובדים אחרים לא מתערבבים
+                    output.seek(base_offset + written)
+                    output.write(chunk)
+                    written += len(chunk)
+                    await report(len(chunk))
+
+                if written < self._segment_length(index, total):
+                    raise ConnectionError(f"קטע {index} הסתיים מוקדם ({written} בתים)")
+                return
+
+            except asyncio.CancelledError:
+                raise
+            except FloodWait as e:
+                await report(-written)
+                record_flood_wait('download', e.value)
+                logging.warning(f"FloodWait בהורדת קטע {index}, ממתין {e.value} שניות")
+                await asyncio.sleep(e.value)
+            except Exception as e:
+                await report(-written)
+                if attempt == self.max_retries:
+                    raise
+                delay = min(60, 2 ** attempt)
+                logging.warning(f"שגיאה בהורדת קטע {index} (ניסיון {attempt}): {e}. מנסה שוב בעוד {delay} שניות")
+                await asyncio.sleep(delay)
+
+        raise ConnectionError(f"הורדת קטע {index} נכשלה")
+
+    def _preallocate(self, file_path: str, total: int, keep: bool) -> bool:
+        """הקצאת הקובץ בגודל המלא מראש. מחזיר True אם הקובץ הקיים נשמר כמו שהוא"""
+        if keep and os.path.exists(file_path) and os.path.getsize(file_path) == total:
+            return True
+        with open(file_path, 'wb') as output:
+            output.truncate(total)
+        return False
+
+    def _load_checkpoint(self, file_path: str, file_unique_id: str, total: int) -> Set[int]:
+        """טעינת הקטעים שהושלמו, אם נקודת הביקורת שייכת לאותו קובץ"""
+        path = self.checkpoint_path(file_path)
+        if not os.path.exists(path) or not os.path.exists(file_path):
+            return set()
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if (data.get('file_unique_id') != file_unique_id or data.get('size') != total
+                    or data.get('segment_size') != self.segment_size):
+                return set()
+            return set(data.get('done', []))
+        except (OSError, ValueError) as e:
+            logging.warning(f"נקודת ביקורת פגומה {path}: {e}")
+            return set()
+
+    def _save_checkpoint(self, file_path: str, file_unique_id: str, total: int, done: Set[int]) -> None:
+        """שמירת נקודת ביקורת (כתיבה לקובץ זמני והחלפה)"""
+        path = self.checkpoint_path(file_path)
+        temp_path = f"{path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'file_unique_id': file_unique_id,
+                    'size': total,
+                    'segment_size': self.segment_size,
+                    'done': sorted(done)
+                }, file)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"שגיאה בשמירת נקודת ביקורת {path}: {e}")
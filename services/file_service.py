@@ -1,53 +1,129 @@
 import os
-import yaml
-import logging
 import asyncio
-from config.settings import FILE_IDS_FILE
+import hashlib
+import logging
+from typing import Callable, Optional
+from utils.file_id_store import file_id_store, content_index_store
+from utils.video_probe import probe_video
+from utils.conversion_planner import plan_conversion, build_convert_command, MODE_TRANSCODE
+from utils.ffmpeg_runner import ffmpeg_runner, PRIORITY_NORMAL
+from utils.metrics import STAGE_SECONDS, STAGE_FAILURES, record_dedup
+from utils.thumbnails import thumbnail_engine
+from config.settings import FFMPEG_TIMEOUT
+
+# גודל כל דגימה בחישוב טביעת האצבע של התוכן
+FINGERPRINT_SAMPLE_SIZE = 1024 * 1024
 
 def load_file_ids() -> dict:
-    """טעינת רשימת מזהי הקבצים מהקובץ"""
-    if os.path.exists(FILE_IDS_FILE):
-        with open(FILE_IDS_FILE, "r") as file:
-            return yaml.safe_load(file) or {}
-    return {}
+    """קבלת כל מזהי הקבצים מהמאגר"""
+    return file_id_store.to_dict()
 
-def save_file_id(file_name: str, file_id: str) -> None:
+async def save_file_id(file_name: str, file_id: str) -> None:
     """שמירת מזהה קובץ חדש"""
-    file_ids = load_file_ids()
-    file_ids[file_name] = file_id
-    with open(FILE_IDS_FILE, "w") as file:
-        yaml.dump(file_ids, file)
+    await file_id_store.set_async(file_name, file_id)
     logging.info(f"נשמר file_id עבור {file_name}")
 
 def check_existing_file(file_name: str) -> str:
     """בדיקה אם קובץ כבר קיים במערכת"""
-    file_ids = load_file_ids()
-    return file_ids.get(file_name)
+    file_id = file_id_store.get(file_name)
+    record_dedup('filename', file_id is not None)
+    return file_id
+
+def check_existing_unique_id(file_unique_id: Optional[str]) -> Optional[str]:
+    """בדיקה אם קובץ עם אותו file_unique_id של טלגרם כבר עובד"""
+    if not file_unique_id:
+        return None
+    file_id = content_index_store.get(f"uid:{file_unique_id}")
+    record_dedup('unique_id', file_id is not None)
+    return file_id
+
+def check_existing_fingerprint(fingerprint: Optional[str]) -> Optional[str]:
+    """בדיקה אם קובץ עם אותה טביעת אצבע כבר עובד"""
+    if not fingerprint:
+        return None
+    file_id = content_index_store.get(f"fp:{fingerprint}")
+    record_dedup('fingerprint', file_id is not None)
+    return file_id
+
+async def save_content_keys(file_id: str, file_unique_id: Optional[str] = None,
+                            fingerprint: Optional[str] = None) -> None:
+    """שמירת מפתחות התוכן של קובץ מול ה-file_id שלו בקבוצה"""
+    if file_unique_id:
+        await content_index_store.set_async(f"uid:{file_unique_id}", file_id)
+    if fingerprint:
+        await content_index_store.set_async(f"fp:{fingerprint}", file_id)
+
+def compute_fingerprint(file_path: str) -> str:
+    """חישוב טביעת אצבע: גודל הקובץ + גיבוב של דגימות מההתחלה, האמצע והסוף"""
+    size = os.path.getsize(file_path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as file:
+        if size <= 3 * FINGERPRINT_SAMPLE_SIZE:
+            digest.update(file.read())
+        else:
+            for offset in (0, size // 2, size - FINGERPRINT_SAMPLE_SIZE):
+                file.seek(offset)
+                digest.update(file.read(FINGERPRINT_SAMPLE_SIZE))
+    return f"{size}:{digest.hexdigest()}"
 
-async def convert_to_mp4(input_file: str, output_file: str) -> bool:
-    """המרת קובץ וידאו לפורמט MP4"""
+async def convert_to_mp4(input_file: str, output_file: str, video_info: Optional[dict] = None,
+                         progress: Optional[Callable] = None) -> Optional[str]:
+    """
+    המרת קובץ וידאו לפורמט MP4 - העתקת זרמים כשהקודקים תואמים, קידוד מחדש רק כשצריך
+    progress מקבל את שורות ה-progress של ffmpeg (ראה utils.progress.get_transcode_progress_callback)
+    מחזיר את סוג ההמרה שהצליחה בפועל (copy / audio / transcode), או None בכישלון
+    """
+    if video_info is None:
+        video_info = await probe_video(input_file)
+
+    with STAGE_SECONDS.time(stage='convert'):
+        mode = plan_conversion(video_info)
+        logging.info(f"המרה ל-MP4 ({mode}): {input_file}")
+        with_progress = progress is not None
+        if await _run_convert(build_convert_command(input_file, output_file, mode, with_progress), progress):
+            return mode
+
+        # העתקת זרמים יכולה להיכשל בקבצים פגומים - ניסיון נוסף בקידוד מלא
+        if mode != MODE_TRANSCODE:
+            logging.warning(f"המרה מסוג {mode} נכשלה, מנסה קידוד מלא")
+            if await _run_convert(build_convert_command(input_file, output_file, MODE_TRANSCODE, with_progress), progress):
+                return MODE_TRANSCODE
+
+    STAGE_FAILURES.inc(stage='convert')
+    return None
+
+async def _run_convert(command: list, progress: Optional[Callable] = None) -> bool:
+    """הרצת פקודת המרה של ffmpeg"""
     try:
-        process = await asyncio.create_subprocess_shell(
-            f'ffmpeg -i "{input_file}" "{output_file}"',
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+        result = await ffmpeg_runner.run(
+            command,
+            priority=PRIORITY_NORMAL,
+            timeout=FFMPEG_TIMEOUT,
+            on_stdout_line=progress
         )
-        await process.communicate()
-        return process.returncode == 0
+        if not result.ok:
+            logging.error(f"שגיאה בהמרת הקובץ ל-MP4: {result.stderr_tail}")
+        return result.ok
     except Exception as e:
         logging.error(f"שגיאה בהמרת הקובץ ל-MP4: {e}")
         return False
 
-async def create_thumbnail(input_file: str, thumbnail_file: str) -> bool:
-    """יצירת תמונה ממוזערת לוידאו"""
+async def create_thumbnail(input_file: str, thumbnail_file: str, duration: float = 0,
+                           fingerprint: Optional[str] = None) -> Optional[str]:
+    """
+    יצירת תמונה ממוזערת לוידאו, מחזיר את נתיב התמונה או None
+    עם fingerprint התמונה נשמרת במטמון (ומוחזר נתיב המטמון במקום thumbnail_file)
+    """
     try:
-        process = await asyncio.create_subprocess_shell(
-            f'ffmpeg -i "{input_file}" -ss 00:00:01.000 -vframes 1 "{thumbnail_file}"',
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        await process.communicate()
-        return process.returncode == 0
+        with STAGE_SECONDS.time(stage='thumbnail'):
+            path = await thumbnail_engine.create(input_file, thumbnail_file, duration, cache_key=fingerprint)
+        if not path:
+            STAGE_FAILURES.inc(stage='thumbnail')
+            logging.error(f"שגיאה ביצירת תמונה ממוזערת עבור {input_file}")
+        return path
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
+        STAGE_FAILURES.inc(stage='thumbnail')
         logging.error(f"שגיאה ביצירת תמונה ממוזערת: {e}")
-        return False
+        return None
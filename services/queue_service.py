@@ -1,88 +1,195 @@
+import time
 import logging
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
+from utils.metrics import QUEUE_DEPTH, ACTIVE_JOBS, QUEUE_WAIT_SECONDS
 
 class QueueService:
+    """
+    תור קבצים עם חלוקה הוגנת בין משתמשים
+    - לכל משתמש תור משלו, והמשתמשים מקבלים תור לפי סבב (round-robin)
+    - אינדקס לפי message_id, כך שהוספה, שליפה וביטול הם O(1)
+    - חישוב מיקום עובר על המשתמשים הממתינים בלבד ולא על כל הקבצים
+    """
+
     def __init__(self):
-        self.upload_queue = []  # תור הקבצים
-        self.user_queue = []    # תור המשתמשים
+        self.user_files = defaultdict(deque)  # תור הודעות ממתינות לכל משתמש
+        self.user_ring = OrderedDict()  # סבב המשתמשים שיש להם קבצים ממתינים
+        self.pending = {}  # הודעות ממתינות לפי message_id
+        self.pending_counts = defaultdict(int)  # מספר הקבצים הממתינים לכל משתמש
+        self.active_jobs = {}  # קבצים שנמצאים כרגע בעיבוד לפי message_id
+        self.active_counts = defaultdict(int)  # מספר הקבצים בעיבוד לכל משתמש
         self.queue_messages = {}  # שמירת הודעות התור לפי message_id
+        self.enqueued_at = {}  # זמן הכניסה לתור לפי message_id (למדידת זמן ההמתנה)
+
+    def __len__(self):
+        return len(self.pending)
+
+    @property
+    def user_queue(self):
+        """רשימת המשתמשים שיש להם קבצים בתור או בעיבוד"""
+        users = list(self.user_ring)
+        users.extend(user_id for user_id in self.active_counts if user_id not in self.user_ring)
+        return users
 
     async def add_to_queue(self, message, queue_message=None):
-        """הוספת הודעה לתור"""
+        """הוספת הודעה לתור, מחזיר את מיקום הקובץ בתור"""
         user_id = message.from_user.id
-        
-        # הוספת המשתמש לתור המשתמשים אם הוא לא נמצא בו
-        if user_id not in self.user_queue:
-            self.user_queue.append(user_id)
-            position = len(self.user_queue)
-            logging.info(f"Added user {user_id} to queue. Position: {position}")
-        
-        # הוספת ההודעה לתור הקבצים
-        self.upload_queue.append(message)
+
+        # הוספת המשתמש לסוף הסבב אם אין לו קבצים ממתינים
+        if user_id not in self.user_ring:
+            self.user_ring[user_id] = None
+            logging.info(f"Added user {user_id} to queue. Position: {len(self.user_ring)}")
+
+        # הוספת ההודעה לתור של המשתמש
+        self.user_files[user_id].append(message.id)
+        self.pending[message.id] = message
+        self.pending_counts[user_id] += 1
+        self.enqueued_at[message.id] = time.monotonic()
+        self._update_gauges()
         logging.info(f"Added message {message.id} to queue for user {user_id}")
-        
+
         # שמירת הודעת התור אם יש
         if queue_message:
             self.queue_messages[message.id] = queue_message
-        
-        return len(self.user_queue)
+
+        return self._position(user_id, self.pending_counts[user_id])
+
+    def pop_next(self):
+        """שליפת הקובץ הבא לפי הסבב וסימונו כפעיל"""
+        while self.user_ring:
+            user_id = next(iter(self.user_ring))
+            message = self.pending.pop(self.user_files[user_id].popleft(), None)
+            if message is None:
+                # רשומה שבוטלה - ממשיכים לרשומה הבאה של אותו משתמש
+                continue
+
+            self.pending_counts[user_id] -= 1
+            if self.pending_counts[user_id] == 0:
+                self._drop_user(user_id)
+            else:
+                self.user_ring.move_to_end(user_id)
+
+            self.active_jobs[message.id] = message
+            self.active_counts[user_id] += 1
+            enqueued_at = self.enqueued_at.pop(message.id, None)
+            if enqueued_at is not None:
+                QUEUE_WAIT_SECONDS.observe(time.monotonic() - enqueued_at)
+            self._update_gauges()
+            logging.info(f"Started processing message {message.id} for user {user_id}")
+            return message
+        return None
+
+    def peek_next(self):
+        """הקובץ הבא שיישלף מהתור, בלי להוציא אותו"""
+        if not self.user_ring:
+            return None
+        message_id = self._first_pending_id(next(iter(self.user_ring)))
+        return self.pending.get(message_id) if message_id is not None else None
+
+    def _update_gauges(self):
+        QUEUE_DEPTH.set(len(self.pending))
+        ACTIVE_JOBS.set(len(self.active_jobs))
+
+    def _drop_user(self, user_id):
+        """הסרת משתמש מהסבב כשאין לו קבצים ממתינים"""
+        self.user_ring.pop(user_id, None)
+        self.user_files.pop(user_id, None)
+        self.pending_counts.pop(user_id, None)
+
+    def _position(self, user_id, rank):
+        """
+        מיקום הקובץ ה-rank של המשתמש בתור: בכל סבב כל משתמש מקבל קובץ אחד,
+        ולכן לפניו עוברים עד rank קבצים של כל משתמש שקודם לו בסבב ועד rank-1 של השאר
+        """
+        ahead = rank - 1
+        before_user = True
+        for other_id in self.user_ring:
+            if other_id == user_id:
+                before_user = False
+                continue
+            limit = rank if before_user else rank - 1
+            ahead += min(self.pending_counts[other_id], limit)
+        return ahead + 1
 
     def is_first_user(self, user_id):
-        """בדיקה אם המשתמש ראשון בתור"""
-        return len(self.user_queue) > 0 and self.user_queue[0] == user_id
+        """בדיקה אם המשתמש ראשון בסבב"""
+        return bool(self.user_ring) and next(iter(self.user_ring)) == user_id
 
     def is_first_in_queue(self, message_id):
-        """בדיקה אם ההודעה ראשונה בתור הקבצים"""
-        return len(self.upload_queue) > 0 and self.upload_queue[0].id == message_id
+        """בדיקה אם ההודעה היא הבאה שתישלף מהתור"""
+        if message_id not in self.pending:
+            return False
+        user_id = self.pending[message_id].from_user.id
+        return self.is_first_user(user_id) and self._first_pending_id(user_id) == message_id
+
+    def _first_pending_id(self, user_id):
+        files = self.user_files[user_id]
+        while files and files[0] not in self.pending:
+            files.popleft()
+        return files[0] if files else None
 
     def get_user_position(self, user_id):
-        """קבלת מיקום המשתמש בתור"""
-        try:
-            return self.user_queue.index(user_id) + 1
-        except ValueError:
+        """קבלת מיקום הקובץ הבא של המשתמש בתור"""
+        if user_id not in self.user_ring:
             return None
+        return self._position(user_id, 1)
+
+    def get_message_position(self, message_id):
+        """קבלת המיקום של הודעה מסוימת בתור"""
+        message = self.pending.get(message_id)
+        if message is None:
+            return None
+        user_id = message.from_user.id
+        rank = 0
+        for pending_id in self.user_files[user_id]:
+            if pending_id in self.pending:
+                rank += 1
+            if pending_id == message_id:
+                break
+        return self._position(user_id, rank)
 
     async def remove_from_queue(self, message_id, user_id):
         """הסרת הודעה מהתור"""
         # מחיקת הודעת התור אם קיימת
-        if message_id in self.queue_messages:
+        await self._delete_queue_message(message_id)
+
+        # הסרת ההודעה מהתור (הרשומה בתור המשתמש מדולגת בשליפה)
+        if self.pending.pop(message_id, None) is not None:
+            self.pending_counts[user_id] -= 1
+            if self.pending_counts[user_id] <= 0:
+                self._drop_user(user_id)
+
+        # הסרת ההודעה מהעבודות הפעילות
+        if self.active_jobs.pop(message_id, None) is not None:
+            self.active_counts[user_id] -= 1
+            if self.active_counts[user_id] <= 0:
+                del self.active_counts[user_id]
+
+        self.enqueued_at.pop(message_id, None)
+        self._update_gauges()
+        logging.info(f"Removed message {message_id} from queue")
+
+    async def _delete_queue_message(self, message_id):
+        queue_message = self.queue_messages.pop(message_id, None)
+        if queue_message:
             try:
-                await self.queue_messages[message_id].delete()
-                del self.queue_messages[message_id]
+                await queue_message.delete()
                 logging.info(f"Deleted queue message for message {message_id}")
             except Exception as e:
                 logging.warning(f"Failed to delete queue message: {e}")
-        
-        # הסרת ההודעה מתור הקבצים
-        self.upload_queue = [msg for msg in self.upload_queue if msg.id != message_id]
-        
-        # בדיקה אם למשתמש יש עוד קבצים בתור
-        user_has_more_files = any(msg.from_user.id == user_id for msg in self.upload_queue)
-        if not user_has_more_files and user_id in self.user_queue:
-            self.user_queue.remove(user_id)
-            logging.info(f"Removed user {user_id} from queue - no more files")
-        
-        logging.info(f"Removed message {message_id} from queue")
 
     async def cancel_user_downloads(self, user_id):
-        """ביטול כל ההורדות של משתמש מסוים"""
-        # מחיקת כל הודעות התור של המשתמש
-        messages_to_remove = []
-        for msg in self.upload_queue:
-            if msg.from_user.id == user_id:
-                if msg.id in self.queue_messages:
-                    try:
-                        await self.queue_messages[msg.id].delete()
-                        del self.queue_messages[msg.id]
-                    except Exception as e:
-                        logging.warning(f"Failed to delete queue message: {e}")
-                messages_to_remove.append(msg)
-        
-        # הסרת ההודעות מתור ההורדות
-        for msg in messages_to_remove:
-            self.upload_queue.remove(msg)
-        
-        # הסרת המשתמש מתור המשתמשים
-        if user_id in self.user_queue:
-            self.user_queue.remove(user_id)
-            logging.info(f"Removed user {user_id} and all their files from queue")
+        """ביטול כל ההורדות הממתינות של משתמש מסוים, מחזיר את ההודעות שבוטלו"""
+        cancelled = []
+        for message_id in list(self.user_files.get(user_id, ())):
+            message = self.pending.pop(message_id, None)
+            if message is not None:
+                cancelled.append(message)
+                self.enqueued_at.pop(message_id, None)
+                await self._delete_queue_message(message_id)
+
+        # עבודות פעילות מבוטלות דרך אירועי הביטול ומוסרות בסיומן
+        self._drop_user(user_id)
+        self._update_gauges()
+        logging.info(f"Removed user {user_id} and all their files from queue")
+        return cancelled
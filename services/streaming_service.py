@@ -0,0 +1,165 @@
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+from config.settings import FFMPEG_TIMEOUT
+from utils.video_probe import probe_video
+from utils.conversion_planner import plan_conversion, build_convert_command
+from utils.ffmpeg_runner import ffmpeg_runner, PRIORITY_NORMAL
+from services.download_service import CHUNK_SIZE
+
+# כמות הבתים שנאספת לפני בדיקת הקודקים והפעלת ffmpeg
+STREAM_HEAD_BYTES = 8 * 1024 * 1024
+
+
+async def stream_download_and_convert(
+    app,
+    message,
+    source_path: str,
+    output_path: str,
+    progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+) -> bool:
+    """
+    הורדה בזרימה עם המרה במקביל ל-MP4
+    - ההורדה כותבת לקובץ המקור בלבד; ffmpeg מקבל את הקובץ מהדיסק דרך pipe, תוך כדי שהוא גדל
+    - הורדה שנקטעה ממשיכה מהבתים שכבר בדיסק (stream_media עם offset), ולא מההתחלה
+    - ffmpeg מופעל רק אם יש לו מקום פנוי מיד, ו-FFMPEG_TIMEOUT נמדד מסיום ההורדה,
+      כך שזמן הרשת לא נספר כזמן המרה וההורדה לא ממתינה לתור של ffmpeg
+    - שגיאת רשת עולה כ-ConnectionError מההורדה; כישלון ההמרה רק מחזיר False
+      (קובץ המקור שלם, וממירים ממנו כרגיל)
+
+    מחזיר True אם קובץ ה-MP4 נוצר בהצלחה. קובץ היעד קיים רק במקרה של הצלחה.
+    """
+    file = message.video or message.document
+    total = file.file_size or 0
+    offset = _resume_offset(source_path, total)
+    current = offset * CHUNK_SIZE
+    received = asyncio.Event()
+    if offset:
+        logging.info(f"ממשיך הורדה בזרימה מ-{current} בתים: {source_path}")
+
+    async def download() -> None:
+        nonlocal current
+        with open(source_path, 'ab') as source:
+            source.truncate(current)
+            async for chunk in app.stream_media(message, offset=offset):
+                source.write(chunk)
+                source.flush()
+                current += len(chunk)
+                received.set()
+                if progress:
+                    await progress(current, total)
+        if total and current < total:
+            raise ConnectionError("ההורדה בזרימה הופסקה לפני סיום הקובץ")
+
+    download_task = asyncio.create_task(download())
+    download_task.add_done_callback(lambda _: received.set())
+    conversion = None
+    try:
+        # איסוף הבתים הראשונים ובדיקת הקודקים מתוך הקובץ החלקי שכבר בדיסק
+        while current < STREAM_HEAD_BYTES and not download_task.done():
+            await received.wait()
+            received.clear()
+        if download_task.done():
+            await download_task
+        elif ffmpeg_runner.has_free_slot():
+            mode = plan_conversion(await probe_video(source_path))
+            logging.info(f"המרה בזרימה ל-MP4 ({mode}): {source_path}")
+            conversion = _start_conversion(source_path, output_path, mode, download_task, received)
+        else:
+            logging.info(f"אין מקום פנוי ל-ffmpeg, מוריד בלי המרה בזרימה: {source_path}")
+
+        await download_task
+        if conversion is None:
+            return False
+        if not conversion.started:
+            # ffmpeg עוד לא התחיל - ההמרה הרגילה תתבצע אחרי ההורדה, כשיגיע תורה
+            conversion.task.cancel()
+            await asyncio.gather(conversion.task, return_exceptions=True)
+            return False
+
+        try:
+            result = await asyncio.wait_for(conversion.task, FFMPEG_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.error(f"ההמרה בזרימה חרגה מהזמן המותר ({FFMPEG_TIMEOUT} שניות) אחרי סיום ההורדה")
+            _remove_partial(output_path)
+            return False
+
+        if not result.ok or not conversion.feeding:
+            logging.error(f"ההמרה בזרימה נכשלה: {result.stderr_tail}")
+            _remove_partial(output_path)
+            return False
+        return True
+
+    except BaseException:
+        for task in (download_task, conversion and conversion.task):
+            if task and not task.done():
+                task.cancel()
+        await asyncio.gather(download_task, *([conversion.task] if conversion else []), return_exceptions=True)
+        _remove_partial(output_path)
+        raise
+
+
+class _Conversion:
+    """תהליך ffmpeg שקורא את קובץ המקור מהדיסק בזמן שההורדה ממשיכה"""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.started = False  # ffmpeg קיבל מקום והתחיל לקרוא
+        self.feeding = True   # False אם ffmpeg הפסיק לקבל נתונים באמצע
+
+
+def _start_conversion(source_path: str, output_path: str, mode: str,
+                      download_task: asyncio.Task, received: asyncio.Event) -> _Conversion:
+    conversion = _Conversion()
+
+    async def feeder(stdin) -> None:
+        conversion.started = True
+        with open(source_path, 'rb') as reader:
+            while True:
+                # ניקוי האירוע לפני הקריאה, כך שמקטע שנכתב אחריה לא מפוספס
+                received.clear()
+                data = reader.read(CHUNK_SIZE)
+                if data:
+                    try:
+                        stdin.write(data)
+                        await stdin.drain()
+                    except (BrokenPipeError, ConnectionResetError):
+                        # ffmpeg הפסיק לקרוא - ההורדה ממשיכה לדיסק בלבד
+                        logging.warning("ffmpeg הפסיק לקבל נתונים בזמן ההורדה, ממשיך בהורדה בלבד")
+                        conversion.feeding = False
+                        return
+                elif download_task.done():
+                    if download_task.cancelled() or download_task.exception():
+                        conversion.feeding = False
+                    return
+                else:
+                    await received.wait()
+
+    # בלי timeout כאן: הזמן נמדד רק מסיום ההורדה (ראה stream_download_and_convert)
+    conversion.task = asyncio.create_task(ffmpeg_runner.run(
+        build_convert_command('pipe:0', output_path, mode),
+        priority=PRIORITY_NORMAL,
+        stdin_feeder=feeder
+    ))
+    return conversion
+
+
+def _resume_offset(source_path: str, total: int) -> int:
+    """מספר המקטעים השלמים (1MB) שכבר נמצאים בקובץ המקור מניסיון קודם"""
+    try:
+        size = os.path.getsize(source_path)
+    except OSError:
+        return 0
+    if total and size > total:
+        return 0
+    return size // CHUNK_SIZE
+
+
+def _remove_partial(output_path: str) -> None:
+    """מחיקת קובץ יעד חלקי"""
+    try:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    except OSError as e:
+        logging.warning(f"לא ניתן למחוק קובץ חלקי {output_path}: {e}")
@@ -0,0 +1,175 @@
+import os
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+from pyrogram import raw, types, utils
+from pyrogram.errors import FloodWait, FilePartMissing
+from pyrogram.session import Session
+from config.settings import UPLOAD_PARALLEL_PARTS, UPLOAD_MAX_RETRIES
+from utils.metrics import record_flood_wait
+
+# גודל חלק מקסימלי שטלגרם מקבל בהעלאה
+PART_SIZE = 512 * 1024
+
+# קבצים עד הגודל הזה נשלחים כ"קובץ קטן" (SaveFilePart עם md5) דרך Pyrogram
+BIG_FILE_THRESHOLD = 10 * 1024 * 1024
+
+
+class ParallelUploader:
+    """
+    העלאת קבצים גדולים בחלקים במקביל
+    - כמה חלקים נשלחים בו-זמנית על חיבור מדיה אחד
+    - חלק שנכשל נשלח שוב לבד, עם המתנה הולכת וגדלה, בלי להתחיל את ההעלאה מההתחלה
+    - ההתקדמות מדווחת לפי סך הבתים שהועלו, לאותה פונקציית התקדמות של Pyrogram
+    """
+
+    def __init__(self, app, workers: int = UPLOAD_PARALLEL_PARTS, max_retries: int = UPLOAD_MAX_RETRIES):
+        self.app = app
+        self.workers = max(1, workers)
+        self.max_retries = max(1, max_retries)
+
+    async def save_file(self, path: str,
+                        progress: Optional[Callable[[int, int], Awaitable[None]]] = None):
+        """העלאת הקובץ לשרתי טלגרם והחזרת InputFile לשליחה"""
+        file_size = os.path.getsize(path)
+        if file_size <= BIG_FILE_THRESHOLD:
+            return await self.app.save_file(path, progress=progress)
+
+        total_parts = (file_size + PART_SIZE - 1) // PART_SIZE
+        file_id = self.app.rnd_id()
+        pending = asyncio.Queue()
+        for part in range(total_parts):
+            pending.put_nowait(part)
+        uploaded = 0
+
+        session = await self._start_session()
+        try:
+            with open(path, 'rb') as source:
+                async def worker() -> None:
+                    nonlocal uploaded
+                    while not pending.empty():
+                        part = pending.get_nowait()
+                        size = await self._send_part(session, source, file_id, part, total_parts)
+                        uploaded += size
+                        if progress:
+                            await progress(uploaded, file_size)
+
+                tasks = [asyncio.create_task(worker()) for _ in range(min(self.workers, total_parts))]
+                try:
+                    await asyncio.gather(*tasks)
+                except BaseException:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    raise
+        finally:
+            await session.stop()
+
+        return raw.types.InputFileBig(id=file_id, parts=total_parts, name=os.path.basename(path))
+
+    async def send_video(self, chat_id, video: str, thumb: Optional[str] = None, duration: int = 0,
+                         width: int = 0, height: int = 0, caption: str = '',
+                         reply_to_message_id: Optional[int] = None,
+                         progress: Optional[Callable[[int, int], Awaitable[None]]] = None) -> types.Message:
+        """
+        שליחת וידאו עם העלאה מקבילית (מקביל ל-send_video של Pyrogram)
+        חלק שטלגרם מדווח כחסר נשלח שוב עד max_retries פעמים, ואז השגיאה עולה
+        """
+        thumb_file = await self.app.save_file(thumb) if thumb and os.path.exists(thumb) else None
+        file = await self.save_file(video, progress=progress)
+        media = raw.types.InputMediaUploadedDocument(
+            mime_type='video/mp4',
+            file=file,
+            thumb=thumb_file,
+            attributes=[
+                raw.types.DocumentAttributeVideo(
+                    supports_streaming=True,
+                    duration=int(duration or 0),
+                    w=int(width or 0),
+                    h=int(height or 0)
+                ),
+                raw.types.DocumentAttributeFilename(file_name=os.path.basename(video))
+            ]
+        )
+
+        resent = 0
+        while True:
+            try:
+                result = await self.app.invoke(
+                    raw.functions.messages.SendMedia(
+                        peer=await self.app.resolve_peer(chat_id),
+                        media=media,
+                        reply_to_msg_id=reply_to_message_id,
+                        random_id=self.app.rnd_id(),
+                        **await utils.parse_text_entities(self.app, caption, None, None)
+                    )
+                )
+            except FilePartMissing as e:
+                if resent >= self.max_retries:
+                    logging.error(f"חלק {e.value} עדיין חסר אחרי {resent} שליחות חוזרות, מוותר על ההעלאה")
+                    raise
+                resent += 1
+                # טלגרם לא קיבל חלק מסוים - שולחים רק אותו שוב
+                logging.warning(f"חלק {e.value} חסר בהעלאה, שולח אותו שוב ({resent}/{self.max_retries})")
+                await self._resend_part(video, file, e.value)
+                continue
+
+            for update in result.updates:
+                if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+                    return await types.Message._parse(
+                        self.app, update.message,
+                        {user.id: user for user in result.users},
+                        {chat.id: chat for chat in result.chats}
+                    )
+            raise RuntimeError("טלגרם לא החזיר את ההודעה שנשלחה")
+
+    async def _start_session(self) -> Session:
+        session = Session(
+            self.app, await self.app.storage.dc_id(), await self.app.storage.auth_key(),
+            await self.app.storage.test_mode(), is_media=True
+        )
+        await session.start()
+        return session
+
+    async def _resend_part(self, path: str, file, part: int) -> None:
+        if not isinstance(file, raw.types.InputFileBig):
+            await self.app.save_file(path, file_id=file.id, file_part=part)
+            return
+        session = await self._start_session()
+        try:
+            with open(path, 'rb') as source:
+                await self._send_part(session, source, file.id, part, file.parts)
+        finally:
+            await session.stop()
+
+    async def _send_part(self, session: Session, source, file_id: int, part: int, total_parts: int) -> int:
+        """שליחת חלק אחד, עם ניסיונות חוזרים. מחזיר את מספר הבתים שנשלחו"""
+        # seek+read ללא await ביניהם, כך שעובדים אחרים לא מתערבבים
+        source.seek(part * PART_SIZE)
+        chunk = source.read(PART_SIZE)
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                if await session.invoke(raw.functions.upload.SaveBigFilePart(
+                    file_id=file_id,
+                    file_part=part,
+                    file_total_parts=total_parts,
+                    bytes=chunk
+                )):
+                    return len(chunk)
+                raise ConnectionError(f"השרת דחה את חלק {part}")
+
+            except asyncio.CancelledError:
+                raise
+            except FloodWait as e:
+                record_flood_wait('upload', e.value)
+                logging.warning(f"FloodWait בהעלאת חלק {part}, ממתין {e.value} שניות")
+                await asyncio.sleep(e.value)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(60, 2 ** attempt)
+                logging.warning(f"שגיאה בהעלאת חלק {part} (ניסיון {attempt}): {e}. מנסה שוב בעוד {delay} שניות")
+                await asyncio.sleep(delay)
+
+        raise ConnectionError(f"העלאת חלק {part} נכשלה")
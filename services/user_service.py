@@ -1,83 +1,203 @@
 import os
 import yaml
+import asyncio
 import logging
-from typing import List, Set
-from config.settings import USERS_FILE
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from config.settings import USERS_FILE, ADMIN_USER_ID
 
 logger = logging.getLogger(__name__)
 
+# תפקידים
+ROLE_USER = 'user'
+ROLE_ADMIN = 'admin'
+ROLES = (ROLE_USER, ROLE_ADMIN)
+
+UserId = Union[int, str]
+
+
 class UserService:
-    def __init__(self):
-        self._allowed_users: Set[str] = set()
+    """
+    רשימת המשתמשים המורשים ותפקידיהם
+    - כל שינוי (גם של הרבה משתמשים) הוא כתיבה אחת: קובץ זמני והחלפה, כך שהקובץ תמיד שלם
+    - הזיכרון מתעדכן רק אחרי שהכתיבה הצליחה
+    - עריכה ידנית של הקובץ נקלטת בלי הפעלה מחדש (watch בודק את זמן השינוי שלו)
+    - בדיקת הרשאה היא חיפוש אחד במילון שבזיכרון, בלי גישה לדיסק
+    מנהל הבוט מההגדרות (ADMIN_USER_ID) הוא תמיד מנהל ולא נשמר בקובץ
+    """
+
+    def __init__(self, users_file: str = USERS_FILE, admin_ids: Iterable[UserId] = (ADMIN_USER_ID,)):
+        self.users_file = users_file
+        self._admin_ids = {str(user_id) for user_id in admin_ids if str(user_id).strip()}
+        self._stored: Dict[str, str] = {}  # תוכן הקובץ: מזהה -> תפקיד
+        self._roles: Dict[str, str] = {}   # התוכן יחד עם מנהלי ההגדרות - מוחלף בשלמותו בכל שינוי
+        self._file_state: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._apply({})
         self._load_users()
-        
-    def _load_users(self):
+
+    def _load_users(self) -> None:
         """טעינת משתמשים מורשים מקובץ"""
-        if os.path.exists(USERS_FILE):
-            try:
-                with open(USERS_FILE, 'r', encoding='utf-8') as file:
-                    data = yaml.safe_load(file)
-                    if data and 'allowed_users' in data:
-                        self._allowed_users = set(map(str, data['allowed_users']))
-                logger.info(f"נטענו {len(self._allowed_users)} משתמשים מורשים")
-            except Exception as e:
-                logger.error(f"שגיאה בטעינת משתמשים: {e}")
-                
-    def _save_users(self):
-        """שמירת משתמשים מורשים לקובץ"""
+        with self._lock:
+            state = self._stat()
+            stored = self._read_users() if state else {}
+            self._file_state = state
+            if stored is None:
+                # קובץ פגום (למשל באמצע עריכה ידנית) - נשארים עם הרשימה הקודמת עד השינוי הבא
+                return
+            self._apply(stored)
+        logger.info(f"נטענו {len(self._stored)} משתמשים מורשים")
+
+    def _read_users(self) -> Optional[Dict[str, str]]:
+        """
+        קריאת הקובץ. תומך גם בפורמט הישן (רשימת allowed_users בלי תפקידים)
+        מחזיר None אם הקובץ לא תקין
+        """
         try:
-            os.makedirs(os.path.dirname(USERS_FILE), exist_ok=True)
-            with open(USERS_FILE, 'w', encoding='utf-8') as file:
-                yaml.dump({'allowed_users': list(self._allowed_users)}, file, allow_unicode=True)
-            logger.info("רשימת המשתמשים נשמרה בהצלחה")
+            with open(self.users_file, 'r', encoding='utf-8') as file:
+                data = yaml.safe_load(file) or {}
+            users = {}
+            for user_id in data.get('allowed_users') or []:
+                users[str(user_id)] = ROLE_USER
+            for user_id, role in (data.get('users') or {}).items():
+                users[str(user_id)] = role if role in ROLES else ROLE_USER
+            return users
+        except Exception as e:
+            logger.error(f"שגיאה בטעינת משתמשים: {e}")
+            return None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.users_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _apply(self, stored: Dict[str, str]) -> None:
+        roles = dict(stored)
+        roles.update({user_id: ROLE_ADMIN for user_id in self._admin_ids})
+        self._stored = stored
+        self._roles = roles
+
+    def _commit(self, stored: Dict[str, str]) -> None:
+        """שמירת הרשימה המלאה בכתיבה אחת (קובץ זמני והחלפה), ורק אז עדכון הזיכרון"""
+        # מנהלי ההגדרות קבועים ולא נכתבים לקובץ
+        stored = {user_id: role for user_id, role in stored.items() if user_id not in self._admin_ids}
+        os.makedirs(os.path.dirname(self.users_file), exist_ok=True)
+        temp_file = f"{self.users_file}.tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                yaml.safe_dump({'users': dict(sorted(stored.items()))}, file, allow_unicode=True)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_file, self.users_file)
         except Exception as e:
             logger.error(f"שגיאה בשמירת משתמשים: {e}")
-            
-    def is_user_allowed(self, user_id: int) -> bool:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        self._file_state = self._stat()  # הכתיבה שלנו לא נחשבת שינוי חיצוני
+        self._apply(stored)
+        logger.info("רשימת המשתמשים נשמרה בהצלחה")
+
+    def reload_if_changed(self) -> bool:
+        """טעינה מחדש אם הקובץ השתנה מאז הקריאה או הכתיבה האחרונה"""
+        if self._stat() == self._file_state:
+            return False
+        logger.info("קובץ המשתמשים השתנה, טוען מחדש")
+        self._load_users()
+        return True
+
+    async def watch(self, interval: float) -> None:
+        """בדיקה תקופתית של הקובץ (רצה ברקע לאורך חיי הבוט)"""
+        if interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                logger.error(f"שגיאה בבדיקת קובץ המשתמשים: {e}")
+
+    def is_user_allowed(self, user_id: UserId) -> bool:
         """בדיקה אם משתמש מורשה"""
-        return str(user_id) in self._allowed_users
-        
-    def add_user(self, user_id: int) -> bool:
+        return str(user_id) in self._roles
+
+    def is_admin(self, user_id: UserId) -> bool:
+        """בדיקה אם משתמש הוא מנהל"""
+        return self._roles.get(str(user_id)) == ROLE_ADMIN
+
+    def get_role(self, user_id: UserId) -> Optional[str]:
+        return self._roles.get(str(user_id))
+
+    def set_users(self, user_ids: Iterable[UserId], role: str = ROLE_USER) -> List[str]:
+        """
+        הוספת משתמשים (או שינוי תפקיד) בכתיבה אחת. מחזיר את המזהים שהשתנו
+        מנהלי ההגדרות (ADMIN_USER_ID) לא משתנים
+        """
+        if role not in ROLES:
+            raise ValueError(f"תפקיד לא מוכר: {role}")
+        with self._lock:
+            stored = dict(self._stored)
+            changed = [
+                user_id for user_id in dict.fromkeys(map(str, user_ids))
+                if user_id not in self._admin_ids and stored.get(user_id) != role
+            ]
+            for user_id in changed:
+                stored[user_id] = role
+            if changed:
+                self._commit(stored)
+                logger.info(f"עודכנו {len(changed)} משתמשים (תפקיד {role})")
+            return changed
+
+    def remove_users(self, user_ids: Iterable[UserId]) -> List[str]:
+        """הסרת משתמשים בכתיבה אחת. מחזיר את המזהים שהוסרו"""
+        with self._lock:
+            stored = dict(self._stored)
+            removed = [user_id for user_id in dict.fromkeys(map(str, user_ids)) if stored.pop(user_id, None)]
+            if removed:
+                self._commit(stored)
+                logger.info(f"הוסרו {len(removed)} משתמשים")
+            return removed
+
+    def add_user(self, user_id: UserId) -> bool:
         """הוספת משתמש מורשה"""
-        user_id_str = str(user_id)
-        if user_id_str not in self._allowed_users:
-            self._allowed_users.add(user_id_str)
-            self._save_users()
-            logger.info(f"משתמש {user_id} נוסף בהצלחה")
-            return True
-        return False
-        
-    def remove_user(self, user_id: int) -> bool:
+        if self.is_user_allowed(user_id):
+            return False
+        return bool(self.set_users([user_id]))
+
+    def remove_user(self, user_id: UserId) -> bool:
         """הסרת משתמש מורשה"""
-        user_id_str = str(user_id)
-        if user_id_str in self._allowed_users:
-            self._allowed_users.remove(user_id_str)
-            self._save_users()
-            logger.info(f"משתמש {user_id} הוסר בהצלחה")
-            return True
-        return False
-        
-    def add_users(self, user_ids: str) -> tuple[int, List[str]]:
-        """הוספת מספר משתמשים בבת אחת"""
-        added_count = 0
+        return bool(self.remove_users([user_id]))
+
+    def add_users(self, user_ids: str, role: Optional[str] = None) -> Tuple[int, List[str]]:
+        """
+        הוספת מספר משתמשים בבת אחת (כתיבה אחת לקובץ)
+        בלי role נוספים רק משתמשים שעוד לא מורשים (בתפקיד user), ותפקיד קיים לא משתנה.
+        עם role - גם משתמשים קיימים מקבלים את התפקיד הזה
+        """
+        valid_ids = []
         invalid_ids = []
-        
+
         # פיצול המחרוזת למזהים
-        ids = [id.strip() for id in user_ids.split(',')]
-        
-        for user_id in ids:
-            try:
-                # בדיקת תקינות המזהה
-                if user_id.isdigit():
-                    if self.add_user(int(user_id)):
-                        added_count += 1
-                else:
-                    invalid_ids.append(user_id)
-            except ValueError:
+        for user_id in (id.strip() for id in user_ids.split(',')):
+            if user_id.isdigit():
+                valid_ids.append(user_id)
+            elif user_id:
                 invalid_ids.append(user_id)
-                
+
+        if role is None:
+            new_ids = [user_id for user_id in valid_ids if not self.is_user_allowed(user_id)]
+            role = ROLE_USER
+        else:
+            new_ids = [user_id for user_id in valid_ids if self.get_role(user_id) != role]
+        added_count = len(self.set_users(new_ids, role)) if new_ids else 0
         return added_count, invalid_ids
-        
+
     def get_allowed_users(self) -> List[str]:
         """קבלת רשימת המשתמשים המורשים"""
-        return list(self._allowed_users)
+        return list(self._roles)
+
+    def get_users(self) -> Dict[str, str]:
+        """קבלת המשתמשים המורשים עם התפקיד של כל אחד"""
+        return dict(self._roles)
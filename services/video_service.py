@@ -1,103 +1,390 @@
 import os
+import time
 import logging
 import asyncio
 from collections import defaultdict
-from moviepy.editor import VideoFileClip
-from config.settings import TARGET_GROUP_ID
-from utils.helpers import clean_filename, get_video_caption, wait_for_file_release, wait_and_delete
-from services.file_service import check_existing_file, save_file_id, convert_to_mp4, create_thumbnail
+from config.settings import (
+    TARGET_GROUP_ID, MAX_CONCURRENT_JOBS, DOWNLOAD_WORKERS, TRANSCODE_WORKERS, UPLOAD_WORKERS,
+    STREAMING_TRANSCODE, STREAMABLE_EXTENSIONS, DISK_CHECK_INTERVAL,
+    DOWNLOAD_RESUME_ATTEMPTS, DOWNLOAD_RESUME_BACKOFF, DOWNLOAD_RESUME_MAX_BACKOFF, STALLED_JOB_MAX_AGE
+)
+from utils.helpers import clean_filename, get_video_caption
+from services.file_service import (
+    check_existing_file, save_file_id, convert_to_mp4, create_thumbnail,
+    check_existing_unique_id, check_existing_fingerprint, save_content_keys, compute_fingerprint
+)
 from services.queue_service import QueueService
+from services.streaming_service import stream_download_and_convert
+from services.download_service import ChunkedDownloader
+from services.upload_service import ParallelUploader
+from services.admission_service import AdmissionController, REJECT, format_eta
+from utils.video_probe import probe_video
+from utils.progress import get_transcode_progress_callback
+from utils.edit_dispatcher import edit_dispatcher
+from utils.worker_pool import WorkerPool
+from utils.metrics import STAGE_SECONDS, STAGE_FAILURES, JOBS_FINISHED, record_transfer
+from utils.tracing import tracer
+from utils.janitor import janitor
+from utils.thumbnails import thumbnail_engine
+from utils.job_store import job_store, STAGE_DOWNLOADING, STAGE_DOWNLOADED, STAGE_CONVERTED, STAGE_UPLOADED
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+
+class JobCancelled(asyncio.CancelledError):
+    """ביטול עבודה על ידי המשתמש (להבדיל מעצירת הבוט, שבה העבודה נשמרת להמשך)"""
+
+
+class DownloadInterrupted(Exception):
+    """הורדה שנעצרה בגלל שגיאת רשת - הקובץ החלקי ונקודת הביקורת נשמרים להמשך"""
+
+
 class VideoService:
     def __init__(self, app, download_path):
         self.app = app
         self.download_path = download_path
         self.queue_service = QueueService()  # הוספת שירות התור
-        self.active_downloads = defaultdict(asyncio.Event)  # אירועי ביטול לפי ID משתמש
+        self.active_downloads = defaultdict(dict)  # אירועי ביטול לפי ID משתמש ו-ID הודעה
+        self.downloader = ChunkedDownloader(app)  # הורדה במקטעים עם נקודות ביקורת
+        self.uploader = ParallelUploader(app)  # העלאה בחלקים במקביל
+        self.worker_pool = WorkerPool(
+            MAX_CONCURRENT_JOBS,
+            {'download': DOWNLOAD_WORKERS, 'transcode': TRANSCODE_WORKERS, 'upload': UPLOAD_WORKERS},
+            on_job_done=self._dispatch_jobs
+        )
+        self.admission = AdmissionController(download_path)  # בקרת קבלה ותקציב משאבים
+        self._disk_recheck = None  # בדיקה חוזרת מתוזמנת כשהתחלת עבודות מושהית
+        self._stalled = {}  # הורדות שנקטעו וממתינות להמשך: (צ'אט, הודעה) -> (הודעה, תזמון החזרה לתור או הוויתור)
+        self._resume_attempts = defaultdict(int)  # מספר ההחזרות לתור של כל הורדה שנקטעה
 
     async def cancel_download(self, user_id: int) -> None:
         """ביטול הורדה של משתמש"""
-        # ביטול ההורדה הפעילה
+        # ביטול ההורדות הפעילות
         if user_id in self.active_downloads:
-            self.active_downloads[user_id].set()
+            for event in self.active_downloads[user_id].values():
+                event.set()
             logging.info(f"הורדה בוטלה עבור משתמש {user_id}")
         
         # ביטול כל ההורדות של המשתמש בתור
-        await self.queue_service.cancel_user_downloads(user_id)
-        
-        # אם יש קבצים בתור, מתחיל לעבד את הבא בתור
-        if len(self.queue_service.upload_queue) > 0:
-            next_message = self.queue_service.upload_queue[0]
-            asyncio.create_task(self.process_video_message(next_message))
+        for cancelled in await self.queue_service.cancel_user_downloads(user_id):
+            job_store.remove(cancelled.chat.id, cancelled.id)
+            self.admission.release(cancelled)
+            tracer.end_trace(cancelled, 'cancelled')
+
+        # ביטול הורדות שנקטעו וממתינות להמשך - רק כאן הקבצים החלקיים שלהן נמחקים
+        for key, (stalled, _) in list(self._stalled.items()):
+            if stalled.from_user.id == user_id:
+                self._drop_stalled(key)
+
+    def _drop_stalled(self, key, outcome: str = 'cancelled') -> None:
+        """ויתור על הורדה שנקטעה: הסרה מהמאגר ומחיקת התיקייה שלה"""
+        message, handle = self._stalled.pop(key, (None, None))
+        self._resume_attempts.pop(key, None)
+        if handle is not None:
+            handle.cancel()
+        if message is not None:
+            job_store.remove(message.chat.id, message.id)
+            janitor.delete_tree(self._job_dir(message))
+            JOBS_FINISHED.inc(outcome=outcome)
+
+    async def _schedule_resume(self, message) -> None:
+        """
+        החזרת הורדה שנקטעה לתור אחרי המתנה שגדלה בכל ניסיון.
+        העבודה נשארת במאגר והתיקייה שלה נשמרת, כך שההורדה ממשיכה מנקודת הביקורת.
+        אחרי הניסיון האחרון המשתמש מקבל כפתור להמשך ידני
+        """
+        key = (message.chat.id, message.id)
+        self._resume_attempts[key] += 1
+        attempt = self._resume_attempts[key]
+        cancel_button = InlineKeyboardButton("ביטול ❌", callback_data=f"cancel_download_{message.from_user.id}")
+
+        if attempt <= DOWNLOAD_RESUME_ATTEMPTS:
+            delay = min(DOWNLOAD_RESUME_MAX_BACKOFF, DOWNLOAD_RESUME_BACKOFF * 2 ** (attempt - 1))
+            handle = asyncio.get_running_loop().call_later(
+                delay, lambda: asyncio.ensure_future(self._resume_download(key))
+            )
+            text = (
+                f"⚠️ שגיאת רשת בהורדת הקובץ. ההתקדמות נשמרה, וההורדה תמשיך אוטומטית "
+                f"בעוד {format_eta(delay)} (ניסיון {attempt}/{DOWNLOAD_RESUME_ATTEMPTS})"
+            )
+            reply_markup = InlineKeyboardMarkup([[cancel_button]])
+        else:
+            # בלי המשך ידני בתוך STALLED_JOB_MAX_AGE - ויתור על ההורדה ומחיקת הקבצים החלקיים
+            handle = asyncio.get_running_loop().call_later(STALLED_JOB_MAX_AGE, self._drop_stalled, key, 'failed')
+            text = "⚠️ ההורדה נעצרה בגלל שגיאות רשת חוזרות. ההתקדמות נשמרה - אפשר להמשיך מאותה נקודה."
+            reply_markup = InlineKeyboardMarkup([[
+                InlineKeyboardButton("המשך הורדה 🔄", callback_data=f"resume_download_{message.chat.id}_{message.id}"),
+                cancel_button
+            ]])
+        self._stalled[key] = (message, handle)
+        logging.warning(f"ההורדה של הודעה {message.id} נקטעה (ניסיון {attempt}), נשמרת להמשך")
 
-    def _check_cancellation(self, user_id: int) -> None:
+        try:
+            await message.reply_text(text, reply_markup=reply_markup)
+        except Exception as e:
+            logging.warning(f"לא ניתן לעדכן את המשתמש על הורדה שנקטעה: {e}")
+
+    async def _resume_download(self, key) -> None:
+        """החזרת הורדה שנקטעה לתור (אותה תיקיית עבודה ואותה נקודת ביקורת)"""
+        message, _ = self._stalled.pop(key, (None, None))
+        if message is None or key not in job_store:
+            return
+        file = message.video or message.document
+        file_name = clean_filename(file.file_name or "video.mp4")
+        tracer.start_trace(message, file_name=file_name, size=file.file_size, resumed=True)
+        self.admission.register(message, self.admission.estimate(file_name, file.file_size))
+        await self.queue_service.add_to_queue(message)
+        tracer.open_span(message, 'queue_wait')
+        self._dispatch_jobs()
+
+    @property
+    def scheduled_resumes(self) -> int:
+        """מספר ההורדות שנקטעו ויחזרו לתור אוטומטית"""
+        return sum(1 for key in self._stalled if self._resume_attempts[key] <= DOWNLOAD_RESUME_ATTEMPTS)
+
+    async def retry_download(self, user_id: int, chat_id: int, message_id: int) -> bool:
+        """המשך ידני של הורדה שנקטעה (כפתור "המשך הורדה"). מחזיר False אם אין הורדה כזו"""
+        key = (chat_id, message_id)
+        message, handle = self._stalled.get(key, (None, None))
+        if message is None or message.from_user.id != user_id:
+            return False
+        if handle is not None:
+            handle.cancel()
+        self._resume_attempts[key] = 0  # סבב חדש של ניסיונות אוטומטיים
+        await self._resume_download(key)
+        return True
+
+    def _check_cancellation(self, user_id: int, message_id: int) -> None:
         """בדיקה אם ההורדה בוטלה"""
-        if user_id in self.active_downloads and self.active_downloads[user_id].is_set():
-            raise asyncio.CancelledError("ההורדה בוטלה על ידי המשתמש")
+        event = self.active_downloads.get(user_id, {}).get(message_id)
+        if event and event.is_set():
+            raise JobCancelled("ההורדה בוטלה על ידי המשתמש")
+
+    def _dispatch_jobs(self) -> None:
+        """הפעלת קבצים מהתור כל עוד יש מקום פנוי במאגר העובדים, בדיסק ובתקציב"""
+        while self.worker_pool.has_capacity() and len(self.queue_service):
+            next_message = self.queue_service.peek_next()
+            if next_message is None:
+                break
+            if not janitor.has_free_space(self.download_path) or not self.admission.can_start(next_message):
+                self._pause_admission()
+                break
+            self.queue_service.pop_next()
+            self.admission.start(next_message)
+            self.worker_pool.start(self._run_job(next_message))
+
+    def _pause_admission(self) -> None:
+        """השהיית התחלת עבודות חדשות עד שיתפנה מקום בדיסק או בתקציב"""
+        if self._disk_recheck is not None:
+            return
+        logging.warning(
+            f"עבודות חדשות מושהות: {janitor.free_bytes(self.download_path) // (1024 * 1024)} MB פנויים, "
+            f"{self.admission.reserved_bytes // (1024 * 1024)} MB שמורים לעבודות פעילות"
+        )
+        self._disk_recheck = asyncio.get_running_loop().call_later(DISK_CHECK_INTERVAL, self._resume_admission)
+
+    def _resume_admission(self) -> None:
+        self._disk_recheck = None
+        self._dispatch_jobs()
+
+    def sweep_orphans(self) -> None:
+        """
+        מחיקת שאריות בתיקיות ההורדות והקבצים הזמניים, חוץ מתיקיות של עבודות שעוד לא הסתיימו.
+        עבודה שלא התקדמה יותר מ-STALLED_JOB_MAX_AGE (למשל הורדה שנקטעה ונזנחה) מוסרת, והתיקייה שלה נמחקת
+        """
+        keep = set()
+        now = time.time()
+        for job in job_store.pending():
+            if now - job['updated_at'] > STALLED_JOB_MAX_AGE:
+                logging.info(f"עבודה {job['message_id']} לא התקדמה מאז {time.ctime(job['updated_at'])}, נמחקת")
+                job_store.remove(job['chat_id'], job['message_id'])
+                continue
+            keep.add(f"{job['chat_id']}_{job['message_id']}")
+        keep.add(os.path.basename(thumbnail_engine.cache_dir))  # מטמון התמונות הממוזערות נשמר בין הפעלות
+        janitor.sweep(keep=keep)
+
+    async def resume_jobs(self):
+        """החזרת עבודות שלא הסתיימו לתור (בהפעלת הבוט)"""
+        resumed = 0
+        for job in job_store.pending():
+            try:
+                message = await self.app.get_messages(job['chat_id'], job['message_id'])
+            except Exception as e:
+                logging.warning(f"לא ניתן לטעון את הודעה {job['message_id']} לצורך המשך: {e}")
+                message = None
+
+            if not message or message.empty or not (message.video or message.document):
+                job_store.remove(job['chat_id'], job['message_id'])
+                continue
+
+            file = message.video or message.document
+            self.admission.register(message, self.admission.estimate(job['file_name'] or '', file.file_size))
+            await self.queue_service.add_to_queue(message)
+            resumed += 1
+            logging.info(f"עבודה {message.id} חזרה לתור מהשלב {job['stage']}")
+
+        if resumed:
+            logging.info(f"{resumed} עבודות שלא הסתיימו חזרו לתור")
+        self._dispatch_jobs()
 
     async def process_video_message(self, message):
         """עיבוד הודעת וידאו חדשה"""
         file = message.video or message.document
         original_file_name = file.file_name if file.file_name else "video.mp4"
         clean_file_name = clean_filename(original_file_name)
-        user_id = message.from_user.id
+        tracer.start_trace(message, file_name=clean_file_name, size=file.file_size)
 
         # בדיקת קובץ קיים
         existing_file_id = check_existing_file(clean_file_name)
         if existing_file_id:
             await self._send_existing_video(message, existing_file_id, clean_file_name)
+            tracer.end_trace(message, 'duplicate')
             return
 
-        # בדיקת מיקום בתור לפני הוספה
-        is_first = len(self.queue_service.user_queue) == 0 or self.queue_service.is_first_user(user_id)
-        
-        # הוספה לתור
-        if not is_first:
-            # משתמש לא ראשון - מוסיף עם הודעת המתנה
-            position = await self.queue_service.add_to_queue(message)
-            queue_message = await message.reply(f"הקובץ התקבל ✅\nמיקומך בתור: {position}")
+        # בדיקת קובץ קיים לפי המזהה הייחודי של טלגרם (אותו קובץ בשם אחר)
+        file_unique_id = getattr(file, 'file_unique_id', None)
+        existing_file_id = check_existing_unique_id(file_unique_id)
+        if existing_file_id:
+            await self._send_existing_video(message, existing_file_id, clean_file_name)
+            tracer.end_trace(message, 'duplicate')
+            return
+
+        # בקרת קבלה - הערכת העלות ודחייה כשהשרת מעבר לתקציב
+        cost = self.admission.estimate(clean_file_name, file.file_size)
+        decision = self.admission.check(cost)
+        if decision.decision == REJECT:
+            logging.warning(f"Message {message.id} rejected: {decision.reason}")
+            await message.reply_text(f"לא ניתן לקבל את הקובץ כרגע: {decision.reason} 🚫")
+            JOBS_FINISHED.inc(outcome='rejected')
+            tracer.end_trace(message, 'rejected')
+            return
+
+        # רישום העבודה במאגר והוספה לתור
+        job_store.add(message, clean_file_name)
+        self.admission.register(message, cost)
+        await self.queue_service.add_to_queue(message)
+        tracer.open_span(message, 'queue_wait')
+        self._dispatch_jobs()
+
+        # אם העבודה לא התחילה מיד, המשתמש מקבל הודעה עם מיקומו וזמן משוער
+        position = self.queue_service.get_message_position(message.id)
+        if position is not None:
+            eta = self.admission.eta_seconds(message, position)
+            queue_message = await message.reply(
+                f"הקובץ התקבל ✅\nמיקומך בתור: {position}\n⏱ זמן משוער: {format_eta(eta)}"
+            )
             self.queue_service.queue_messages[message.id] = queue_message
         else:
-            # משתמש ראשון - מוסיף בלי הודעת המתנה
-            await self.queue_service.add_to_queue(message)
-        
-        # אם זה לא הקובץ הראשון בתור, מחכים
-        if not self.queue_service.is_first_in_queue(message.id):
-            logging.info(f"Message {message.id} waiting in queue")
-            return
-        
+            logging.info(f"Message {message.id} starting immediately")
+
+    async def _run_job(self, message):
+        """עיבוד קובץ מהתור: הורדה, המרה והעלאה, כל שלב במאגר העובדים שלו"""
+        file = message.video or message.document
+        original_file_name = file.file_name if file.file_name else "video.mp4"
+        clean_file_name = clean_filename(original_file_name)
+        file_unique_id = getattr(file, 'file_unique_id', None)
+        user_id = message.from_user.id
+        job = job_store.get(message) or {}
+        stage = job.get('stage')
+        keep_job = False  # בעצירת הבוט העבודה נשארת במאגר ותמשיך בהפעלה הבאה
+        outcome = 'failed'
+        tracer.close_span(message, 'queue_wait')
+        tracer.event(message, 'job_start', stage=stage)
+
         try:
-            # הודעת תחילת הורדה
-            download_message = await message.reply("הקובץ התקבל\nאנא המתן...✅")
-            await asyncio.sleep(3)
-            await download_message.delete()
-
-            # הורדת הקובץ
-            file_path = await self._download_video(message, file, clean_file_name)
-            if file_path:
-                # עיבוד הוידאו
-                processed_video = await self._process_video(message, file_path, clean_file_name)
-                if processed_video:
-                    # שליחת הוידאו
-                    await self._send_processed_video(message, processed_video)
-                    
-                    # הסרה מהתור רק אחרי שהקובץ נשלח בהצלחה
-                    await self.queue_service.remove_from_queue(message.id, user_id)
-                    
-                    # מעבר לקובץ הבא בתור
-                    if len(self.queue_service.upload_queue) > 0:
-                        next_message = self.queue_service.upload_queue[0]
-                        asyncio.create_task(self.process_video_message(next_message))
+            # הקובץ כבר הועלה לפני הפעלה מחדש - נשאר רק לשלוח למשתמש
+            if stage == STAGE_UPLOADED and job.get('file_id'):
+                await self._send_existing_video(message, job['file_id'], clean_file_name)
+                janitor.delete_tree(self._job_dir(message))
+                outcome = 'done'
+                return
+
+            if stage in (STAGE_DOWNLOADED, STAGE_CONVERTED) and job.get('file_path') and os.path.exists(job['file_path']):
+                # המשך מהשלב האחרון שהושלם, עם הקבצים שכבר נמצאים בדיסק
+                logging.info(f"ממשיך את עבודה {message.id} מהשלב {stage}")
+                file_path = job['file_path']
+                fingerprint = job.get('fingerprint')
+                converted_path = job.get('converted_path')
+            else:
+                # הודעת תחילת הורדה
+                download_message = await message.reply("הקובץ התקבל\nאנא המתן...✅")
+                edit_dispatcher.delete_later(download_message)
+
+                # במצב זרימה ההמרה רצה במקביל להורדה כשיש ל-ffmpeg מקום פנוי (ראה streaming_service)
+                stream_output = None
+                if STREAMING_TRANSCODE and os.path.splitext(clean_file_name)[1].lower() in STREAMABLE_EXTENSIONS:
+                    stream_output = os.path.splitext(self._job_file_path(message, clean_file_name))[0] + '.mp4'
+
+                # הורדת הקובץ
+                job_store.set_stage(message, STAGE_DOWNLOADING)
+                with tracer.span(message, 'download', streaming=bool(stream_output)):
+                    async with self.worker_pool.stage('download'):
+                        file_path = await self._download_video(message, file, clean_file_name, stream_output)
+                if not file_path:
+                    return
 
+                # בדיקת כפילות לפי טביעת האצבע של התוכן שהורד
+                with tracer.span(message, 'fingerprint'):
+                    fingerprint = await asyncio.to_thread(compute_fingerprint, file_path)
+                existing_file_id = check_existing_fingerprint(fingerprint)
+                if existing_file_id:
+                    await self._send_existing_video(message, existing_file_id, clean_file_name)
+                    await save_content_keys(existing_file_id, file_unique_id=file_unique_id)
+                    outcome = 'duplicate'  # תיקיית העבודה נמחקת בסיום
+                    return
+
+                converted_path = stream_output if stream_output and os.path.exists(stream_output) else None
+                job_store.set_stage(
+                    message, STAGE_DOWNLOADED,
+                    file_path=file_path, fingerprint=fingerprint, converted_path=converted_path
+                )
+
+            # עיבוד הוידאו
+            with tracer.span(message, 'process'):
+                async with self.worker_pool.stage('transcode'):
+                    processed_video = await self._process_video(
+                        message, file_path, clean_file_name, converted_path, fingerprint
+                    )
+            if not processed_video:
+                return
+            processed_video['file_unique_id'] = file_unique_id
+            processed_video['fingerprint'] = fingerprint
+            job_store.set_stage(message, STAGE_CONVERTED, converted_path=processed_video['file_path'])
+
+            # שליחת הוידאו
+            with tracer.span(message, 'send'):
+                async with self.worker_pool.stage('upload'):
+                    if await self._send_processed_video(message, processed_video):
+                        outcome = 'done'
+
+        except JobCancelled:
+            outcome = 'cancelled'
+            logging.info(f"העיבוד של הודעה {message.id} בוטל")
+        except DownloadInterrupted:
+            # שגיאת רשת - העבודה והתיקייה שלה נשמרות, וההורדה חוזרת לתור אחרי המתנה
+            keep_job = True
+            outcome = 'interrupted'
+            await self._schedule_resume(message)
+        except asyncio.CancelledError:
+            logging.info(f"העיבוד של הודעה {message.id} נעצר, ימשיך בהפעלה הבאה")
+            keep_job = True
+            raise
         except Exception as e:
             logging.error(f"שגיאה בעיבוד הוידאו: {e}")
             await message.reply_text("אירעה שגיאה בעיבוד הוידאו. אנא נסה שוב.")
-            # במקרה של שגיאה, מסיר מהתור ועובר לבא
+        finally:
+            # הסרה מהתור בכל מקרה; מאגר העובדים יפעיל את הקובץ הבא
             await self.queue_service.remove_from_queue(message.id, user_id)
-            if len(self.queue_service.upload_queue) > 0:
-                next_message = self.queue_service.upload_queue[0]
-                asyncio.create_task(self.process_video_message(next_message))
+            self.admission.release(message)
+            if not keep_job:
+                self._resume_attempts.pop((message.chat.id, message.id), None)
+                job_store.remove(message.chat.id, message.id)
+                JOBS_FINISHED.inc(outcome=outcome)
+                if outcome != 'done':
+                    # עבודה שנכשלה בלי אפשרות המשך או בוטלה - כל מה שנשאר בתיקייה שלה נמחק ברקע.
+                    # הורדה שנקטעה ברשת לא מגיעה לכאן (keep_job): הקובץ החלקי ונקודת הביקורת נשמרים,
+                    # ונמחקים רק בביטול או אחרי STALLED_JOB_MAX_AGE
+                    janitor.delete_tree(self._job_dir(message))
+            tracer.end_trace(message, 'interrupted' if keep_job else outcome)
 
     async def _send_existing_video(self, message, file_id, file_name):
         """שליחת וידאו קיים"""
@@ -108,137 +395,174 @@ class VideoService:
         )
         logging.info(f"הקובץ {file_name} כבר קיים ונשלח ישירות מהקבוצה.")
 
-    async def _download_video(self, message, file, clean_file_name):
-        """הורדת קובץ הוידאו"""
+    def _job_dir(self, message):
+        """תיקיית העבודה - תיקייה נפרדת לכל עבודה, כדי שקבצים באותו שם לא יתנגשו"""
+        return os.path.join(self.download_path, f"{message.chat.id}_{message.id}")
+
+    def _job_file_path(self, message, file_name):
+        """נתיב קובץ בתיקיית העבודה"""
+        job_dir = self._job_dir(message)
+        os.makedirs(job_dir, exist_ok=True)
+        return os.path.join(job_dir, file_name)
+
+    async def _download_video(self, message, file, clean_file_name, stream_output=None):
+        """הורדת קובץ הוידאו (ובמצב זרימה גם המרה ל-stream_output במקביל)"""
         try:
-            file_path = os.path.join(self.download_path, clean_file_name)
-            await self._download_with_progress(message, file_path)
+            file_path = self._job_file_path(message, clean_file_name)
+            await self._download_with_progress(message, file_path, stream_output)
             logging.info(f"הקובץ הורד בהצלחה ל- {file_path}")
             return file_path
         except (TimeoutError, ConnectionError) as e:
             logging.error(f"שגיאת רשת בהורדת הקובץ: {e}")
-            await message.reply_text("אירעה שגיאת רשת בהורדת הקובץ. אנא נסה שוב.")
-            # הסרה מהתור במקרה של שגיאת רשת
-            await self.queue_service.remove_from_queue(message.id, message.from_user.id)
-            return None
+            raise DownloadInterrupted(str(e)) from e
         except Exception as e:
             logging.error(f"נכשל בהורדת הקובץ: {e}")
             await message.reply_text("אירעה שגיאה בהורדת הקובץ. אנא נסה שוב.")
-            # הסרה מהתור במקרה של שגיאה כללית
-            await self.queue_service.remove_from_queue(message.id, message.from_user.id)
             return None
 
-    async def _process_video(self, message, file_path, clean_file_name):
-        """עיבוד קובץ הוידאו"""
+    async def _process_video(self, message, file_path, clean_file_name, converted_path=None, fingerprint=None):
+        """
+        עיבוד קובץ הוידאו (converted_path - קובץ MP4 שכבר הומר, אם יש)
+        התמונה הממוזערת נוצרת מהמקור במקביל להמרה, ונשמרת במטמון לפי fingerprint
+        """
         processing_message = None
+        thumbnail_task = None
         try:
             # הודעת התחלת עיבוד
             processing_message = await message.reply("🔄 מעבד את הוידאו...")
             
             base_name, ext = os.path.splitext(clean_file_name)
             original_path = file_path  # שמירת הנתיב המקורי
+            job_dir = os.path.dirname(file_path)
+
+            # קבלת מידע על הוידאו (משך, מימדים, קודקים) בקריאה אחת ל-ffprobe
+            with tracer.span(message, 'probe'):
+                video_info = await probe_video(file_path)
+
+            # יצירת תמונה ממוזערת ברקע - לא תלויה בתוצאת ההמרה
+            thumbnail_task = asyncio.create_task(self._create_thumbnail(
+                message, file_path, os.path.join(job_dir, f"{base_name}.jpg"), video_info, fingerprint
+            ))
             
             # המרה ל-MP4 אם נדרש
             if ext.lower() != '.mp4':
-                await processing_message.edit_text("🔄 ממיר את הוידאו ל-MP4...")
-                mp4_file = os.path.join(self.download_path, f"{base_name}.mp4")
-                if not await convert_to_mp4(file_path, mp4_file):
-                    await processing_message.edit_text("❌ שגיאה בהמרת הוידאו")
-                    await self.queue_service.remove_from_queue(message.id, message.from_user.id)
-                    return None
+                edit_dispatcher.submit(processing_message, "🔄 ממיר את הוידאו ל-MP4...")
+                mp4_file = os.path.join(job_dir, f"{base_name}.mp4")
+                if converted_path and os.path.exists(converted_path):
+                    # הקובץ כבר הומר (בזמן ההורדה במצב זרימה, או לפני הפעלה מחדש)
+                    logging.info(f"הקובץ כבר הומר: {converted_path}")
+                    mp4_file = converted_path
+                else:
+                    convert_started = time.monotonic()
+                    with tracer.span(message, 'convert'):
+                        conversion_mode = await convert_to_mp4(
+                            file_path, mp4_file, video_info,
+                            progress=get_transcode_progress_callback(
+                                processing_message, "🔄 ממיר את הוידאו ל-MP4...", video_info.get('duration_exact', 0)
+                            )
+                        )
+                    if conversion_mode:
+                        # עדכון מהירות ההמרה המשוערת לפי ההמרה שבוצעה בפועל (ולא לפי המכולה)
+                        self.admission.observe(
+                            self.admission.conversion_kind(conversion_mode), os.path.getsize(file_path),
+                            time.monotonic() - convert_started
+                        )
+                    else:
+                        await edit_dispatcher.close(processing_message, "❌ שגיאה בהמרת הוידאו")
+                        return None
                 file_path = mp4_file
 
-            # יצירת תמונה ממוזערת
-            await processing_message.edit_text("🔄 יוצר תמונה ממוזערת...")
-            thumbnail_file = os.path.join(self.download_path, f"{base_name}.jpg")
-            try:
-                thumbnail_success = await create_thumbnail(file_path, thumbnail_file)
-                if not thumbnail_success:
-                    logging.warning("נכשל ביצירת תמונה ממוזערת, ממשיך בלעדיה")
-                    thumbnail_file = None
-            except Exception as e:
-                logging.warning(f"שגיאה ביצירת תמונה ממוזערת: {e}")
-                thumbnail_file = None
-            
-            # חישוב משך הוידאו
-            await processing_message.edit_text("🔄 מחשב את משך הוידאו...")
-            video = VideoFileClip(file_path)
-            duration = int(video.duration)
-            video.close()
+            # המתנה לתמונה הממוזערת (בדרך כלל כבר מוכנה)
+            if not thumbnail_task.done():
+                edit_dispatcher.submit(processing_message, "🔄 יוצר תמונה ממוזערת...")
+            thumbnail_file = await thumbnail_task
             
-            await processing_message.edit_text("✅ העיבוד הושלם!")
-            await asyncio.sleep(3)
-            await processing_message.delete()
+            edit_dispatcher.finish(processing_message, "✅ העיבוד הושלם!")
 
             return {
                 'file_path': file_path,
                 'thumbnail_path': thumbnail_file,  # יכול להיות None
-                'duration': duration,
+                'duration': video_info.get('duration', 0),
+                'width': video_info.get('width', 0),
+                'height': video_info.get('height', 0),
+                'video_info': video_info,
                 'original_path': original_path if original_path != file_path else None
             }
             
         except Exception as e:
             if processing_message:
-                await processing_message.edit_text("❌ שגיאה בעיבוד הוידאו")
-                await asyncio.sleep(3)
-                await processing_message.delete()
+                edit_dispatcher.finish(processing_message, "❌ שגיאה בעיבוד הוידאו")
             logging.error(f"שגיאה בעיבוד הוידאו: {e}")
-            await self.queue_service.remove_from_queue(message.id, message.from_user.id)
+            return None
+        finally:
+            if thumbnail_task and not thumbnail_task.done():
+                thumbnail_task.cancel()
+                await asyncio.gather(thumbnail_task, return_exceptions=True)
+
+    async def _create_thumbnail(self, message, source_path, thumbnail_file, video_info, fingerprint=None):
+        """יצירת תמונה ממוזערת (או לקיחתה מהמטמון), מחזיר את הנתיב או None"""
+        try:
+            with tracer.span(message, 'thumbnail', cached=bool(thumbnail_engine.cached(fingerprint))):
+                path = await create_thumbnail(
+                    source_path, thumbnail_file, video_info.get('duration_exact') or video_info.get('duration', 0),
+                    fingerprint=fingerprint
+                )
+            if not path:
+                logging.warning("נכשל ביצירת תמונה ממוזערת, ממשיך בלעדיה")
+            return path
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"שגיאה ביצירת תמונה ממוזערת: {e}")
             return None
 
     async def _send_processed_video(self, message, video_data):
-        """שליחת הוידאו המעובד"""
+        """שליחת הוידאו המעובד, מחזיר True בהצלחה"""
         try:
             logging.info("מתחיל שליחת וידאו...")
             caption = get_video_caption(video_data['file_path'])
             logging.info(f"נוצרה כותרת: {caption}")
             
-            # שליחה למשתמש
-            logging.info("שולח למשתמש...")
-            await self._upload_with_progress(message, video_data, caption)
-            logging.info("נשלח למשתמש בהצלחה")
-            
-            # שליחה לקבוצת היעד
-            logging.info("מכין פרמטרים לשליחה לקבוצת היעד...")
-            send_params = {
-                'chat_id': TARGET_GROUP_ID,
-                'video': video_data['file_path'],
-                'duration': video_data['duration'],
-                'caption': caption,
-                'supports_streaming': True
-            }
-            
-            # הוספת תמונה ממוזערת רק אם היא קיימת
-            if video_data.get('thumbnail_path'):
-                logging.info(f"מוסיף תמונה ממוזערת: {video_data['thumbnail_path']}")
-                if os.path.exists(video_data['thumbnail_path']):
-                    send_params['thumb'] = video_data['thumbnail_path']
-                else:
-                    logging.warning("קובץ התמונה הממוזערת לא נמצא")
-            
-            logging.info(f"שולח לקבוצת היעד {TARGET_GROUP_ID}...")
-            sent_message = await self.app.send_video(**send_params)
-            logging.info("הוידאו נשלח בהצלחה לקבוצת היעד")
+            # העלאה אחת בלבד - לקבוצת היעד, עם פס התקדמות אצל המשתמש
+            logging.info(f"מעלה לקבוצת היעד {TARGET_GROUP_ID}...")
+            with tracer.span(message, 'upload', size=os.path.getsize(video_data['file_path'])):
+                sent_message = await self._upload_with_progress(message, video_data, caption)
+            file_id = sent_message.video.file_id
+            logging.info("הוידאו הועלה בהצלחה לקבוצת היעד")
             
-            # שמירת מזהה הקובץ
+            # שמירת מזהה הקובץ מיד עם קבלתו
             file_name = os.path.basename(video_data['file_path'])
             logging.info(f"שומר file_id עבור {file_name}")
-            save_file_id(file_name, sent_message.video.file_id)
+            await save_file_id(file_name, file_id)
+            await save_content_keys(
+                file_id,
+                file_unique_id=video_data.get('file_unique_id'),
+                fingerprint=video_data.get('fingerprint')
+            )
+            job_store.set_stage(message, STAGE_UPLOADED, file_id=file_id)
+            
+            # שליחה למשתמש לפי file_id, בלי להעלות את הקובץ שוב
+            logging.info("שולח למשתמש...")
+            with tracer.span(message, 'deliver'):
+                await message.reply_video(video=file_id, caption=caption)
+            logging.info("נשלח למשתמש בהצלחה")
             
             # ניקוי קבצים
             logging.info("מנקה קבצים זמניים...")
-            await self._cleanup_files(video_data)
+            with tracer.span(message, 'cleanup'):
+                await self._cleanup_files(video_data)
             logging.info("תהליך השליחה הושלם בהצלחה")
+            return True
             
         except Exception as e:
             logging.error(f"שגיאה בשליחת הוידאו: {str(e)}", exc_info=True)
             await message.reply_text("אירעה שגיאה בשליחת הוידאו. אנא נסה שוב.")
-            await self.queue_service.remove_from_queue(message.id, message.from_user.id)
+            return False
 
-    async def _download_with_progress(self, message, file_path):
+    async def _download_with_progress(self, message, file_path, stream_output=None):
         """הורדת קובץ עם פס התקדמות"""
         user_id = message.from_user.id
-        self.active_downloads[user_id] = asyncio.Event()  # איפוס אירוע הביטול
+        self.active_downloads[user_id][message.id] = asyncio.Event()  # אירוע ביטול להורדה הזו
         
         # יצירת כפתור ביטול
         cancel_button = InlineKeyboardMarkup([
@@ -252,7 +576,7 @@ class VideoService:
 
         async def progress(current, total):
             try:
-                self._check_cancellation(user_id)
+                self._check_cancellation(user_id, message.id)
                 
                 nonlocal last_percentage, last_update_time, downloaded_size
                 percentage = int(current * 100 / total)
@@ -276,38 +600,40 @@ class VideoService:
                         f"📊 גודל: {total / (1024 * 1024):.1f} MB"
                     )
                     
-                    # בדיקה אם הטקסט השתנה לפני העדכון
-                    if progress_message.text != new_text:
-                        try:
-                            await progress_message.edit_text(
-                                new_text,
-                                reply_markup=cancel_button
-                            )
-                        except Exception as e:
-                            if "MESSAGE_NOT_MODIFIED" not in str(e):
-                                logging.warning(f"שגיאה בעדכון סטטוס ההורדה: {e}")
+                    # העריכה נשלחת דרך המנהל המרכזי, בלי לעכב את ההורדה
+                    edit_dispatcher.submit(progress_message, new_text, reply_markup=cancel_button)
             except asyncio.CancelledError:
                 raise
 
+        started = time.monotonic()
         try:
-            await message.download(file_name=file_path, progress=progress)
-            await progress_message.edit_text("✅ ההורדה הושלמה בהצלחה!")
-            await asyncio.sleep(3)
-            await progress_message.delete()
+            if stream_output:
+                await stream_download_and_convert(self.app, message, file_path, stream_output, progress)
+            else:
+                await self.downloader.download(message, file_path, progress)
+            elapsed = time.monotonic() - started
+            STAGE_SECONDS.observe(elapsed, stage='download')
+            record_transfer('download', os.path.getsize(file_path), elapsed)
+            if not stream_output:
+                self.admission.observe('download', os.path.getsize(file_path), elapsed)
+            edit_dispatcher.finish(progress_message, "✅ ההורדה הושלמה בהצלחה!")
         except asyncio.CancelledError:
-            await progress_message.edit_text("❌ ההורדה בוטלה")
-            await asyncio.sleep(3)
-            await progress_message.delete()
+            edit_dispatcher.finish(progress_message, "❌ ההורדה בוטלה")
             raise
         except Exception as e:
-            await progress_message.edit_text("❌ שגיאה בהורדת הקובץ")
+            STAGE_FAILURES.inc(stage='download')
+            if isinstance(e, (TimeoutError, ConnectionError)):
+                await edit_dispatcher.close(progress_message, "⚠️ ההורדה נקטעה - ההתקדמות נשמרה")
+            else:
+                await edit_dispatcher.close(progress_message, "❌ שגיאה בהורדת הקובץ")
             raise e
         finally:
-            if user_id in self.active_downloads:
+            self.active_downloads[user_id].pop(message.id, None)
+            if not self.active_downloads[user_id]:
                 del self.active_downloads[user_id]
 
     async def _upload_with_progress(self, message, video_data, caption):
-        """העלאת קובץ עם פס התקדמות"""
+        """העלאת הקובץ לקבוצת היעד עם פס התקדמות אצל המשתמש. מחזיר את ההודעה שנשלחה"""
         progress_message = await message.reply("📤 מתחיל העלאה...")
         last_percentage = 0
         last_update_time = asyncio.get_event_loop().time()
@@ -333,43 +659,48 @@ class VideoService:
                     empty = 10 - filled
                     progress_bar = "▰" * filled + "▱" * empty
                     
-                    try:
-                        await progress_message.edit_text(
-                            f"📤 מעלה את הקובץ...\n"
-                            f"{progress_bar} {percentage}%\n"
-                            f"⚡ מהירות: {speed:.1f} MB/s\n"
-                            f"📊 גודל: {total / (1024 * 1024):.1f} MB"
-                        )
-                    except Exception as e:
-                        logging.warning(f"שגיאה בעדכון סטטוס ההעלאה: {e}")
+                    # העריכה נשלחת דרך המנהל המרכזי, בלי לעכב את ההעלאה
+                    edit_dispatcher.submit(
+                        progress_message,
+                        f"📤 מעלה את הקובץ...\n"
+                        f"{progress_bar} {percentage}%\n"
+                        f"⚡ מהירות: {speed:.1f} MB/s\n"
+                        f"📊 גודל: {total / (1024 * 1024):.1f} MB"
+                    )
 
             except Exception as e:
                 logging.error(f"שגיאה בעדכון סטטוס ההעלאה: {e}")
 
+        started = time.monotonic()
         try:
-            await message.reply_video(
+            sent_message = await self.uploader.send_video(
+                TARGET_GROUP_ID,
                 video=video_data['file_path'],
                 thumb=video_data['thumbnail_path'],
                 duration=video_data['duration'],
+                width=video_data.get('width', 0),
+                height=video_data.get('height', 0),
                 caption=caption,
-                supports_streaming=True,
                 progress=progress
             )
-            await progress_message.edit_text("✅ ההעלאה הושלמה בהצלחה!")
-            await asyncio.sleep(3)
-            await progress_message.delete()
+            elapsed = time.monotonic() - started
+            STAGE_SECONDS.observe(elapsed, stage='upload')
+            record_transfer('upload', os.path.getsize(video_data['file_path']), elapsed)
+            self.admission.observe('upload', os.path.getsize(video_data['file_path']), elapsed)
+            edit_dispatcher.finish(progress_message, "✅ ההעלאה הושלמה בהצלחה!")
+            return sent_message
         except Exception as e:
-            await progress_message.edit_text("❌ שגיאה בהעלאת הקובץ")
+            STAGE_FAILURES.inc(stage='upload')
+            await edit_dispatcher.close(progress_message, "❌ שגיאה בהעלאת הקובץ")
             raise e
 
     async def _cleanup_files(self, video_data):
-        """ניקוי קבצים זמניים"""
-        # המתנה לשחרור הקבצים
-        await wait_for_file_release(video_data['file_path'])
-        
-        # מחיקת הקבצים
-        if video_data.get('original_path'):  # מחיקת קובץ המקור אם קיים
-            await wait_and_delete(video_data['original_path'])
-        await wait_and_delete(video_data['file_path'])
-        await wait_and_delete(video_data['thumbnail_path'])
-        logging.info("קבצים זמניים נמחקו בהצלחה.")
+        """ניקוי קבצים זמניים - המחיקה מתבצעת ברקע עם מספר מוגבל של ניסיונות"""
+        thumbnail_path = video_data.get('thumbnail_path')
+        janitor.delete(
+            video_data.get('original_path'),
+            video_data['file_path'],
+            None if thumbnail_engine.owns(thumbnail_path) else thumbnail_path,  # תמונות מהמטמון נשארות
+            directory=os.path.dirname(video_data['file_path'])
+        )
+        logging.info("ניקוי הקבצים הזמניים תוזמן.")
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from services.download_service import ChunkedDownloader, CHUNK_SIZE
+
+SIZE = 4 * CHUNK_SIZE
+
+
+class FakeApp:
+    def __init__(self):
+        self.offsets = []
+
+    async def stream_media(self, message, limit=0, offset=0):
+        self.offsets.append(offset)
+        for index in range(offset, min(offset + limit, SIZE // CHUNK_SIZE)):
+            yield bytes([index + 1]) * CHUNK_SIZE
+
+
+def message():
+    return SimpleNamespace(video=SimpleNamespace(file_size=SIZE, file_unique_id='uid'), document=None)
+
+
+def expected():
+    return b''.join(bytes([index + 1]) * CHUNK_SIZE for index in range(SIZE // CHUNK_SIZE))
+
+
+def test_resume_skips_segments_from_checkpoint(tmp_path):
+    path = str(tmp_path / 'video.mkv')
+    with open(path, 'wb') as output:
+        output.write(expected()[:CHUNK_SIZE] + bytes(SIZE - CHUNK_SIZE))
+    downloader = ChunkedDownloader(FakeApp(), workers=1, segment_mb=1)
+    downloader._save_checkpoint(path, 'uid', SIZE, {0})
+
+    asyncio.run(downloader.download(message(), path))
+    assert sorted(downloader.app.offsets) == [1, 2, 3]
+    assert open(path, 'rb').read() == expected()
+
+
+def test_reallocated_file_resets_checkpoint(tmp_path):
+    path = str(tmp_path / 'video.mkv')
+    with open(path, 'wb') as output:
+        output.write(b'partial')  # גודל שלא תואם - הקובץ יוקצה מחדש
+    downloader = ChunkedDownloader(FakeApp(), workers=1, segment_mb=1)
+    downloader._save_checkpoint(path, 'uid', SIZE, {0, 1})
+
+    asyncio.run(downloader.download(message(), path))
+    assert sorted(downloader.app.offsets) == [0, 1, 2, 3]
+    assert open(path, 'rb').read() == expected()
+
+
+def test_checkpoint_is_rewritten_after_reallocation(tmp_path):
+    path = str(tmp_path / 'video.mkv')
+    open(path, 'wb').close()
+    app = FakeApp()
+    downloader = ChunkedDownloader(app, workers=1, segment_mb=1, max_retries=1)
+    downloader._save_checkpoint(path, 'uid', SIZE, {1, 2, 3})
+
+    async def drop_after_first(message, limit=0, offset=0):
+        if offset:
+            raise ConnectionError("נותק")
+        async for chunk in FakeApp.stream_media(app, message, limit, offset):
+            yield chunk
+    app.stream_media = drop_after_first
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(downloader.download(message(), path))
+    # הקטעים הישנים לא נחשבים יותר, רק מה שהורד אחרי ההקצאה מחדש
+    assert json.load(open(downloader.checkpoint_path(path)))['done'] == [0]
@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+from pyrogram.enums import ChatType
+from utils import edit_dispatcher as dispatcher_module
+from utils.edit_dispatcher import EditDispatcher
+
+
+class FakeMessage:
+    def __init__(self, message_id=1, delay=0.0):
+        self.chat = SimpleNamespace(id=100, type=ChatType.PRIVATE)
+        self.id = message_id
+        self.delay = delay
+        self.texts = []
+
+    async def edit_text(self, text, reply_markup=None):
+        await asyncio.sleep(self.delay)
+        self.texts.append(text)
+
+
+def state(dispatcher):
+    return (dispatcher._pending, dispatcher._last_text, dispatcher._versions, dispatcher._send_locks)
+
+
+def test_close_releases_message_state():
+    async def scenario():
+        dispatcher = EditDispatcher()
+        message = FakeMessage()
+        dispatcher.submit(message, "progress")
+        await dispatcher.close(message, "error")
+        return dispatcher, message
+
+    dispatcher, message = asyncio.run(scenario())
+    assert message.texts[-1] == "error"
+    assert state(dispatcher) == ({}, {}, {}, {})
+
+
+def test_discard_during_send_releases_message_state():
+    async def scenario():
+        dispatcher = EditDispatcher()
+        message = FakeMessage(delay=0.05)
+        send = asyncio.create_task(dispatcher.edit(message, "final"))
+        await asyncio.sleep(0.01)
+        dispatcher.discard(message)
+        await send
+        return dispatcher
+
+    assert state(asyncio.run(scenario())) == ({}, {}, {}, {})
+
+
+def test_rate_limiter_history_is_cleaned(monkeypatch):
+    monkeypatch.setattr(dispatcher_module, 'RATE_LIMIT_CLEANUP_INTERVAL', 0)
+
+    async def scenario():
+        dispatcher = EditDispatcher()
+        cleanups = []
+        dispatcher.rate_limiter.cleanup = lambda: cleanups.append(True)
+        dispatcher.submit(FakeMessage(), "progress")
+        await asyncio.sleep(0.05)
+        dispatcher._task.cancel()
+        return cleanups
+
+    assert asyncio.run(scenario())
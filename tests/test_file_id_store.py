@@ -0,0 +1,51 @@
+import os
+import time
+import asyncio
+from utils.file_id_store import FileIdStore
+
+
+def make_store(tmp_path, threshold=1000):
+    return FileIdStore(str(tmp_path / 'file_ids.yaml'), str(tmp_path / 'file_ids.journal'), threshold)
+
+
+def wait_compaction(store, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while store._compacting and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not store._compacting
+
+
+def test_background_compaction_keeps_every_entry(tmp_path):
+    store = make_store(tmp_path, threshold=5)
+    for index in range(23):
+        store.set(f"video{index}.mp4", f"id-{index}")
+    wait_compaction(store)
+
+    assert os.path.exists(store.snapshot_file)
+    reloaded = make_store(tmp_path)
+    assert reloaded.to_dict() == {f"video{index}.mp4": f"id-{index}" for index in range(23)}
+
+
+def test_interrupted_compaction_is_replayed(tmp_path):
+    store = make_store(tmp_path)
+    store.set("a.mp4", "old")
+    # קריסה אחרי החלפת היומן ולפני שתמונת המצב נכתבה
+    os.replace(store.journal_file, store._compacting_file)
+    store.set("a.mp4", "new")
+    store.set("b.mp4", "id-b")
+
+    assert make_store(tmp_path).to_dict() == {"a.mp4": "new", "b.mp4": "id-b"}
+
+    store.compact()
+    assert not os.path.exists(store._compacting_file)
+    assert make_store(tmp_path).to_dict() == {"a.mp4": "new", "b.mp4": "id-b"}
+
+
+def test_set_async_notifies_listeners(tmp_path):
+    store = make_store(tmp_path)
+    seen = []
+    store.add_listener(lambda key, value: seen.append((key, value)))
+    asyncio.run(store.set_async("a.mp4", "id-a"))
+
+    assert seen == [("a.mp4", "id-a")]
+    assert make_store(tmp_path).get("a.mp4") == "id-a"
@@ -0,0 +1,37 @@
+import pytest
+from utils.release_parser import ReleaseInfo, parse_release, canonical_source
+
+
+@pytest.mark.parametrize('file_name, expected', [
+    ("Hits.2019.720p.mp4", dict(title="Hits", year=2019, resolution="720p", source=None)),
+    ("Movie.2019.720p.Ts.mp4", dict(title="Movie", year=2019, resolution="720p", source="Ts")),
+    ("Movie.2019.720p.TS.mp4", dict(title="Movie", year=2019, resolution="720p", source="Ts")),
+    ("2012.2009.720p.BluRay.mkv", dict(title="2012", year=2009, resolution="720p", source="BluRay")),
+    ("Blade.Runner.2049.2017.1080p.WEB-DL.mkv",
+     dict(title="Blade Runner 2049", year=2017, resolution="1080p", source="WEB-DL")),
+    ("Lost.3x07.HDTV.avi", dict(title="Lost", season=3, episode=7, source="HDTV")),
+    ("The.Office.S05E14.720p.WEB.DL.mp4", dict(title="The Office", season=5, episode=14, source="WEB-DL")),
+    ("The Office s05 e14 webdl.mp4", dict(title="The Office", season=5, episode=14, source="WEB-DL")),
+    ("some_video_1080P_web_dl.mp4", dict(title="some video", resolution="1080p", source="WEB-DL")),
+    ("some_video_720p_BluRay.mp4", dict(title="some video", resolution="720p", source="BluRay")),
+])
+def test_parse_release(file_name, expected):
+    info = parse_release(file_name)
+    for field, value in expected.items():
+        assert getattr(info, field) == value, field
+
+
+def test_plain_name_has_no_tokens():
+    assert parse_release("family_trip.mp4") == ReleaseInfo(name="family_trip", title="family trip")
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("web-dl", "WEB-DL"),
+    ("web dl", "WEB-DL"),
+    ("web_dl", "WEB-DL"),
+    ("WEBDL", "WEB-DL"),
+    ("bluray", "BluRay"),
+    ("hits", None),
+])
+def test_canonical_source(text, expected):
+    assert canonical_source(text) == expected
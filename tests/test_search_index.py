@@ -0,0 +1,83 @@
+import pytest
+from utils.search_index import SearchIndex, query_tokens
+
+LIBRARY = [
+    "Dune.2021.1080p.WEB-DL.mp4",
+    "Joker.2019.1080p.BluRay.mp4",
+    "Joker.2019.720p.WEB-DL.mp4",
+    "The.King.2019.1080p.WEBRip.mp4",
+    "The.Office.S05E14.720p.HDTV.mp4",
+    "Friends.S05E14.1080p.WEB-DL.mp4",
+    "Breaking.Bad.S05E13.1080p.BluRay.mp4",
+    "הפרקליטה.S02E01.HDTV.mp4",
+]
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.build((name, f"id-{number}") for number, name in enumerate(LIBRARY))
+    return index
+
+
+def names(hits):
+    return sorted(hit.file_name for hit in hits)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ("joker 1080p", ["Joker.2019.1080p.BluRay.mp4"]),
+    ("1080p joker", ["Joker.2019.1080p.BluRay.mp4"]),
+    ("web-dl joker", ["Joker.2019.720p.WEB-DL.mp4"]),
+    ("joker web dl", ["Joker.2019.720p.WEB-DL.mp4"]),
+    ("S05E14 office", ["The.Office.S05E14.720p.HDTV.mp4"]),
+    ("office s5e14", ["The.Office.S05E14.720p.HDTV.mp4"]),
+    ("2019 king", ["The.King.2019.1080p.WEBRip.mp4"]),
+    ("bluray s05", ["Breaking.Bad.S05E13.1080p.BluRay.mp4"]),
+    ("הפרקליטה", ["הפרקליטה.S02E01.HDTV.mp4"]),
+])
+def test_every_word_must_match_in_any_order(index, query, expected):
+    assert names(index.search(query)) == expected
+
+
+def test_word_after_tag_is_not_dropped(index):
+    assert index.search("1080p nosuchtitle") == []
+    assert index.search("web-dl nosuchtitle") == []
+
+
+def test_prefix_matches_last_word_while_typing(index):
+    assert names(index.search("jok")) == ["Joker.2019.1080p.BluRay.mp4", "Joker.2019.720p.WEB-DL.mp4"]
+
+
+def test_higher_resolution_ranks_first(index):
+    assert [hit.file_name for hit in index.search("joker")][0] == "Joker.2019.1080p.BluRay.mp4"
+
+
+def test_incremental_add(index):
+    index.add("Joker.Folie.a.Deux.2024.2160p.WEB-DL.mp4", "id-new")
+    assert names(index.search("joker 2024")) == ["Joker.Folie.a.Deux.2024.2160p.WEB-DL.mp4"]
+
+
+@pytest.mark.parametrize('query, expected', [
+    ("Web-DL", ["webdl"]),
+    ("s5 e14", ["s05e14"]),
+    ("3x07", ["s03e07"]),
+    ("breaking_bad", ["breaking", "bad"]),
+])
+def test_query_tokens(query, expected):
+    assert query_tokens(query) == expected
+
+
+def test_keys_are_stable_across_rebuilds(index):
+    before = {hit.file_name: hit.key for hit in index.search("joker")}
+    rebuilt = SearchIndex()
+    rebuilt.build((name, f"id-{number}") for number, name in enumerate(reversed(LIBRARY)))
+    for file_name, key in before.items():
+        assert rebuilt.get(key).file_name == file_name
+    assert rebuilt.get("missing") is None
+
+
+def test_prefix_search_after_rebuild(index):
+    assert index.search("jok")
+    index.build([("Dune.2021.1080p.WEB-DL.mp4", "id-0")])
+    assert index.search("jok") == []
+    assert names(index.search("du")) == ["Dune.2021.1080p.WEB-DL.mp4"]
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from services import streaming_service
+from services.download_service import CHUNK_SIZE
+from utils.ffmpeg_runner import FFmpegResult
+
+SIZE = 5 * CHUNK_SIZE + 123
+
+
+def chunk(index: int) -> bytes:
+    return bytes([index % 256]) * min(CHUNK_SIZE, SIZE - index * CHUNK_SIZE)
+
+
+EXPECTED = b''.join(chunk(index) for index in range((SIZE + CHUNK_SIZE - 1) // CHUNK_SIZE))
+
+
+class FakeApp:
+    def __init__(self, drop_after=None):
+        self.drop_after = drop_after
+        self.offsets = []
+
+    async def stream_media(self, message, offset=0):
+        self.offsets.append(offset)
+        for index in range(offset, (SIZE + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            if self.drop_after is not None and index >= self.drop_after:
+                return  # החיבור נסגר באמצע
+            await asyncio.sleep(0)
+            yield chunk(index)
+
+
+class FakeRunner:
+    """ffmpeg מדומה: מעתיק את מה שהוזן ל-stdin לקובץ היעד"""
+
+    def __init__(self, free=True):
+        self.free = free
+
+    def has_free_slot(self):
+        return self.free
+
+    async def run(self, command, priority=None, stdin_feeder=None, timeout=None):
+        fed = bytearray()
+        stdin = SimpleNamespace(write=fed.extend, drain=lambda: asyncio.sleep(0))
+        await stdin_feeder(stdin)
+        with open(command[-1], 'wb') as output:
+            output.write(fed)
+        return FFmpegResult(returncode=0)
+
+
+@pytest.fixture(autouse=True)
+def fake_tools(monkeypatch):
+    monkeypatch.setattr(streaming_service, 'STREAM_HEAD_BYTES', 2 * CHUNK_SIZE)
+    monkeypatch.setattr(streaming_service, 'build_convert_command', lambda source, output, mode: [source, output])
+
+    async def probe(path):
+        return {}
+    monkeypatch.setattr(streaming_service, 'probe_video', probe)
+
+
+def run(app, source, output):
+    message = SimpleNamespace(video=SimpleNamespace(file_size=SIZE), document=None)
+    return asyncio.run(streaming_service.stream_download_and_convert(app, message, str(source), str(output)))
+
+
+def test_converts_while_downloading(tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming_service, 'ffmpeg_runner', FakeRunner())
+    assert run(FakeApp(), tmp_path / 'video.mkv', tmp_path / 'video.mp4')
+    assert (tmp_path / 'video.mkv').read_bytes() == EXPECTED
+    assert (tmp_path / 'video.mp4').read_bytes() == EXPECTED
+
+
+def test_interrupted_download_resumes_from_written_offset(tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming_service, 'ffmpeg_runner', FakeRunner())
+    with pytest.raises(ConnectionError):
+        run(FakeApp(drop_after=3), tmp_path / 'video.mkv', tmp_path / 'video.mp4')
+    assert not (tmp_path / 'video.mp4').exists()
+    assert (tmp_path / 'video.mkv').stat().st_size == 3 * CHUNK_SIZE
+
+    app = FakeApp()
+    assert run(app, tmp_path / 'video.mkv', tmp_path / 'video.mp4')
+    assert app.offsets == [3]
+    assert (tmp_path / 'video.mkv').read_bytes() == EXPECTED
+    assert (tmp_path / 'video.mp4').read_bytes() == EXPECTED
+
+
+def test_downloads_without_conversion_when_ffmpeg_is_busy(tmp_path, monkeypatch):
+    monkeypatch.setattr(streaming_service, 'ffmpeg_runner', FakeRunner(free=False))
+    assert not run(FakeApp(), tmp_path / 'video.mkv', tmp_path / 'video.mp4')
+    assert (tmp_path / 'video.mkv').read_bytes() == EXPECTED
+    assert not (tmp_path / 'video.mp4').exists()
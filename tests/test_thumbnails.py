@@ -0,0 +1,37 @@
+import os
+import asyncio
+from utils import thumbnails
+from utils.ffmpeg_runner import FFmpegResult
+from utils.thumbnails import ThumbnailEngine
+
+
+class FakeRunner:
+    """ffmpeg מדומה: כותב פריים בהיר לקובץ היעד, עם המתנה כדי ששתי עבודות יחפפו"""
+
+    def __init__(self):
+        self.outputs = []
+
+    async def run(self, command, **kwargs):
+        output = command[-1]
+        self.outputs.append(output)
+        with open(output, 'wb') as file:
+            await asyncio.sleep(0.01)
+            file.write(b'jpeg')
+        return FFmpegResult(returncode=0, stdout=b'\xff' * 256)
+
+
+def test_concurrent_jobs_with_same_fingerprint(tmp_path, monkeypatch):
+    runner = FakeRunner()
+    monkeypatch.setattr(thumbnails, 'ffmpeg_runner', runner)
+    engine = ThumbnailEngine(str(tmp_path / 'cache'))
+
+    async def scenario():
+        return await asyncio.gather(*(
+            engine.create('video.mkv', duration=60, cache_key='fp', offsets=[1.0]) for _ in range(2)
+        ))
+
+    first, second = asyncio.run(scenario())
+    assert first == second == engine.cache_path('fp')
+    assert open(first, 'rb').read() == b'jpeg'
+    assert len(set(runner.outputs)) == 2  # כל עבודה כתבה לקובץ זמני משלה
+    assert os.listdir(engine.cache_dir) == ['fp.jpg']
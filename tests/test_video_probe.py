@@ -0,0 +1,28 @@
+import json
+import pytest
+from utils.video_probe import parse_probe_output
+
+
+def probe_json(format_duration=None, stream_duration=None):
+    video = {'codec_type': 'video', 'codec_name': 'h264', 'width': 1280, 'height': 720}
+    if stream_duration is not None:
+        video['duration'] = stream_duration
+    fmt = {'format_name': 'matroska,webm'}
+    if format_duration is not None:
+        fmt['duration'] = format_duration
+    return json.dumps({'format': fmt, 'streams': [video]})
+
+
+@pytest.mark.parametrize('format_duration, stream_duration, expected', [
+    ("120.5", None, 120.5),
+    ("N/A", "60.25", 60.25),
+    (None, "60.25", 60.25),
+    ("N/A", "N/A", 0.0),
+    (None, None, 0.0),
+])
+def test_duration(format_duration, stream_duration, expected):
+    info = parse_probe_output(probe_json(format_duration, stream_duration))
+    assert info['duration_exact'] == expected
+    assert info['duration'] == int(expected)
+    # משך לא תקין לא מוחק את שאר המידע
+    assert (info['width'], info['height'], info['video_codec']) == (1280, 720, 'h264')
@@ -0,0 +1,131 @@
+"""
+דוח מתוך קובץ המעקב של הבוט (ברירת המחדל: TRACE_LOG_FILE מההגדרות)
+
+שימוש:
+    python tools/trace_report.py [trace.log] [--top 10] [--job CHAT_MESSAGE]
+"""
+import os
+import sys
+import json
+import argparse
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from config.settings import TRACE_LOG_FILE
+
+
+def read_events(path):
+    """קריאת אירועי המעקב (שורות פגומות מדולגות)"""
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def group_traces(events):
+    """קיבוץ האירועים לפי מזהה מעקב"""
+    traces = defaultdict(lambda: {'spans': [], 'events': []})
+    for event in events:
+        trace = traces[event.get('trace_id')]
+        trace['job'] = event.get('job')
+        if event.get('event') == 'span':
+            trace['spans'].append(event)
+        elif event.get('event') == 'trace_start':
+            trace['start'] = event
+        elif event.get('event') == 'trace_end':
+            trace['end'] = event
+        else:
+            trace['events'].append(event)
+    return traces
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def print_slowest(traces, top):
+    finished = [trace for trace in traces.values() if 'end' in trace]
+    finished.sort(key=lambda trace: trace['end'].get('duration', 0), reverse=True)
+
+    print(f"העבודות האיטיות ביותר ({min(top, len(finished))} מתוך {len(finished)} שהסתיימו):")
+    print(f"{'job':<24} {'trace_id':<18} {'outcome':<12} {'total':>9}  שלבים")
+    for trace in finished[:top]:
+        stages = defaultdict(float)
+        for span in trace['spans']:
+            stages[span['name']] += span.get('duration', 0)
+        breakdown = ', '.join(f"{name}={seconds:.1f}s" for name, seconds in
+                              sorted(stages.items(), key=lambda item: item[1], reverse=True))
+        end = trace['end']
+        print(f"{trace['job'] or '-':<24} {end.get('trace_id') or '-':<18} "
+              f"{end.get('outcome', '-'):<12} {end.get('duration', 0):>8.1f}s  {breakdown}")
+
+
+def print_stage_breakdown(traces):
+    durations = defaultdict(list)
+    failures = defaultdict(int)
+    for trace in traces.values():
+        for span in trace['spans']:
+            durations[span['name']].append(span.get('duration', 0))
+            if span.get('status') != 'ok':
+                failures[span['name']] += 1
+
+    print("\nזמנים לפי שלב (שניות):")
+    print(f"{'stage':<14} {'count':>6} {'total':>10} {'mean':>8} {'p50':>8} {'p95':>8} {'max':>8} {'errors':>7}")
+    for name, values in sorted(durations.items(), key=lambda item: sum(item[1]), reverse=True):
+        total = sum(values)
+        print(f"{name:<14} {len(values):>6} {total:>10.1f} {total / len(values):>8.2f} "
+              f"{percentile(values, 0.5):>8.2f} {percentile(values, 0.95):>8.2f} "
+              f"{max(values):>8.2f} {failures[name]:>7}")
+
+
+def print_job_timeline(traces, job):
+    matches = [trace for trace in traces.values() if trace.get('job') == job]
+    if not matches:
+        print(f"לא נמצאה עבודה {job}")
+        return
+    for trace in matches:
+        start = trace.get('start', {}).get('ts')
+        if start is None:
+            start = min((span['start'] for span in trace['spans']), default=0)
+        print(f"\nעבודה {job} (trace {trace.get('end', trace.get('start', {})).get('trace_id', '-')}):")
+        for span in sorted(trace['spans'], key=lambda span: span['start']):
+            offset = span['start'] - start
+            print(f"  +{offset:>8.2f}s  {span['name']:<14} {span.get('duration', 0):>8.2f}s  {span.get('status', '')}")
+        if 'end' in trace:
+            print(f"  סיום: {trace['end'].get('outcome')} אחרי {trace['end'].get('duration', 0):.1f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="דוח זמנים מתוך קובץ המעקב של הבוט")
+    parser.add_argument('trace_file', nargs='?', default=TRACE_LOG_FILE, help="נתיב קובץ המעקב")
+    parser.add_argument('--top', type=int, default=10, help="מספר העבודות האיטיות להצגה")
+    parser.add_argument('--job', help="הצגת ציר הזמן של עבודה אחת (chat_message)")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.trace_file):
+        print(f"קובץ המעקב לא נמצא: {args.trace_file}", file=sys.stderr)
+        return 1
+
+    traces = group_traces(read_events(args.trace_file))
+    if args.job:
+        print_job_timeline(traces, args.job)
+    else:
+        print_slowest(traces, args.top)
+        print_stage_breakdown(traces)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
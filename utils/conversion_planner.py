@@ -0,0 +1,64 @@
+import logging
+from config.settings import FFMPEG_PRESET, FFMPEG_CRF
+
+logger = logging.getLogger(__name__)
+
+# קודקים שטלגרם מנגן ישירות בתוך MP4
+COMPATIBLE_VIDEO_CODECS = {'h264'}
+COMPATIBLE_AUDIO_CODECS = {'aac', 'mp3'}
+COMPATIBLE_PIX_FMTS = {'yuv420p', 'yuvj420p'}
+
+# סוגי המרה
+MODE_COPY = 'copy'            # העתקת הזרמים כמו שהם (שינוי מכולה בלבד)
+MODE_AUDIO = 'audio'          # העתקת הוידאו וקידוד מחדש של האודיו בלבד
+MODE_TRANSCODE = 'transcode'  # קידוד מלא מחדש
+
+
+def plan_conversion(video_info: dict) -> str:
+    """בחירת סוג ההמרה לפי הקודקים של הקובץ"""
+    if not video_info or not video_info.get('video_codec'):
+        return MODE_TRANSCODE
+
+    pix_fmt = video_info.get('pix_fmt')
+    video_ok = (
+        video_info['video_codec'] in COMPATIBLE_VIDEO_CODECS and
+        (pix_fmt is None or pix_fmt in COMPATIBLE_PIX_FMTS)
+    )
+    audio_ok = not video_info.get('audio') or video_info.get('audio_codec') in COMPATIBLE_AUDIO_CODECS
+
+    if video_ok and audio_ok:
+        return MODE_COPY
+    if video_ok:
+        return MODE_AUDIO
+    return MODE_TRANSCODE
+
+
+def build_convert_command(input_file: str, output_file: str, mode: str, with_progress: bool = False) -> list:
+    """בניית פקודת ffmpeg להמרה ל-MP4 לפי סוג ההמרה"""
+    command = ['ffmpeg', '-y']
+    if with_progress:
+        command += ['-progress', 'pipe:1']  # דיווח התקדמות כשורות key=value
+    command += [
+        '-i', input_file,
+        '-map', '0:v:0', '-map', '0:a:0?',  # זרם וידאו ראשי ואודיו ראשון בלבד (בלי כתוביות)
+    ]
+
+    if mode == MODE_COPY:
+        command += ['-c:v', 'copy', '-c:a', 'copy']
+    elif mode == MODE_AUDIO:
+        command += ['-c:v', 'copy', '-c:a', 'aac', '-b:a', '192k']
+    else:
+        command += [
+            '-c:v', 'libx264',  # קודק וידאו
+            '-preset', FFMPEG_PRESET,
+            '-crf', str(FFMPEG_CRF),
+            '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac',      # קודק אודיו
+            '-b:a', '192k',
+        ]
+
+    command += [
+        '-movflags', '+faststart',  # אופטימיזציה להזרמה
+        output_file
+    ]
+    return command
@@ -0,0 +1,186 @@
+import time
+import asyncio
+import logging
+from typing import Dict, Optional, Set, Tuple
+from pyrogram.enums import ChatType
+from pyrogram.errors import FloodWait
+from pyrogram.types import Message
+from config.settings import STATUS_DELETE_DELAY
+from .rate_limiter import TelegramRateLimiter
+from .metrics import record_flood_wait
+
+logger = logging.getLogger(__name__)
+
+# זמן המתנה מקסימלי בין בדיקות כשאין עריכה שמוכנה לשליחה
+MAX_IDLE_SLEEP = 1.0
+
+# כל כמה שניות מנוקה ההיסטוריה הישנה של מגבלות הקצב (צ'אטים שכבר לא פעילים)
+RATE_LIMIT_CLEANUP_INTERVAL = 60.0
+
+
+def is_group_chat(message: Message) -> bool:
+    """בדיקה אם ההודעה נמצאת בקבוצה (למגבלות הקצב)"""
+    return message.chat.type != ChatType.PRIVATE
+
+
+class EditDispatcher:
+    """
+    מנהל מרכזי לעריכת הודעות סטטוס והתקדמות
+    - submit לא חוסם: נשמר רק הטקסט האחרון לכל הודעה, עדכונים ישנים נזרקים
+    - משימת רקע שולחת את העריכות לפי מגבלות הקצב של כל צ'אט ומגבלה כללית
+    - FloodWait חוסם רק את הצ'אט שקיבל אותו, והעריכה נשלחת שוב אחר כך
+    - לכל הודעה מספר גרסה: עריכה שכבר הוחלפה בטקסט חדש יותר לא נשלחת (גם אם כבר יצאה מהתור),
+      ושליחות לאותה הודעה לא חופפות - כך טקסט סיום לא נדרס בפס התקדמות ישן
+    - הודעת סיום ומחיקת הודעות סטטוס מתבצעות ברקע, בלי לעכב את העבודה
+    - המצב של כל הודעה משוחרר בסופה: finish (ההודעה נמחקת) או close (ההודעה נשארת, למשל שגיאה)
+    """
+
+    def __init__(self, rate_limiter: Optional[TelegramRateLimiter] = None):
+        self.rate_limiter = rate_limiter or TelegramRateLimiter()
+        self._pending: Dict[Tuple[int, int], tuple] = {}  # (chat_id, message_id) -> (message, text, reply_markup, version)
+        self._last_text: Dict[Tuple[int, int], str] = {}
+        self._versions: Dict[Tuple[int, int], int] = {}  # הגרסה האחרונה שנקבעה לכל הודעה
+        self._send_locks: Dict[Tuple[int, int], asyncio.Lock] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def _key(message: Message) -> Tuple[int, int]:
+        return message.chat.id, message.id
+
+    def _next_version(self, key: Tuple[int, int]) -> int:
+        version = self._versions.get(key, 0) + 1
+        self._versions[key] = version
+        return version
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def submit(self, message: Message, text: str, reply_markup=None) -> None:
+        """תזמון עריכה בלי להמתין - עריכה קודמת שעוד לא נשלחה מוחלפת"""
+        key = self._key(message)
+        if key not in self._pending and self._last_text.get(key) == text:
+            return
+        self._pending[key] = (message, text, reply_markup, self._next_version(key))
+        self._ensure_running()
+        self._wakeup.set()
+
+    async def edit(self, message: Message, text: str, reply_markup=None) -> None:
+        """
+        עריכה מיידית (למשל הודעת סיום) - מחליפה עריכה ממתינה, וגם עריכה שכבר יצאה מהתור
+        אבל עוד לא נשלחה. ממתינה למגבלת הקצב ולסיום שליחה קודמת לאותה הודעה
+        """
+        key = self._key(message)
+        self._pending.pop(key, None)
+        version = self._next_version(key)
+        await self.rate_limiter.acquire(message.chat.id, is_group=is_group_chat(message))
+        await self._send(message, text, reply_markup, version)
+
+    async def close(self, message: Message, text: str, reply_markup=None) -> None:
+        """טקסט אחרון להודעה שנשארת בצ'אט (למשל הודעת שגיאה) - אחרי השליחה המצב שלה משוחרר"""
+        try:
+            await self.edit(message, text, reply_markup)
+        finally:
+            self.discard(message)
+
+    def discard(self, message: Message) -> None:
+        """ביטול עריכות ממתינות להודעה (למשל לפני מחיקתה)"""
+        key = self._key(message)
+        self._pending.pop(key, None)
+        self._last_text.pop(key, None)
+        self._versions.pop(key, None)  # שליחה שעוד בדרך כבר לא תתבצע
+        lock = self._send_locks.get(key)
+        if lock is not None and not lock.locked():
+            del self._send_locks[key]
+
+    def finish(self, message: Message, text: Optional[str] = None,
+               delete_after: float = STATUS_DELETE_DELAY) -> None:
+        """הצגת טקסט סיום (אם יש) ומחיקת ההודעה אחרי delete_after שניות - ברקע"""
+        task = asyncio.get_running_loop().create_task(self._finish(message, text, delete_after))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def delete_later(self, message: Message, delay: float = STATUS_DELETE_DELAY) -> None:
+        """מחיקת הודעת סטטוס ברקע אחרי delay שניות"""
+        self.finish(message, None, delay)
+
+    async def _finish(self, message: Message, text: Optional[str], delay: float) -> None:
+        try:
+            if text is not None:
+                await self.edit(message, text)
+            await asyncio.sleep(delay)
+            self.discard(message)
+            await message.delete()
+        except Exception as e:
+            logger.warning(f"שגיאה במחיקת הודעת סטטוס: {e}")
+        finally:
+            self.discard(message)
+
+    async def _run(self) -> None:
+        """לולאת השליחה ברקע"""
+        last_cleanup = time.monotonic()
+        while True:
+            if time.monotonic() - last_cleanup >= RATE_LIMIT_CLEANUP_INTERVAL:
+                self.rate_limiter.cleanup()
+                last_cleanup = time.monotonic()
+
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # בחירת העריכה הראשונה שהצ'אט שלה מוכן לשליחה
+            next_key, min_wait = None, MAX_IDLE_SLEEP
+            for key, (message, _, _, _) in self._pending.items():
+                wait_time = self.rate_limiter.ready_in(message.chat.id, is_group=is_group_chat(message))
+                if wait_time <= 0:
+                    next_key = key
+                    break
+                min_wait = min(min_wait, wait_time)
+
+            if next_key is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), min_wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            message, text, reply_markup, version = self._pending.pop(next_key)
+            await self.rate_limiter.acquire(message.chat.id, is_group=is_group_chat(message))
+            await self._send(message, text, reply_markup, version)
+
+    async def _send(self, message: Message, text: str, reply_markup, version: int) -> None:
+        """שליחת עריכה בגרסה version - רק אם היא עדיין האחרונה להודעה, ואחרי שליחה קודמת שבדרך"""
+        key = self._key(message)
+        lock = self._send_locks.get(key)
+        if lock is None:
+            lock = self._send_locks[key] = asyncio.Lock()
+        async with lock:
+            if self._versions.get(key) != version:
+                return  # כבר נקבע טקסט חדש יותר
+            try:
+                await message.edit_text(text, reply_markup=reply_markup)
+                if self._versions.get(key) == version:
+                    self._last_text[key] = text
+            except FloodWait as e:
+                record_flood_wait('edit', e.value)
+                self.rate_limiter.penalize(message.chat.id, e.value)
+                # שליחה חוזרת אחרי ההמתנה, אלא אם כבר הגיע טקסט חדש יותר
+                if self._versions.get(key) == version and key not in self._pending:
+                    self._pending[key] = (message, text, reply_markup, version)
+                    self._ensure_running()
+                    self._wakeup.set()
+            except Exception as e:
+                if "MESSAGE_NOT_MODIFIED" not in str(e):
+                    logger.warning(f"שגיאה בעדכון הודעת סטטוס: {e}")
+        if key not in self._versions and not lock.locked():
+            # ההודעה שוחררה (discard) בזמן השליחה
+            self._send_locks.pop(key, None)
+
+
+# מנהל עריכות משותף לכל הודעות ההתקדמות בבוט
+edit_dispatcher = EditDispatcher()
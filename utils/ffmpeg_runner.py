@@ -0,0 +1,231 @@
+import os
+import heapq
+import inspect
+import shutil
+import asyncio
+import itertools
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Union
+from config.settings import FFMPEG_MAX_PROCESSES, FFMPEG_THREADS, FFMPEG_NICE
+from .metrics import FFMPEG_EXITS
+
+logger = logging.getLogger(__name__)
+
+# עדיפויות - מספר נמוך יותר רץ קודם
+PRIORITY_HIGH = 0     # בדיקת קבצים ותמונות ממוזערות
+PRIORITY_NORMAL = 10  # המרות ארוכות
+
+# מספר שורות השגיאה האחרונות שנשמרות מכל תהליך
+STDERR_TAIL_LINES = 30
+
+# פונקציה שמקבלת שורת פלט (רגילה או async)
+LineCallback = Callable[[str], Union[None, Awaitable[None]]]
+
+
+@dataclass
+class FFmpegResult:
+    """תוצאת הרצה של ffmpeg/ffprobe"""
+    returncode: int
+    stdout: Optional[bytes] = None
+    stderr_tail: str = ''
+    timed_out: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+
+class FFmpegRunner:
+    """
+    מנהל הרצת תהליכי ffmpeg
+    - מגבלה על מספר התהליכים במקביל (לפי מספר הליבות)
+    - תור עדיפויות: תמונות ממוזערות ובדיקות עוקפות המרות ארוכות
+    - זמן מקסימלי לכל תהליך, nice ומספר threads להמרות
+    - קריאת stderr בזרימה ושמירת השורות האחרונות בלבד
+    """
+
+    def __init__(self, max_processes: int, threads: int = 0, nice_level: int = 0):
+        self.max_processes = max(1, max_processes)
+        self.threads = threads
+        self.nice_level = nice_level
+        self._use_nice = nice_level > 0 and os.name == 'posix' and shutil.which('nice') is not None
+        self._running = 0
+        self._waiters = []  # ערימה של (עדיפות, מספר סידורי, future)
+        self._sequence = itertools.count()
+
+        logger.info(
+            f"FFmpegRunner initialized: processes={self.max_processes}, "
+            f"threads={self.threads}, nice={self.nice_level if self._use_nice else 0}"
+        )
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def has_free_slot(self) -> bool:
+        """האם תהליך חדש יתחיל מיד, בלי להמתין בתור"""
+        return self._running < self.max_processes and not self.waiting
+
+    async def _acquire(self, priority: int) -> None:
+        """המתנה למקום פנוי לפי עדיפות"""
+        if self.has_free_slot():
+            self._running += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # אם המקום כבר הועבר אלינו - מחזירים אותו
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        """שחרור מקום - מועבר ישירות לממתין בעל העדיפות הגבוהה ביותר"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    def _prepare(self, command: List[str], priority: int) -> List[str]:
+        """הוספת פרמטרי threads ו-nice לפקודה"""
+        command = list(command)
+        if os.path.basename(command[0]) == 'ffmpeg':
+            command[1:1] = ['-hide_banner', '-nostats']
+            if self.threads:
+                # הארגומנט האחרון הוא קובץ היעד
+                command[-1:-1] = ['-threads', str(self.threads)]
+            if self._use_nice and priority >= PRIORITY_NORMAL:
+                command = ['nice', '-n', str(self.nice_level)] + command
+        return command
+
+    async def run(
+        self,
+        command: List[str],
+        priority: int = PRIORITY_NORMAL,
+        timeout: Optional[float] = None,
+        capture_stdout: bool = False,
+        stdin_feeder: Optional[Callable[[asyncio.StreamWriter], Awaitable[None]]] = None,
+        on_stderr_line: Optional[LineCallback] = None,
+        on_stdout_line: Optional[LineCallback] = None
+    ) -> FFmpegResult:
+        """
+        הרצת פקודה דרך המנהל
+
+        Args:
+            command: הפקודה (ffmpeg או ffprobe)
+            priority: עדיפות בתור (PRIORITY_HIGH / PRIORITY_NORMAL)
+            timeout: זמן מקסימלי בשניות; בחריגה התהליך נהרג
+            capture_stdout: האם להחזיר את הפלט הסטנדרטי
+            stdin_feeder: פונקציה שכותבת נתונים ל-stdin של התהליך
+            on_stderr_line: פונקציה שמקבלת כל שורת stderr
+            on_stdout_line: פונקציה שמקבלת כל שורת stdout (למשל פלט -progress)
+        """
+        tool = os.path.basename(command[0])
+        command = self._prepare(command, priority)
+        await self._acquire(priority)
+        process = None
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=asyncio.subprocess.PIPE if stdin_feeder else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE if capture_stdout or on_stdout_line else asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+            tail = deque(maxlen=STDERR_TAIL_LINES)
+            tasks = [self._read_lines(process.stderr, tail, on_stderr_line)]
+            if capture_stdout:
+                tasks.append(process.stdout.read())
+            elif on_stdout_line:
+                tasks.append(self._read_lines(process.stdout, deque(maxlen=1), on_stdout_line))
+            if stdin_feeder:
+                tasks.append(self._feed(process, stdin_feeder))
+
+            timed_out = False
+            stdout = None
+            try:
+                results = await asyncio.wait_for(asyncio.gather(*tasks, process.wait()), timeout)
+                if capture_stdout:
+                    stdout = results[1]
+            except asyncio.TimeoutError:
+                logger.error(f"תהליך {command[0]} חרג מהזמן המותר ({timeout} שניות) ונהרג")
+                timed_out = True
+                await self._kill(process)
+
+            FFMPEG_EXITS.inc(tool=tool, code='timeout' if timed_out else process.returncode)
+            return FFmpegResult(
+                returncode=process.returncode if process.returncode is not None else -1,
+                stdout=stdout,
+                stderr_tail='\n'.join(tail),
+                timed_out=timed_out
+            )
+        except BaseException:
+            if process:
+                await self._kill(process)
+            raise
+        finally:
+            self._release()
+
+    @staticmethod
+    async def _feed(process, stdin_feeder) -> None:
+        try:
+            await stdin_feeder(process.stdin)
+        finally:
+            try:
+                process.stdin.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    async def _read_lines(stream, tail: deque, on_line: Optional[LineCallback]) -> None:
+        """קריאת פלט בזרימה - שורה אחר שורה, בלי לצבור את כל הפלט בזיכרון"""
+        buffer = b''
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                break
+            buffer += chunk.replace(b'\r', b'\n')
+            *lines, buffer = buffer.split(b'\n')
+            for raw in lines:
+                line = raw.decode(errors='ignore').strip()
+                if line:
+                    tail.append(line)
+                    await FFmpegRunner._notify(on_line, line)
+        if buffer.strip():
+            line = buffer.decode(errors='ignore').strip()
+            tail.append(line)
+            await FFmpegRunner._notify(on_line, line)
+
+    @staticmethod
+    async def _notify(on_line: Optional[LineCallback], line: str) -> None:
+        if not on_line:
+            return
+        try:
+            result = on_line(line)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning(f"שגיאה בטיפול בשורת פלט של ffmpeg: {e}")
+
+    @staticmethod
+    async def _kill(process) -> None:
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+            await process.wait()
+
+
+# מנהל משותף לכל תהליכי ffmpeg בבוט
+ffmpeg_runner = FFmpegRunner(FFMPEG_MAX_PROCESSES, FFMPEG_THREADS, FFMPEG_NICE)
@@ -3,8 +3,8 @@ import re
 import asyncio
 import logging
 from typing import Optional
-import yaml
-from config.settings import FILE_IDS_FILE, VIDEO_FORMATS
+from utils.file_id_store import file_id_store
+from utils.release_parser import parse_release
 
 logger = logging.getLogger(__name__)
 
@@ -18,42 +18,18 @@ def clean_filename(filename: str) -> str:
     return cleaned
 
 def get_video_quality(filename: str) -> tuple[Optional[str], Optional[str]]:
-    """מציאת איכות הווידאו מתוך שם הקובץ"""
-    pixel_format = None
-    other_format = None
-    
-    # חיפוש פורמט פיקסלים
-    for fmt in VIDEO_FORMATS['PIXEL']:
-        if fmt.lower() in filename.lower():
-            pixel_format = fmt
-            break
-            
-    # חיפוש פורמט אחר
-    for fmt in VIDEO_FORMATS['OTHER']:
-        if fmt.lower() in filename.lower():
-            other_format = fmt
-            break
-            
-    return pixel_format, other_format
+    """מציאת איכות הווידאו (רזולוציה, מקור) מתוך שם הקובץ"""
+    info = parse_release(filename)
+    return info.resolution, info.source
 
 def load_file_ids() -> dict:
-    """טעינת מזהי קבצים מהקובץ"""
-    if os.path.exists(FILE_IDS_FILE):
-        try:
-            with open(FILE_IDS_FILE, 'r', encoding='utf-8') as file:
-                return yaml.safe_load(file) or {}
-        except Exception as e:
-            logger.error(f"שגיאה בטעינת קובץ מזהים: {e}")
-    return {}
+    """טעינת מזהי קבצים מהמאגר"""
+    return file_id_store.to_dict()
 
 def save_file_id(file_name: str, file_id: str):
     """שמירת מזהה קובץ"""
-    file_ids = load_file_ids()
-    file_ids[file_name] = file_id
     try:
-        os.makedirs(os.path.dirname(FILE_IDS_FILE), exist_ok=True)
-        with open(FILE_IDS_FILE, 'w', encoding='utf-8') as file:
-            yaml.dump(file_ids, file, allow_unicode=True)
+        file_id_store.set(file_name, file_id)
         logger.info(f"נשמר file_id עבור {file_name}")
     except Exception as e:
         logger.error(f"שגיאה בשמירת file_id: {e}")
@@ -86,28 +62,17 @@ async def safe_delete_file(file_path: str):
 
 def get_video_caption(file_path: str) -> str:
     """יצירת כיתוב לווידאו"""
-    # הסרת הסיומת מהקובץ
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
-    
-    # קבלת פרטי איכות
-    pixel_format, other_format = get_video_quality(base_name)
-    
-    # הסרת פרטי האיכות מהשם
-    clean_name = base_name
-    if pixel_format:
-        clean_name = clean_name.replace(pixel_format, '').strip()
-    if other_format:
-        clean_name = clean_name.replace(other_format, '').strip()
+    info = parse_release(os.path.basename(file_path))
     
     # בניית הכיתוב
-    caption = f"**{clean_name}**\n\n"
+    caption = f"**{info.display_name}**\n\n"
     
     # הוספת פרטי איכות אם קיימים
     quality_info = []
-    if pixel_format:
-        quality_info.append(f"**🎯 רזולוציה:** {pixel_format}")
-    if other_format:
-        quality_info.append(f"**📼 איכות:** {other_format}")
+    if info.resolution:
+        quality_info.append(f"**🎯 רזולוציה:** {info.resolution}")
+    if info.source:
+        quality_info.append(f"**📼 איכות:** {info.source}")
         
     if quality_info:
         caption += '\n'.join(quality_info)
@@ -0,0 +1,201 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import yaml
+from config.settings import (
+    FILE_IDS_FILE, FILE_IDS_JOURNAL_FILE, FILE_IDS_COMPACT_THRESHOLD,
+    CONTENT_INDEX_FILE, CONTENT_INDEX_JOURNAL_FILE
+)
+
+logger = logging.getLogger(__name__)
+
+# טוען YAML מהיר (מבוסס C) אם זמין
+_YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+_YamlDumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+
+class FileIdStore:
+    """
+    מאגר מזהי קבצים עם אינדקס בזיכרון
+    - הטעינה מתבצעת פעם אחת (קובץ תמונת מצב + יומן הוספות)
+    - כל שמירה היא שורה אחת שנוספת ליומן (set_async כותבת אותה מחוץ ללולאת האירועים)
+    - כשהיומן גדל מעבר לסף, הוא נדחס לתוך תמונת המצב ברקע: היומן מוחלף ביומן חדש,
+      תמונת המצב נכתבת מעותק של האינדקס ורק אז מחליפה את הקודמת
+    - מאזינים (למשל אינדקס החיפוש) מקבלים כל רשומה חדשה מיד אחרי שנשמרה
+    """
+
+    def __init__(self, snapshot_file: str, journal_file: str, compact_threshold: int = 1000):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.compact_threshold = compact_threshold
+        self._index: Dict[str, str] = {}
+        self._journal_entries = 0
+        self._compacting = False
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[str, str], None]] = []
+
+    def add_listener(self, callback: Callable[[str, str], None]) -> None:
+        """רישום פונקציה שתיקרא עם (מפתח, ערך) אחרי כל שמירה חדשה"""
+        self._listeners.append(callback)
+
+    def load(self) -> None:
+        """טעינת המאגר לזיכרון (פעם אחת בלבד)"""
+        with self._lock:
+            if self._loaded:
+                return
+            self._index = self._read_snapshot()
+            # יומן של דחיסה שלא הסתיימה (קריסה באמצע) קודם ליומן הנוכחי
+            self._replay_journal(self._compacting_file)
+            self._journal_entries = self._replay_journal(self.journal_file)
+            self._loaded = True
+            logger.info(
+                f"נטענו {len(self._index)} מזהי קבצים "
+                f"({self._journal_entries} רשומות ביומן)"
+            )
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def _read_snapshot(self) -> Dict[str, str]:
+        """קריאת קובץ תמונת המצב"""
+        if not os.path.exists(self.snapshot_file):
+            return {}
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as file:
+                data = yaml.load(file, Loader=_YamlLoader) or {}
+            return {str(key): value for key, value in data.items()}
+        except Exception as e:
+            logger.error(f"שגיאה בטעינת קובץ מזהים: {e}")
+            return {}
+
+    @property
+    def _compacting_file(self) -> str:
+        return f"{self.journal_file}.compacting"
+
+    def _replay_journal(self, journal_file: str) -> int:
+        """החלת רשומות היומן על האינדקס"""
+        if not os.path.exists(journal_file):
+            return 0
+        count = 0
+        with open(journal_file, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                    self._index[entry['k']] = entry['v']
+                    count += 1
+                except (ValueError, KeyError, TypeError):
+                    # שורה קטועה (למשל קריסה באמצע כתיבה) - מדלגים
+                    logger.warning("נמצאה רשומה פגומה ביומן מזהי הקבצים, מדלג")
+        return count
+
+    def get(self, key: str) -> Optional[str]:
+        """חיפוש מזהה קובץ לפי מפתח"""
+        self._ensure_loaded()
+        return self._index.get(key)
+
+    def set(self, key: str, value: str) -> None:
+        """שמירת מזהה קובץ - כתיבה של שורה אחת ליומן (חוסם עד fsync; מקוד אסינכרוני - set_async)"""
+        self._ensure_loaded()
+        with self._lock:
+            if self._index.get(key) == value:
+                return
+            self._index[key] = value
+            self._append_journal(key, value)
+            compact = self._journal_entries >= self.compact_threshold and not self._compacting
+            if compact:
+                self._compacting = True
+        if compact:
+            threading.Thread(target=self._compact, name='file-id-compaction', daemon=True).start()
+        for callback in self._listeners:
+            try:
+                callback(key, value)
+            except Exception as e:
+                # תקלה במאזין לא מבטלת שמירה שכבר נכתבה ליומן
+                logger.error(f"שגיאה בעדכון מאזין של מאגר המזהים: {e}")
+
+    def _append_journal(self, key: str, value: str) -> None:
+        os.makedirs(os.path.dirname(self.journal_file), exist_ok=True)
+        with open(self.journal_file, 'a', encoding='utf-8') as file:
+            file.write(json.dumps({'k': key, 'v': value}, ensure_ascii=False) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        self._journal_entries += 1
+
+    async def set_async(self, key: str, value: str) -> None:
+        """שמירה מתוך לולאת האירועים - הכתיבה ליומן וה-fsync רצים ב-thread"""
+        await asyncio.to_thread(self.set, key, value)
+
+    def compact(self) -> None:
+        """דחיסת היומן לתוך תמונת המצב (כתיבה לקובץ זמני והחלפה)"""
+        self._ensure_loaded()
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        self._compact()
+
+    def _compact(self) -> None:
+        try:
+            with self._lock:
+                # החלפת היומן ביומן חדש ועותק של האינדקס - השמירות ממשיכות בזמן הכתיבה
+                snapshot = dict(self._index)
+                self._rotate_journal()
+                self._journal_entries = 0
+            os.makedirs(os.path.dirname(self.snapshot_file), exist_ok=True)
+            temp_file = f"{self.snapshot_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                yaml.dump(snapshot, file, Dumper=_YamlDumper, allow_unicode=True)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_file, self.snapshot_file)
+            # היומן הישן נמחק רק אחרי שתמונת המצב נשמרה; החלה חוזרת שלו אינה מזיקה
+            if os.path.exists(self._compacting_file):
+                os.remove(self._compacting_file)
+            logger.info(f"יומן מזהי הקבצים נדחס ({len(snapshot)} רשומות)")
+        except Exception as e:
+            logger.error(f"שגיאה בדחיסת יומן מזהי הקבצים: {e}")
+        finally:
+            self._compacting = False
+
+    def _rotate_journal(self) -> None:
+        """העברת היומן הנוכחי לצד (נקרא תחת הנעילה)"""
+        if not os.path.exists(self.journal_file):
+            return
+        if not os.path.exists(self._compacting_file):
+            os.replace(self.journal_file, self._compacting_file)
+            return
+        # נשאר יומן מדחיסה שנקטעה - מצרפים אליו, כדי שלא יאבד לפני שתמונת המצב נשמרת
+        with open(self.journal_file, 'r', encoding='utf-8') as source, \
+                open(self._compacting_file, 'a', encoding='utf-8') as target:
+            target.write(source.read())
+            target.flush()
+            os.fsync(target.fileno())
+        os.remove(self.journal_file)
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        self._ensure_loaded()
+        return iter(list(self._index.items()))
+
+    def to_dict(self) -> Dict[str, str]:
+        self._ensure_loaded()
+        return dict(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        self._ensure_loaded()
+        return key in self._index
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._index)
+
+
+# מאגר משותף לכל המודולים שעובדים מול קובץ המזהים
+file_id_store = FileIdStore(FILE_IDS_FILE, FILE_IDS_JOURNAL_FILE, FILE_IDS_COMPACT_THRESHOLD)
+
+# מאגר מפתחות תוכן (file_unique_id וטביעת אצבע) -> file_id בקבוצה
+content_index_store = FileIdStore(CONTENT_INDEX_FILE, CONTENT_INDEX_JOURNAL_FILE, FILE_IDS_COMPACT_THRESHOLD)
@@ -2,7 +2,7 @@ import re
 import os
 import asyncio
 import logging
-from config.settings import VIDEO_FORMATS
+from utils.release_parser import parse_release
 
 def clean_filename(filename: str) -> str:
     """ניקוי שם הקובץ מתווים לא חוקיים"""
@@ -10,53 +10,46 @@ def clean_filename(filename: str) -> str:
 
 def get_video_caption(file_path: str) -> str:
     """יצירת כיתוב לוידאו מתוך שם הקובץ"""
-    # הסרת הסיומת מהקובץ ליצירת הכיתוב
-    file_name = os.path.splitext(os.path.basename(file_path))[0]
+    info = parse_release(os.path.basename(file_path))
 
-    pixel_format_match = None
-    other_format_match = None
-
-    # חיפוש התאמות בפורמטים
-    for fmt in VIDEO_FORMATS['PIXEL']:
-        if fmt in file_name:
-            pixel_format_match = fmt
-            file_name = file_name.replace(fmt, '').strip()
-            break
-
-    for fmt in VIDEO_FORMATS['OTHER']:
-        if fmt in file_name:
-            other_format_match = fmt
-            file_name = file_name.replace(fmt, '').strip()
-            break
-
-    # יצירת מידע על האיכות
-    quality_info = ""
-    if pixel_format_match or other_format_match:
-        quality_info = f"איכות: {other_format_match}, {pixel_format_match}".strip(", ")
+    # מידע על האיכות - רק מה שנמצא בשם
+    quality = [value for value in (info.source, info.resolution) if value]
 
     # יצירת הכיתוב הסופי
-    caption = f"**{file_name}**"
-    if quality_info:
-        caption += f"\n**{quality_info}**"
+    caption = f"**{info.display_name}**"
+    if quality:
+        caption += f"\n**איכות: {', '.join(quality)}**"
     
     return caption
 
-async def wait_for_file_release(file_path: str) -> None:
-    """המתנה עד שהקובץ משתחרר מתהליכים אחרים"""
-    while True:
+async def wait_for_file_release(file_path: str, max_attempts: int = 5, delay: float = 2) -> bool:
+    """המתנה עד שהקובץ משתחרר מתהליכים אחרים (מספר ניסיונות מוגבל)"""
+    if not file_path or not os.path.exists(file_path):
+        return True
+    for attempt in range(max_attempts):
         try:
             os.rename(file_path, file_path)
-            break
+            return True
         except OSError:
-            await asyncio.sleep(2)
-
-async def wait_and_delete(file_path: str) -> None:
-    """המתנה ומחיקת קובץ עם ניסיונות חוזרים"""
-    while True:
+            if attempt < max_attempts - 1:
+                await asyncio.sleep(delay)
+    return False
+
+async def wait_and_delete(file_path: str, max_attempts: int = 5, delay: float = 2) -> bool:
+    """מחיקת קובץ עם מספר מוגבל של ניסיונות חוזרים (None או קובץ שלא קיים מדולגים)"""
+    if not file_path:
+        return True
+    for attempt in range(1, max_attempts + 1):
         try:
             os.remove(file_path)
             logging.info(f"הקובץ {file_path} נמחק בהצלחה.")
-            return
-        except OSError:
-            logging.warning(f"נכשל במחיקת {file_path}. מנסה שוב בעוד 2 שניות...")
-            await asyncio.sleep(2)
+            return True
+        except FileNotFoundError:
+            return True
+        except OSError as e:
+            if attempt == max_attempts:
+                logging.error(f"נכשל במחיקת {file_path} אחרי {max_attempts} ניסיונות: {e}")
+                return False
+            logging.warning(f"נכשל במחיקת {file_path}. מנסה שוב בעוד {delay} שניות...")
+            await asyncio.sleep(delay)
+    return False
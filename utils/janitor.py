@@ -0,0 +1,119 @@
+import os
+import shutil
+import asyncio
+import logging
+from typing import Iterable, Optional, Set
+from config.settings import (
+    DOWNLOAD_PATH, TEMP_PATH, JANITOR_MAX_RETRIES, JANITOR_RETRY_DELAY, MIN_FREE_DISK_BYTES
+)
+from .helpers import wait_and_delete
+
+logger = logging.getLogger(__name__)
+
+
+class Janitor:
+    """
+    ניקוי קבצים זמניים ברקע
+    - מחיקה לא חוסמת עם מספר מוגבל של ניסיונות לכל קובץ
+    - סריקה בהפעלה שמוחקת שאריות של עבודות שכבר לא קיימות
+    - בדיקת מקום פנוי בדיסק לפני קבלת עבודות חדשות
+    """
+
+    def __init__(self, roots: Iterable[str], max_retries: int = JANITOR_MAX_RETRIES,
+                 retry_delay: float = JANITOR_RETRY_DELAY, min_free_bytes: int = MIN_FREE_DISK_BYTES):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.max_retries = max(1, max_retries)
+        self.retry_delay = retry_delay
+        self.min_free_bytes = min_free_bytes
+        self._tasks: Set[asyncio.Task] = set()
+
+    def delete(self, *paths: Optional[str], directory: Optional[str] = None) -> asyncio.Task:
+        """
+        מחיקת קבצים ברקע (ערכי None מדולגים)
+        directory - תיקייה שתימחק בסוף אם התרוקנה (תיקיות השורש לא נמחקות)
+        """
+        task = asyncio.get_running_loop().create_task(
+            self._delete([path for path in paths if path], directory)
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _delete(self, paths, directory: Optional[str]) -> None:
+        for path in paths:
+            await wait_and_delete(path, self.max_retries, self.retry_delay)
+        if directory and os.path.abspath(directory) not in self.roots:
+            try:
+                os.rmdir(directory)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"לא ניתן למחוק את התיקייה {directory}: {e}")
+
+    def delete_tree(self, directory: str) -> asyncio.Task:
+        """מחיקת תיקייה עם כל התוכן שלה ברקע (למשל תיקיית עבודה שנכשלה)"""
+        task = asyncio.get_running_loop().create_task(self._delete_tree(directory))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _delete_tree(self, directory: str) -> None:
+        if not directory or os.path.abspath(directory) in self.roots:
+            return
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                await asyncio.to_thread(shutil.rmtree, directory)
+                return
+            except FileNotFoundError:
+                return
+            except OSError as e:
+                if attempt == self.max_retries:
+                    logger.error(f"נכשל במחיקת התיקייה {directory}: {e}")
+                    return
+                await asyncio.sleep(self.retry_delay)
+
+    async def drain(self) -> None:
+        """המתנה לסיום כל המחיקות שברקע"""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def sweep(self, keep: Iterable[str] = ()) -> int:
+        """
+        מחיקת כל מה שנמצא בתיקיות השורש חוץ מהשמות ב-keep
+        (נקרא בהפעלה, לפני שעבודות חוזרות לרוץ). מחזיר את מספר הרשומות שנמחקו
+        """
+        keep = set(keep)
+        removed = 0
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            for entry in os.scandir(root):
+                if entry.name in keep:
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)
+                    else:
+                        os.remove(entry.path)
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"לא ניתן למחוק שארית {entry.path}: {e}")
+        if removed:
+            logger.info(f"נמחקו {removed} קבצים ותיקיות שנשארו מעבודות קודמות")
+        return removed
+
+    @staticmethod
+    def free_bytes(path: str) -> int:
+        return shutil.disk_usage(path).free
+
+    def has_free_space(self, path: str, needed: int = 0) -> bool:
+        """בדיקה שנשאר בדיסק לפחות min_free_bytes (ועוד needed) פנויים"""
+        try:
+            return self.free_bytes(path) >= self.min_free_bytes + needed
+        except OSError as e:
+            logger.warning(f"לא ניתן לבדוק מקום פנוי ב-{path}: {e}")
+            return True
+
+
+# מנקה משותף לתיקיות ההורדות והקבצים הזמניים
+janitor = Janitor([DOWNLOAD_PATH, TEMP_PATH])
@@ -0,0 +1,113 @@
+import time
+import sqlite3
+import logging
+import threading
+from typing import List, Optional
+from config.settings import JOBS_DB_FILE
+
+logger = logging.getLogger(__name__)
+
+# שלבי עבודה, לפי הסדר
+STAGE_QUEUED = 'queued'            # התקבלה וממתינה בתור
+STAGE_DOWNLOADING = 'downloading'  # בהורדה
+STAGE_DOWNLOADED = 'downloaded'    # הקובץ המקורי נמצא בדיסק
+STAGE_CONVERTED = 'converted'      # קובץ ה-MP4 מוכן להעלאה
+STAGE_UPLOADED = 'uploaded'        # הועלה לקבוצת היעד (יש file_id)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    file_name TEXT,
+    file_path TEXT,
+    converted_path TEXT,
+    fingerprint TEXT,
+    file_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (chat_id, message_id)
+)
+"""
+
+# עמודות שאפשר לעדכן יחד עם השלב
+_FIELDS = ('file_path', 'converted_path', 'fingerprint', 'file_id')
+
+
+class JobStore:
+    """
+    מאגר עבודות עמיד לקריסות (SQLite)
+    - כל עבודה נרשמת עם השלב האחרון שהושלם והנתיבים של הקבצים שכבר נוצרו
+    - בהפעלה מחדש העבודות שלא הסתיימו נטענות וממשיכות מהשלב שלהן
+    """
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        """פתיחת מסד הנתונים (פעם אחת בלבד)"""
+        with self._lock:
+            if self._conn is not None:
+                return
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+            count = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+            logger.info(f"נטענו {count} עבודות שלא הסתיימו ממאגר העבודות")
+
+    def _execute(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
+        if self._conn is None:
+            self.load()
+        with self._lock:
+            return self._conn.execute(query, params)
+
+    def add(self, message, file_name: str) -> None:
+        """רישום עבודה חדשה בשלב queued"""
+        now = time.time()
+        self._execute(
+            "INSERT OR IGNORE INTO jobs (chat_id, message_id, user_id, stage, file_name, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (message.chat.id, message.id, message.from_user.id, STAGE_QUEUED, file_name, now, now)
+        )
+
+    def set_stage(self, message, stage: str, **fields) -> None:
+        """עדכון שלב העבודה ושדות נוספים (file_path, converted_path, fingerprint, file_id)"""
+        unknown = set(fields) - set(_FIELDS)
+        if unknown:
+            raise ValueError(f"שדות לא מוכרים: {unknown}")
+        columns = ''.join(f", {name} = ?" for name in fields)
+        self._execute(
+            f"UPDATE jobs SET stage = ?, updated_at = ?{columns} WHERE chat_id = ? AND message_id = ?",
+            (stage, time.time(), *fields.values(), message.chat.id, message.id)
+        )
+
+    def get(self, message) -> Optional[dict]:
+        """קבלת רשומת העבודה של הודעה"""
+        row = self._execute(
+            "SELECT * FROM jobs WHERE chat_id = ? AND message_id = ?",
+            (message.chat.id, message.id)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def remove(self, chat_id: int, message_id: int) -> None:
+        """מחיקת עבודה שהסתיימה (בהצלחה, בשגיאה או בביטול)"""
+        self._execute("DELETE FROM jobs WHERE chat_id = ? AND message_id = ?", (chat_id, message_id))
+
+    def pending(self) -> List[dict]:
+        """כל העבודות שלא הסתיימו, לפי סדר הגעתן"""
+        return [dict(row) for row in self._execute("SELECT * FROM jobs ORDER BY created_at")]
+
+    def __contains__(self, key) -> bool:
+        chat_id, message_id = key
+        return self._execute(
+            "SELECT 1 FROM jobs WHERE chat_id = ? AND message_id = ?", (chat_id, message_id)
+        ).fetchone() is not None
+
+
+# מאגר העבודות המשותף
+job_store = JobStore(JOBS_DB_FILE)
@@ -0,0 +1,260 @@
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# גבולות ברירת מחדל להיסטוגרמות זמנים (שניות)
+DEFAULT_TIME_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+# גבולות להיסטוגרמת מהירות העברה (בתים לשנייה)
+SPEED_BUCKETS = tuple(mb * 1024 * 1024 for mb in (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """בסיס משותף למדדים עם תוויות"""
+    kind = ''
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"תוויות לא תואמות למדד {self.name}: {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """מונה שרק עולה"""
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """ערך שיכול לעלות ולרדת"""
+    kind = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """היסטוגרמה מצטברת (buckets, sum, count) בפורמט Prometheus"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_TIME_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values: Dict[Tuple[str, ...], list] = {}  # תוויות -> [מונים לכל גבול, סכום, כמות]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """מדידת זמן של בלוק קוד (מתאים גם לקוד async)"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def _samples(self) -> Iterator[str]:
+        for key, (counts, total, count) in sorted(self._values.items()):
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {bucket_count}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    """אוסף המדדים של הבוט והפקת הטקסט לנקודת הקצה /metrics"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"מדד בשם {metric.name} כבר קיים")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, description, labels))
+
+    def histogram(self, name: str, description: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_TIME_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# זמני שלבים: download, convert, thumbnail, probe, upload
+STAGE_SECONDS = registry.histogram(
+    'video_bot_stage_seconds', 'Duration of pipeline stages in seconds', ['stage'])
+STAGE_FAILURES = registry.counter(
+    'video_bot_stage_failures_total', 'Pipeline stages that ended with an error', ['stage'])
+
+# העברות מול טלגרם
+TRANSFER_BYTES = registry.counter(
+    'video_bot_transfer_bytes_total', 'Bytes transferred to/from Telegram', ['direction'])
+TRANSFER_SPEED = registry.histogram(
+    'video_bot_transfer_bytes_per_second', 'Average speed of completed transfers', ['direction'],
+    buckets=SPEED_BUCKETS)
+
+# תור ועבודות
+QUEUE_DEPTH = registry.gauge('video_bot_queue_depth', 'Files waiting in the queue')
+ACTIVE_JOBS = registry.gauge('video_bot_active_jobs', 'Files currently being processed')
+QUEUE_WAIT_SECONDS = registry.histogram(
+    'video_bot_queue_wait_seconds', 'Time a file waited in the queue before processing started')
+JOBS_FINISHED = registry.counter(
+    'video_bot_jobs_finished_total', 'Finished jobs by outcome', ['outcome'])
+
+# כפילויות
+DEDUP_LOOKUPS = registry.counter(
+    'video_bot_dedup_lookups_total', 'Duplicate lookups by key kind and result', ['kind', 'result'])
+
+# ffmpeg וטלגרם
+FFMPEG_EXITS = registry.counter(
+    'video_bot_ffmpeg_exits_total', 'ffmpeg/ffprobe process exits by exit code', ['tool', 'code'])
+FLOOD_WAITS = registry.counter(
+    'video_bot_floodwait_total', 'FloodWait errors received from Telegram', ['source'])
+FLOOD_WAIT_SECONDS = registry.counter(
+    'video_bot_floodwait_seconds_total', 'Seconds Telegram asked us to wait', ['source'])
+
+# חיפוש בספרייה
+SEARCH_SECONDS = registry.histogram(
+    'video_bot_search_seconds', 'Library search latency by mode', ['mode'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+
+
+def record_dedup(kind: str, hit: bool) -> None:
+    """רישום בדיקת כפילות (filename / unique_id / fingerprint)"""
+    DEDUP_LOOKUPS.inc(kind=kind, result='hit' if hit else 'miss')
+
+
+def record_flood_wait(source: str, seconds: float) -> None:
+    """רישום FloodWait (edit / download / upload)"""
+    FLOOD_WAITS.inc(source=source)
+    FLOOD_WAIT_SECONDS.inc(seconds, source=source)
+
+
+def record_transfer(direction: str, size: int, seconds: float) -> None:
+    """רישום העברה שהסתיימה (download / upload)"""
+    TRANSFER_BYTES.inc(size, direction=direction)
+    if seconds > 0:
+        TRANSFER_SPEED.observe(size / seconds, direction=direction)
+
+
+async def _handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        # דילוג על הכותרות
+        while (await asyncio.wait_for(reader.readline(), 5)).strip():
+            pass
+
+        parts = request_line.decode(errors='ignore').split()
+        if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+            status, body = '200 OK', registry.render().encode()
+        else:
+            status, body = '404 Not Found', b'not found\n'
+
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int) -> Optional[asyncio.AbstractServer]:
+    """
+    הפעלת נקודת הקצה /metrics (port=0 מכבה אותה)
+    אם אי אפשר להאזין (למשל הפורט תפוס) הבוט ממשיך לעבוד בלי נקודת הקצה ומוחזר None
+    """
+    if not port:
+        return None
+    try:
+        server = await asyncio.start_server(_handle_request, host, port)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint disabled - cannot listen on {host}:{port}: {e}")
+        return None
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return server
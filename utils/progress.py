@@ -1,10 +1,32 @@
 import time
 import math
-from typing import Callable, Union
+from typing import Awaitable, Callable, Union
 from pyrogram.types import Message
-from .rate_limiter import TelegramRateLimiter
+from .edit_dispatcher import edit_dispatcher
 import logging
 
+def humanbytes(size: int) -> str:
+    """המרת גודל בבתים למונחים אנושיים"""
+    if size is None or size <= 0:
+        return "0B"
+    units = ['B', 'KB', 'MB', 'GB', 'TB']
+    i = min(int(math.floor(math.log(size, 1024))), len(units) - 1)
+    s = round(size / math.pow(1024, i), 2)
+    return f"{s}{units[i]}"
+
+def humantime(seconds: int) -> str:
+    """המרת שניות למונחים אנושיים"""
+    if not seconds or seconds <= 0:
+        return "0s"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours > 0:
+        return f"{hours}h{minutes}m"
+    elif minutes > 0:
+        return f"{minutes}m{seconds}s"
+    else:
+        return f"{seconds}s"
+
 class ProgressBar:
     def __init__(self, total: int, message: Message, action: str):
         self.total = total
@@ -13,62 +35,18 @@ class ProgressBar:
         self.start_time = time.time()
         self.last_edit_time = 0
         self.last_percentage = 0
-        self.rate_limiter = TelegramRateLimiter()  # יצירת מופע של rate limiter
         
     async def update(self, current: int):
         now = time.time()
-        percentage = current * 100 / self.total
+        percentage = current * 100 / self.total if self.total else 0
         
         # עדכון רק כל 2% או כל 3 שניות
         if (percentage - self.last_percentage < 2) and (now - self.last_edit_time < 3):
             return
             
         try:
-            # בדיקת rate limit לפני העדכון
-            await self.rate_limiter.acquire(
-                self.message.chat.id, 
-                is_group=self.message.chat.type != "private"
-            )
-            
-            # יצירת פס התקדמות ויזואלי
-            progress_length = 20
-            filled_length = int(progress_length * current // self.total)
-            progress_bar = '█' * filled_length + '░' * (progress_length - filled_length)
-            
-            # המרת גדלים למונחים אנושיים
-            def humanbytes(size: int) -> str:
-                if size is None or size == 0:
-                    return "0B"
-                units = ['B', 'KB', 'MB', 'GB', 'TB']
-                i = int(math.floor(math.log(size, 1024)))
-                s = round(size / math.pow(1024, i), 2)
-                return f"{s}{units[i]}"
-                
-            def humantime(seconds: int) -> str:
-                if seconds == 0:
-                    return "0s"
-                minutes, seconds = divmod(int(seconds), 60)
-                hours, minutes = divmod(minutes, 60)
-                if hours > 0:
-                    return f"{hours}h{minutes}m"
-                elif minutes > 0:
-                    return f"{minutes}m{seconds}s"
-                else:
-                    return f"{seconds}s"
-            
-            # חישוב מהירות וזמן שנותר
-            elapsed_time = now - self.start_time
-            speed = current / elapsed_time if elapsed_time > 0 else 0
-            eta = (self.total - current) / speed if speed > 0 else 0
-            
-            # יצירת הודעת התקדמות
-            text = f"**{self.action}**\n\n"
-            text += f"**{progress_bar}** `{percentage:.1f}%`\n\n"
-            text += f"**⚡️ מהירות:** `{humanbytes(speed)}/s`\n"
-            text += f"**📊 הושלם:** `{humanbytes(current)} / {humanbytes(self.total)}`\n"
-            text += f"**⏱ זמן נותר:** `{humantime(eta)}`"
-            
-            await self.message.edit_text(text)
+            # העריכה נשלחת דרך המנהל המרכזי - לא ממתינים למגבלת הקצב
+            edit_dispatcher.submit(self.message, self._build_text(current, percentage, now))
             
             # עדכון המצב האחרון
             self.last_percentage = percentage
@@ -77,6 +55,79 @@ class ProgressBar:
         except Exception as e:
             logging.error(f"Error updating progress: {e}")
 
+    def _progress_bar(self, percentage: float) -> str:
+        """יצירת פס התקדמות ויזואלי"""
+        progress_length = 20
+        filled_length = min(progress_length, int(progress_length * percentage // 100))
+        return '█' * filled_length + '░' * (progress_length - filled_length)
+
+    def _build_text(self, current: int, percentage: float, now: float) -> str:
+        # חישוב מהירות וזמן שנותר
+        elapsed_time = now - self.start_time
+        speed = current / elapsed_time if elapsed_time > 0 else 0
+        eta = (self.total - current) / speed if speed > 0 else 0
+        
+        # יצירת הודעת התקדמות
+        text = f"**{self.action}**\n\n"
+        text += f"**{self._progress_bar(percentage)}** `{percentage:.1f}%`\n\n"
+        text += f"**⚡️ מהירות:** `{humanbytes(speed)}/s`\n"
+        text += f"**📊 הושלם:** `{humanbytes(current)} / {humanbytes(self.total)}`\n"
+        text += f"**⏱ זמן נותר:** `{humantime(eta)}`"
+        return text
+
+class TranscodeProgressBar(ProgressBar):
+    """פס התקדמות להמרה - לפי זמן הוידאו שכבר קודד ומהירות הקידוד"""
+
+    def __init__(self, duration: float, message: Message, action: str):
+        super().__init__(int(duration), message, action)
+        self.duration = duration
+        self.encode_speed = 0.0
+
+    async def update_transcode(self, out_time: float, encode_speed: float):
+        self.encode_speed = encode_speed
+        await self.update(int(out_time))
+
+    def _build_text(self, current: int, percentage: float, now: float) -> str:
+        # זמן שנותר לפי מהירות הקידוד (פי כמה מהר מזמן אמת)
+        if self.encode_speed > 0 and self.duration:
+            eta = (self.duration - current) / self.encode_speed
+        else:
+            elapsed_time = now - self.start_time
+            eta = (self.duration - current) * elapsed_time / current if current > 0 else 0
+        
+        text = f"**{self.action}**\n\n"
+        if self.duration:
+            text += f"**{self._progress_bar(percentage)}** `{percentage:.1f}%`\n\n"
+        text += f"**⚡️ מהירות קידוד:** `{self.encode_speed:.2f}x`\n"
+        text += f"**📊 הושלם:** `{humantime(current)} / {humantime(self.duration)}`\n"
+        text += f"**⏱ זמן נותר:** `{humantime(eta)}`"
+        return text
+
+class FFmpegProgressParser:
+    """פענוח הפלט של ffmpeg -progress (שורות key=value, בלוק שמסתיים ב-progress=...)"""
+
+    def __init__(self, callback: Callable[[float, float], Awaitable[None]]):
+        self.callback = callback
+        self.out_time = 0.0
+        self.speed = 0.0
+
+    async def feed_line(self, line: str) -> None:
+        key, _, value = line.partition('=')
+        value = value.strip()
+        if key in ('out_time_us', 'out_time_ms'):
+            # בשתי הגרסאות הערך הוא במיקרו-שניות
+            try:
+                self.out_time = max(0.0, int(value) / 1_000_000)
+            except ValueError:
+                pass
+        elif key == 'speed':
+            try:
+                self.speed = float(value.rstrip('x'))
+            except ValueError:
+                self.speed = 0.0
+        elif key == 'progress':
+            await self.callback(self.out_time, self.speed)
+
 def get_progress_callback(message: Message, action: str) -> Callable:
     """יוצר פונקציית התקדמות עבור פעולות טלגרם"""
     progress_bar = None
@@ -88,3 +139,9 @@ def get_progress_callback(message: Message, action: str) -> Callable:
         await progress_bar.update(current)
         
     return progress
+
+def get_transcode_progress_callback(message: Message, action: str, duration: float) -> Callable:
+    """יוצר פונקציה שמקבלת שורות -progress של ffmpeg ומעדכנת פס התקדמות"""
+    progress_bar = TranscodeProgressBar(duration, message, action)
+    parser = FFmpegProgressParser(progress_bar.update_transcode)
+    return parser.feed_line
@@ -11,17 +11,23 @@ class TelegramRateLimiter:
     מנהל הגבלות קצב שליחת הודעות בטלגרם
     - בצ'אט פרטי: הודעה אחת בשנייה
     - בקבוצה: 20 הודעות בדקה
+    - בכל הצ'אטים יחד: 30 הודעות בשנייה
+    - אחרי FloodWait הצ'אט חסום עד תום זמן ההמתנה
     """
     
     def __init__(self):
         # שמירת היסטוריית הודעות לכל צ'אט
         self.private_chat_history: Dict[int, Deque[float]] = defaultdict(deque)
         self.group_chat_history: Dict[int, Deque[float]] = defaultdict(deque)
+        self.global_history: Deque[float] = deque()
+        self.blocked_until: Dict[int, float] = {}  # חסימות FloodWait לפי צ'אט
         
         # מגבלות
         self.PRIVATE_MESSAGE_INTERVAL = 1.0  # שנייה בין הודעות בצ'אט פרטי
         self.GROUP_MESSAGE_LIMIT = 20        # הודעות בדקה בקבוצה
         self.GROUP_WINDOW_SIZE = 60.0        # חלון זמן בשניות לקבוצה
+        self.GLOBAL_MESSAGE_LIMIT = 30       # הודעות בשנייה בכל הצ'אטים
+        self.GLOBAL_WINDOW_SIZE = 1.0        # חלון זמן בשניות למגבלה הכללית
         
         logger.info("TelegramRateLimiter initialized")
 
@@ -33,13 +39,56 @@ class TelegramRateLimiter:
             chat_id (int): מזהה הצ'אט
             is_group (bool): האם זו קבוצה
         """
+        wait_time = self.ready_in(chat_id, is_group)
+        if wait_time > 0:
+            logger.debug(f"Waiting {wait_time:.2f}s for chat {chat_id} rate limit")
+            await asyncio.sleep(wait_time)
+        
         current_time = time.time()
+        self.global_history.append(current_time)
         
         if is_group:
             await self._handle_group_message(chat_id, current_time)
         else:
             await self._handle_private_message(chat_id, current_time)
 
+    def ready_in(self, chat_id: int, is_group: bool = False) -> float:
+        """
+        כמה שניות יש להמתין לפני שאפשר לשלוח לצ'אט (0 = אפשר עכשיו)
+        
+        Args:
+            chat_id (int): מזהה הצ'אט
+            is_group (bool): האם זו קבוצה
+        """
+        current_time = time.time()
+        wait_time = max(0.0, self.blocked_until.get(chat_id, 0) - current_time)
+        
+        # מגבלה כללית
+        while self.global_history and current_time - self.global_history[0] >= self.GLOBAL_WINDOW_SIZE:
+            self.global_history.popleft()
+        if len(self.global_history) >= self.GLOBAL_MESSAGE_LIMIT:
+            wait_time = max(wait_time, self.global_history[0] + self.GLOBAL_WINDOW_SIZE - current_time)
+        
+        # מגבלת הצ'אט
+        if is_group:
+            history = self.group_chat_history.get(chat_id)
+            if history:
+                while history and current_time - history[0] >= self.GROUP_WINDOW_SIZE:
+                    history.popleft()
+                if len(history) >= self.GROUP_MESSAGE_LIMIT:
+                    wait_time = max(wait_time, history[0] + self.GROUP_WINDOW_SIZE - current_time)
+        else:
+            history = self.private_chat_history.get(chat_id)
+            if history:
+                wait_time = max(wait_time, history[-1] + self.PRIVATE_MESSAGE_INTERVAL - current_time)
+        
+        return max(0.0, wait_time)
+
+    def penalize(self, chat_id: int, seconds: float) -> None:
+        """חסימת צ'אט לאחר FloodWait מטלגרם"""
+        self.blocked_until[chat_id] = max(self.blocked_until.get(chat_id, 0), time.time() + seconds)
+        logger.warning(f"FloodWait: chat {chat_id} blocked for {seconds}s")
+
     async def _handle_group_message(self, chat_id: int, current_time: float) -> None:
         """טיפול בהודעות קבוצה"""
         history = self.group_chat_history[chat_id]
@@ -91,6 +140,10 @@ class TelegramRateLimiter:
             if not history:
                 del self.group_chat_history[chat_id]
         
+        # ניקוי חסימות FloodWait שפגו
+        for chat_id in [c for c, until in self.blocked_until.items() if until <= current_time]:
+            del self.blocked_until[chat_id]
+        
         # ניקוי היסטוריית צ'אטים פרטיים ישנים (מעל שעה)
         for chat_id in list(self.private_chat_history.keys()):
             history = self.private_chat_history[chat_id]
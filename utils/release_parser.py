@@ -0,0 +1,136 @@
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+from config.settings import VIDEO_FORMATS
+
+# סיומות שמוסרות לפני הניתוח (בלי זה "Movie.2019.1080p" היה מאבד את "1080p" כסיומת)
+VIDEO_EXTENSIONS = {
+    '.mkv', '.avi', '.mov', '.mp4', '.m4v', '.flv', '.webm', '.ts', '.mts', '.wmv',
+    '.vob', '.dat', '.rm', '.rmvb', '.divx', '.mpg'
+}
+
+# תווים שמפרידים בין מילים בשמות של קבצים
+_SEPARATORS = re.compile(r'[._\s]+')
+
+# גבולות של מילה: אותיות וספרות לא יכולות להיות צמודות לטוקן ("Ts" בתוך "Hits" לא נחשב)
+_LEFT = r'(?<![A-Za-z0-9])'
+_RIGHT = r'(?![A-Za-z0-9])'
+
+
+def _alternation(formats):
+    """
+    ביטוי שמתאים לכל אחד מהפורמטים. טוקנים ארוכים מתאימים בלי תלות ברישיות,
+    וטוקנים קצרים (Ts, CAM) רק בכתיב המקורי או באותיות גדולות, כדי לא לתפוס מילים רגילות
+    """
+    parts = []
+    for fmt in sorted(set(formats), key=len, reverse=True):
+        if len(fmt) <= 3:
+            parts.extend(re.escape(variant) for variant in sorted({fmt, fmt.upper()}))
+        else:
+            parts.append('(?i:' + re.escape(fmt).replace(r'\-', '[-._ ]?') + ')')
+    return '|'.join(parts)
+
+
+def _canonical(formats):
+    """מיפוי מצורה מנורמלת (אותיות קטנות, בלי מפרידים) לכתיב הראשון ברשימה"""
+    canonical = {}
+    for fmt in formats:
+        canonical.setdefault(re.sub(r'[-._ ]', '', fmt.lower()), fmt)
+    return canonical
+
+
+_RESOLUTIONS = {fmt.lower(): fmt.lower() for fmt in VIDEO_FORMATS['PIXEL']}
+_SOURCES = _canonical(VIDEO_FORMATS['OTHER'])
+
+# ביטוי אחד לכל סוגי הטוקנים - מעבר יחיד על השם
+_TOKENS = re.compile(
+    _LEFT + '(?:'
+    + r'(?P<episode>[Ss](?P<season>\d{1,2})[ ._-]?[Ee](?P<episode_number>\d{1,3}))'
+    + r'|(?P<episode_x>(?P<season_x>\d{1,2})x(?P<episode_number_x>\d{2,3}))'
+    + r'|(?P<year>(?:19|20)\d{2})'
+    + f'|(?P<resolution>(?i:{"|".join(re.escape(fmt) for fmt in sorted(_RESOLUTIONS, key=len, reverse=True))}))'
+    + f'|(?P<source>{_alternation(VIDEO_FORMATS["OTHER"])})'
+    + ')' + _RIGHT
+)
+
+
+@dataclass(frozen=True)
+class ReleaseInfo:
+    """מידע שחולץ משם של קובץ וידאו"""
+    name: str                          # שם הקובץ בלי סיומת
+    title: str                         # שם הסרט/הסדרה, עם רווחים במקום מפרידים
+    year: Optional[int] = None
+    season: Optional[int] = None
+    episode: Optional[int] = None
+    resolution: Optional[str] = None   # כמו ב-VIDEO_FORMATS['PIXEL'], למשל 1080p
+    source: Optional[str] = None       # כמו ב-VIDEO_FORMATS['OTHER'], למשל WEB-DL
+
+    @property
+    def display_name(self) -> str:
+        """שם לתצוגה: כותרת, פרק ושנה"""
+        display = self.title or self.name
+        if self.season is not None and self.episode is not None:
+            display += f" S{self.season:02d}E{self.episode:02d}"
+        if self.year:
+            display += f" ({self.year})"
+        return display
+
+
+def canonical_source(text: str) -> Optional[str]:
+    """הכתיב של מקור (WEB-DL, BluRay...) לפי VIDEO_FORMATS, לכל כתיב שלו ("web dl", "web_dl", "webdl"), או None"""
+    return _SOURCES.get(re.sub(r'[-._ ]', '', text.lower()))
+
+
+def strip_extension(file_name: str) -> str:
+    base_name = os.path.basename(file_name)
+    root, ext = os.path.splitext(base_name)
+    return root if ext.lower() in VIDEO_EXTENSIONS else base_name
+
+
+@lru_cache(maxsize=4096)
+def parse_release(file_name: str) -> ReleaseInfo:
+    """
+    ניתוח שם קובץ במעבר אחד: כותרת, שנה, עונה/פרק, רזולוציה ומקור
+    הכותרת היא כל מה שלפני הטוקן הראשון. שנה בתחילת השם נחשבת חלק מהכותרת (2012.2009.720p),
+    ומכמה שנים לפני שאר הטוקנים נבחרת האחרונה (Blade.Runner.2049.2017)
+    """
+    name = strip_extension(file_name)
+    years = []
+    first_token = len(name)
+    season = episode = resolution = source = None
+
+    for match in _TOKENS.finditer(name):
+        if match.group('year'):
+            if match.start() > 0:
+                years.append(match)
+            continue
+        first_token = min(first_token, match.start())
+        if match.group('episode') and season is None:
+            season, episode = int(match.group('season')), int(match.group('episode_number'))
+        elif match.group('episode_x') and season is None:
+            season, episode = int(match.group('season_x')), int(match.group('episode_number_x'))
+        elif match.group('resolution') and resolution is None:
+            resolution = _RESOLUTIONS.get(match.group('resolution').lower())
+        elif match.group('source') and source is None:
+            source = canonical_source(match.group('source'))
+
+    year = None
+    before = [match for match in years if match.start() < first_token]
+    if before:
+        year = before[-1]
+        first_token = min(first_token, year.start())
+    elif years:
+        year = years[0]
+
+    title = _SEPARATORS.sub(' ', name[:first_token]).strip(' -([')
+    return ReleaseInfo(
+        name=name,
+        title=title,
+        year=int(year.group('year')) if year else None,
+        season=season,
+        episode=episode,
+        resolution=resolution,
+        source=source,
+    )
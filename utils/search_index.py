@@ -0,0 +1,216 @@
+import re
+import bisect
+import hashlib
+import heapq
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from .release_parser import ReleaseInfo, parse_release, canonical_source
+
+logger = logging.getLogger(__name__)
+
+# מילים בכותרת (כולל אותיות בעברית); קו תחתון הוא מפריד
+_WORDS = re.compile(r'[^\W_]+')
+
+# עונה/פרק בכתיבים שונים: s5e14, s05e14, 5x14, או עונה בלבד (s05)
+_EPISODE = re.compile(r's(\d{1,2})e(\d{1,3})|(\d{1,2})x(\d{2,3})|s(\d{1,2})')
+
+# מספר המילים המקסימלי שמילה חלקית (בזמן הקלדה) יכולה להתרחב אליהן
+MAX_PREFIX_EXPANSION = 200
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    """תוצאת חיפוש - קובץ שכבר נמצא בקבוצת היעד"""
+    key: str  # מזהה קבוע לפי שם הקובץ (לכפתורים ולתוצאות inline) - לא משתנה בין הפעלות
+    file_name: str
+    file_id: str
+    info: ReleaseInfo
+
+    @property
+    def quality(self) -> str:
+        return ' '.join(value for value in (self.info.resolution, self.info.source) if value)
+
+
+def release_tokens(info: ReleaseInfo) -> List[str]:
+    """
+    טוקנים מנורמלים: מילות הכותרת באותיות קטנות, שנה, עונה/פרק, רזולוציה ומקור
+    כולם במרחב אחד, כך ש-"2019" או "s05" בשאילתה מתאימים בלי לדעת איזה סוג טוקן הם
+    קובץ בלי כותרת מזוהה נכנס לאינדקס לפי השם המלא
+    """
+    tokens = _WORDS.findall((info.title or info.name).casefold())
+    if info.year:
+        tokens.append(str(info.year))
+    if info.season is not None:
+        tokens.append(f"s{info.season:02d}")
+        if info.episode is not None:
+            tokens.append(f"s{info.season:02d}e{info.episode:02d}")
+    if info.resolution:
+        tokens.append(info.resolution.lower())
+    if info.source:
+        tokens.append(re.sub(r'[^0-9a-z]', '', info.source.lower()))
+    return list(dict.fromkeys(tokens))
+
+
+def file_key(file_name: str) -> str:
+    """מזהה קצר וקבוע לשם קובץ (נכנס ב-callback_data, שמוגבל ל-64 בתים)"""
+    return hashlib.blake2b(file_name.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _episode_token(word: str) -> Optional[str]:
+    match = _EPISODE.fullmatch(word)
+    if not match:
+        return None
+    season, episode, season_x, episode_x, season_only = match.groups()
+    if season_only:
+        return f"s{int(season_only):02d}"
+    return f"s{int(season or season_x):02d}e{int(episode or episode_x):02d}"
+
+
+def query_tokens(query: str) -> List[str]:
+    """
+    פירוק שאילתה לטוקנים באותו מרחב של release_tokens, כל מילה בנפרד ובלי תלות בסדר.
+    שתי מילים צמודות שיחד הן מקור ("web dl", "web-dl") או פרק ("s05 e14") מתאחדות לטוקן אחד
+    """
+    words = _WORDS.findall(query.casefold())
+    tokens = []
+    index = 0
+    while index < len(words):
+        word = words[index]
+        if index + 1 < len(words):
+            pair = word + words[index + 1]
+            pair_token = pair if canonical_source(pair) else _episode_token(pair)
+            if pair_token:
+                tokens.append(pair_token)
+                index += 2
+                continue
+        tokens.append(_episode_token(word) or word)
+        index += 1
+    return list(dict.fromkeys(tokens))
+
+
+def _resolution_rank(info: ReleaseInfo) -> int:
+    return int(info.resolution[:-1]) if info.resolution else 0
+
+
+class SearchIndex:
+    """
+    אינדקס הפוך על כל מה שהבוט כבר העלה (שם קובץ -> file_id)
+    - נבנה פעם אחת ממאגר המזהים ומתעדכן בכל שמירה (מאזין של FileIdStore)
+    - מילות השאילתה מנורמלות כמו הטוקנים של הקבצים ("web-dl", "S5E14"), בלי תלות בסדר שלהן
+    - כל מילה בשאילתה חייבת להופיע; מילה שלא נמצאה בשלמותה מתאימה כתחילית (חיפוש תוך כדי הקלדה)
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Set[int]] = {}
+        self._docs: Dict[int, SearchHit] = {}
+        self._doc_ranks: Dict[int, tuple] = {}  # דירוג קבוע: כותרת קצרה, רזולוציה גבוהה, שם
+        self._ids: Dict[str, int] = {}   # שם קובץ -> מספר פנימי
+        self._keys: Dict[str, int] = {}  # מזהה קבוע -> מספר פנימי
+        self._next_id = 1
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self._attached = False
+
+    def attach(self, store) -> None:
+        """בנייה מחדש ממאגר מזהים ורישום לעדכונים שלו"""
+        self.build(store.items())
+        if not self._attached:
+            store.add_listener(self.add)
+            self._attached = True
+
+    def build(self, items: Iterable[Tuple[str, str]]) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._docs.clear()
+            self._doc_ranks.clear()
+            self._ids.clear()
+            self._keys.clear()
+            self._vocabulary = []
+            self._vocabulary_dirty = False
+            self._next_id = 1
+            for file_name, file_id in items:
+                self.add(file_name, file_id)
+            logger.info(f"אינדקס החיפוש נבנה: {len(self._docs)} קבצים, {len(self._postings)} מילים")
+
+    def add(self, file_name: str, file_id: str) -> None:
+        """הוספה או עדכון של קובץ באינדקס"""
+        if not file_id:
+            return
+        with self._lock:
+            doc_id = self._ids.get(file_name)
+            if doc_id is not None:
+                # אותו שם - אותם טוקנים, מתעדכן רק ה-file_id
+                hit = self._docs[doc_id]
+                self._docs[doc_id] = SearchHit(hit.key, file_name, file_id, hit.info)
+                return
+
+            info = parse_release(file_name)
+            doc_id = self._next_id
+            self._next_id += 1
+            key = file_key(file_name)
+            self._ids[file_name] = doc_id
+            self._keys[key] = doc_id
+            self._docs[doc_id] = SearchHit(key, file_name, file_id, info)
+            title_words = len(_WORDS.findall(info.title or info.name))
+            self._doc_ranks[doc_id] = (title_words, -_resolution_rank(info), file_name)
+            for token in release_tokens(info):
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = set()
+                    self._vocabulary_dirty = True
+                postings.add(doc_id)
+
+    def get(self, key: str) -> Optional[SearchHit]:
+        """תוצאה לפי המזהה הקבוע שלה (מכפתור של חיפוש קודם, גם מלפני הפעלה מחדש)"""
+        doc_id = self._keys.get(key)
+        return self._docs.get(doc_id) if doc_id is not None else None
+
+    def search(self, query: str, limit: int = 10) -> List[SearchHit]:
+        """החזרת עד limit קבצים שמתאימים לכל מילות השאילתה, מהמתאים ביותר"""
+        tokens = query_tokens(query or '')
+        if not tokens or limit <= 0:
+            return []
+
+        with self._lock:
+            matches = []
+            for token in tokens:
+                docs = self._postings.get(token) or self._expand_prefix(token)
+                if not docs:
+                    return []
+                matches.append(docs)
+
+            # חיתוך מהקבוצה הקטנה ביותר
+            matches.sort(key=len)
+            candidates = matches[0]
+            for docs in matches[1:]:
+                candidates = candidates & docs
+                if not candidates:
+                    return []
+
+            best = heapq.nsmallest(limit, candidates, key=self._doc_ranks.__getitem__)
+            return [self._docs[doc_id] for doc_id in best]
+
+    def _expand_prefix(self, prefix: str) -> Set[int]:
+        """איחוד המסמכים של כל המילים שמתחילות ב-prefix"""
+        if len(prefix) < 2:
+            return set()
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        docs = set()
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for word in self._vocabulary[start:start + MAX_PREFIX_EXPANSION]:
+            if not word.startswith(prefix):
+                break
+            docs |= self._postings[word]
+        return docs
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+
+# אינדקס משותף, מחובר למאגר המזהים בעליית הבוט
+search_index = SearchIndex()
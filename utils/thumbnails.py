@@ -0,0 +1,165 @@
+import os
+import re
+import uuid
+import logging
+from typing import Iterable, Optional
+from config.settings import (
+    THUMBNAIL_MAX_SIZE, THUMBNAIL_MIN_LUMA, THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_FILES,
+    FFMPEG_THUMBNAIL_TIMEOUT
+)
+from .ffmpeg_runner import ffmpeg_runner, PRIORITY_HIGH
+
+logger = logging.getLogger(__name__)
+
+# נקודות בווידאו (כחלק מהמשך) שנבדקות לפי הסדר עד שנמצא פריים שאינו שחור
+CANDIDATE_FRACTIONS = (0.1, 0.25, 0.5, 0.75)
+
+# נקודות בשניות כשמשך הווידאו לא ידוע
+FALLBACK_OFFSETS = (1.0, 10.0, 30.0)
+
+# גודל הדגימה המוקטנת שעליה מחושבת הבהירות
+LUMA_SAMPLE_SIZE = 16
+
+
+class ThumbnailEngine:
+    """
+    יצירת תמונות ממוזערות
+    - חיפוש לפני -i: ffmpeg קופץ ל-keyframe הקרוב במקום לפענח מתחילת הקובץ
+    - הקטנה למגבלת טלגרם (320 פיקסלים) באותה הרצה
+    - בדיקת בהירות זולה על דגימה של 16x16 כדי לדלג על פריימים שחורים
+    - מטמון לפי טביעת האצבע של התוכן, כך שאותו מקור לא מפוענח פעמיים
+    """
+
+    def __init__(self, cache_dir: str, max_files: int = THUMBNAIL_CACHE_MAX_FILES):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_files = max_files
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def cache_path(self, cache_key: str) -> str:
+        return os.path.join(self.cache_dir, f"{re.sub(r'[^0-9A-Za-z_-]', '_', cache_key)}.jpg")
+
+    def owns(self, path: Optional[str]) -> bool:
+        """האם הקובץ שייך למטמון (ולכן לא נמחק בניקוי של העבודה)"""
+        return bool(path) and os.path.dirname(os.path.abspath(path)) == self.cache_dir
+
+    def cached(self, cache_key: Optional[str]) -> Optional[str]:
+        """תמונה שכבר נמצאת במטמון, אם יש"""
+        if not cache_key:
+            return None
+        path = self.cache_path(cache_key)
+        if not os.path.exists(path):
+            return None
+        try:
+            os.utime(path)  # סימון כשימוש אחרון, כדי שהניקוי ימחק קודם תמונות ישנות
+        except OSError:
+            pass
+        return path
+
+    async def create(self, input_file: str, output_file: Optional[str] = None, duration: float = 0,
+                     cache_key: Optional[str] = None, offsets: Optional[Iterable[float]] = None) -> Optional[str]:
+        """
+        יצירת תמונה ממוזערת. מחזיר את נתיב התמונה או None בכישלון
+        cache_key - טביעת האצבע של המקור; אם נשלח, התמונה נשמרת במטמון ונתיב המטמון מוחזר
+        """
+        cached = self.cached(cache_key)
+        if cached:
+            logger.info(f"תמונה ממוזערת נלקחה מהמטמון: {cached}")
+            return cached
+
+        destination = self.cache_path(cache_key) if cache_key else output_file
+        if not destination:
+            raise ValueError("נדרש output_file או cache_key")
+        if offsets is None:
+            offsets = self._candidate_offsets(duration)
+
+        best = None  # (בהירות, נתיב) של הפריים הבהיר ביותר שנמצא
+        candidates = []
+        # שם ייחודי לכל קריאה: שתי עבודות עם אותה טביעת אצבע (קובץ כפול שנשלח בזמן העיבוד)
+        # לא כותבות ומוחקות את אותם קבצים. התמונה הנבחרת נכנסת למטמון ב-os.replace
+        token = uuid.uuid4().hex
+        try:
+            for index, offset in enumerate(offsets):
+                candidate = f"{destination}.{token}.{index}.tmp.jpg"
+                candidates.append(candidate)
+                luma = await self._extract(input_file, candidate, offset)
+                if luma is None:
+                    continue
+                if best is None or luma > best[0]:
+                    best = (luma, candidate)
+                if luma >= THUMBNAIL_MIN_LUMA:
+                    break
+
+            if best is None:
+                return None
+            if best[0] < THUMBNAIL_MIN_LUMA:
+                logger.info(f"לא נמצא פריים בהיר ב-{input_file}, משתמש בבהיר ביותר ({best[0]:.0f})")
+            os.replace(best[1], destination)
+        finally:
+            for candidate in candidates:
+                if os.path.exists(candidate):
+                    try:
+                        os.remove(candidate)
+                    except OSError:
+                        pass
+
+        if cache_key:
+            self._prune()
+        return destination
+
+    @staticmethod
+    def _candidate_offsets(duration: float):
+        if duration and duration > 0:
+            # בסרטונים קצרים מאוד נשארים קרוב להתחלה
+            offsets = [min(duration * fraction, max(0.0, duration - 0.5)) for fraction in CANDIDATE_FRACTIONS]
+        else:
+            offsets = list(FALLBACK_OFFSETS)
+        return list(dict.fromkeys(offsets + [0.0]))
+
+    @staticmethod
+    async def _extract(input_file: str, output_file: str, offset: float) -> Optional[float]:
+        """חילוץ פריים אחד בנקודה offset. מחזיר את הבהירות הממוצעת שלו, או None בכישלון"""
+        size = THUMBNAIL_MAX_SIZE
+        filters = (
+            f"[0:v:0]split=2[thumb][luma];"
+            f"[thumb]scale={size}:{size}:force_original_aspect_ratio=decrease[thumb_out];"
+            f"[luma]scale={LUMA_SAMPLE_SIZE}:{LUMA_SAMPLE_SIZE},format=gray[luma_out]"
+        )
+        result = await ffmpeg_runner.run(
+            [
+                'ffmpeg', '-y', '-noaccurate_seek', '-ss', f"{offset:.3f}", '-i', input_file,
+                '-filter_complex', filters,
+                '-map', '[luma_out]', '-frames:v', '1', '-f', 'rawvideo', 'pipe:1',
+                '-map', '[thumb_out]', '-frames:v', '1', '-q:v', '4', output_file
+            ],
+            priority=PRIORITY_HIGH,
+            timeout=FFMPEG_THUMBNAIL_TIMEOUT,
+            capture_stdout=True
+        )
+        if not result.ok:
+            logger.warning(f"שגיאה בחילוץ פריים בשנייה {offset:.1f}: {result.stderr_tail}")
+            return None
+        # נקודה אחרי סוף הקובץ מסתיימת בהצלחה אבל בלי פריים
+        if not result.stdout or not os.path.exists(output_file) or not os.path.getsize(output_file):
+            return None
+        return sum(result.stdout) / len(result.stdout)
+
+    def _prune(self) -> None:
+        """מחיקת התמונות הישנות ביותר כשהמטמון גדל מעבר למגבלה"""
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir)
+                       if entry.is_file() and entry.name.endswith('.jpg') and not entry.name.endswith('.tmp.jpg')]
+        except OSError:
+            return
+        excess = len(entries) - self.max_files
+        if excess <= 0:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+            except OSError as e:
+                logger.warning(f"לא ניתן למחוק תמונה ישנה מהמטמון {entry.path}: {e}")
+
+
+# מנוע משותף לתמונות ממוזערות
+thumbnail_engine = ThumbnailEngine(THUMBNAIL_CACHE_DIR)
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from config.settings import TRACE_LOG_FILE
+
+logger = logging.getLogger(__name__)
+
+JobKey = Tuple[int, int]  # (chat_id, message_id)
+
+
+class Tracer:
+    """
+    מעקב מובנה אחרי עבודות
+    - לכל עבודה מזהה מעקב (trace_id) שנוצר כשההודעה מתקבלת
+    - כל שלב נרשם כ-span עם זמן התחלה ומשך, כולל המתנה בתור
+    - האירועים נכתבים כשורות JSON לקובץ המעקב (ראה tools/trace_report.py)
+    """
+
+    def __init__(self, log_file: Optional[str]):
+        self._traces: Dict[JobKey, dict] = {}
+        self._open_spans: Dict[Tuple[JobKey, str], float] = {}
+        self._logger = logging.getLogger('video_bot.trace')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        if log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+            handler = logging.FileHandler(log_file, encoding='utf-8', delay=True)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._logger.addHandler(handler)
+
+    @staticmethod
+    def _key(message) -> JobKey:
+        return message.chat.id, message.id
+
+    def start_trace(self, message, **attrs) -> str:
+        """פתיחת מעקב לעבודה חדשה"""
+        trace_id = uuid.uuid4().hex[:16]
+        self._traces[self._key(message)] = {'trace_id': trace_id, 'start': time.time()}
+        self._emit(message, 'trace_start', user_id=message.from_user.id, **attrs)
+        return trace_id
+
+    def trace_id(self, message) -> str:
+        """מזהה המעקב של העבודה (נפתח אוטומטית לעבודות שחזרו מהפעלה קודמת)"""
+        trace = self._traces.get(self._key(message))
+        if trace is None:
+            return self.start_trace(message, resumed=True)
+        return trace['trace_id']
+
+    def end_trace(self, message, outcome: str) -> None:
+        """סגירת המעקב של העבודה"""
+        key = self._key(message)
+        trace = self._traces.get(key)
+        if trace is None:
+            return
+        self._emit(message, 'trace_end', outcome=outcome, duration=round(time.time() - trace['start'], 3))
+        self._traces.pop(key, None)
+        for span_key in [span_key for span_key in self._open_spans if span_key[0] == key]:
+            del self._open_spans[span_key]
+
+    @contextmanager
+    def span(self, message, name: str, **attrs):
+        """מדידת שלב בתוך אותה פונקציה (מתאים גם לקוד async)"""
+        start = time.time()
+        status = 'ok'
+        try:
+            yield
+        except BaseException as e:
+            status = type(e).__name__
+            raise
+        finally:
+            self._emit_span(message, name, start, status, attrs)
+
+    def open_span(self, message, name: str) -> None:
+        """פתיחת שלב שמסתיים במקום אחר (למשל המתנה בתור)"""
+        self._open_spans[(self._key(message), name)] = time.time()
+
+    def close_span(self, message, name: str, status: str = 'ok', **attrs) -> None:
+        start = self._open_spans.pop((self._key(message), name), None)
+        if start is not None:
+            self._emit_span(message, name, start, status, attrs)
+
+    def event(self, message, name: str, **attrs) -> None:
+        """רישום אירוע נקודתי בעבודה"""
+        self._emit(message, name, **attrs)
+
+    def _emit_span(self, message, name: str, start: float, status: str, attrs: dict) -> None:
+        self._emit(message, 'span', name=name, start=round(start, 3),
+                   duration=round(time.time() - start, 3), status=status, **attrs)
+
+    def _emit(self, message, event: str, **fields) -> None:
+        if not self._logger.handlers:
+            return
+        key = self._key(message)
+        record = {
+            'ts': round(time.time(), 3),
+            'trace_id': self.trace_id(message),
+            'job': f"{key[0]}_{key[1]}",
+            'event': event,
+        }
+        record.update(fields)
+        try:
+            self._logger.info(json.dumps(record, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.warning(f"שגיאה בכתיבת אירוע מעקב: {e}")
+
+
+# מעקב משותף לכל העבודות בבוט
+tracer = Tracer(TRACE_LOG_FILE)
@@ -0,0 +1,105 @@
+import json
+import math
+import logging
+from typing import Optional
+from config.settings import FFPROBE_TIMEOUT
+from utils.ffmpeg_runner import ffmpeg_runner, PRIORITY_HIGH
+from utils.metrics import STAGE_SECONDS, STAGE_FAILURES
+
+logger = logging.getLogger(__name__)
+
+# ffprobe קורא רק את הכותרות של הקובץ; מגבלות הסריקה שומרות על הקריאה קטנה גם בקבצים גדולים
+FFPROBE_COMMAND = [
+    'ffprobe', '-v', 'error',
+    '-probesize', '10M',
+    '-analyzeduration', '10M',
+    '-print_format', 'json',
+    '-show_format', '-show_streams',
+]
+
+
+def _to_int(value, default: int = 0) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_fps(rate: Optional[str]) -> float:
+    """המרת קצב פריימים בפורמט '30000/1001' למספר"""
+    if not rate or rate == '0/0':
+        return 0.0
+    try:
+        numerator, _, denominator = rate.partition('/')
+        return float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _parse_duration(*values) -> float:
+    """משך בשניות מהערך התקין הראשון ('N/A' או ערך חסר עוברים לבא בתור), אחרת 0"""
+    for value in values:
+        try:
+            duration = float(value)
+        except (TypeError, ValueError):
+            continue
+        if math.isfinite(duration) and duration > 0:
+            return duration
+    return 0.0
+
+
+def parse_probe_output(output: str) -> dict:
+    """המרת פלט ה-JSON של ffprobe למילון מידע על הווידאו"""
+    data = json.loads(output or '{}')
+    fmt = data.get('format', {})
+    streams = data.get('streams', [])
+
+    video = next((s for s in streams if s.get('codec_type') == 'video'
+                  and not s.get('disposition', {}).get('attached_pic')), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+
+    duration = _parse_duration(fmt.get('duration'), (video or {}).get('duration'))
+
+    return {
+        'duration': int(duration),
+        'duration_exact': duration,
+        'width': _to_int((video or {}).get('width')),
+        'height': _to_int((video or {}).get('height')),
+        'fps': _parse_fps((video or {}).get('avg_frame_rate') or (video or {}).get('r_frame_rate')),
+        'video_codec': (video or {}).get('codec_name'),
+        'pix_fmt': (video or {}).get('pix_fmt'),
+        'audio_codec': (audio or {}).get('codec_name'),
+        'audio': audio is not None,
+        'bitrate': _to_int(fmt.get('bit_rate')),
+        'size': _to_int(fmt.get('size')),
+        'format_name': fmt.get('format_name', ''),
+        'streams': [
+            {
+                'index': s.get('index'),
+                'type': s.get('codec_type'),
+                'codec': s.get('codec_name'),
+            }
+            for s in streams
+        ],
+    }
+
+
+async def probe_video(file_path: str) -> dict:
+    """קבלת מידע על קובץ וידאו בקריאה אחת ל-ffprobe"""
+    try:
+        with STAGE_SECONDS.time(stage='probe'):
+            result = await ffmpeg_runner.run(
+                FFPROBE_COMMAND + [file_path],
+                priority=PRIORITY_HIGH,
+                timeout=FFPROBE_TIMEOUT,
+                capture_stdout=True
+            )
+        if not result.ok:
+            STAGE_FAILURES.inc(stage='probe')
+            logger.error(f"שגיאה בקבלת מידע על הווידאו: {result.stderr_tail}")
+            return {}
+        return parse_probe_output(result.stdout.decode(errors='ignore'))
+    except Exception as e:
+        STAGE_FAILURES.inc(stage='probe')
+        logger.error(f"שגיאה בקבלת מידע על הווידאו: {e}")
+        return {}
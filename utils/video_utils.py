@@ -1,32 +1,22 @@
-import os
 import logging
-import subprocess
-from moviepy.editor import VideoFileClip
+from config.settings import FFMPEG_TIMEOUT
+from utils.video_probe import probe_video
+from utils.conversion_planner import plan_conversion, build_convert_command
+from utils.ffmpeg_runner import ffmpeg_runner, PRIORITY_NORMAL
+from utils.thumbnails import thumbnail_engine
 
 logger = logging.getLogger(__name__)
 
-def convert_to_mp4(input_file: str, output_file: str) -> bool:
+async def convert_to_mp4(input_file: str, output_file: str) -> bool:
     """המרת קובץ וידאו לפורמט MP4"""
     try:
-        command = [
-            'ffmpeg', '-i', input_file,
-            '-c:v', 'libx264',  # קודק וידאו
-            '-c:a', 'aac',      # קודק אודיו
-            '-movflags', '+faststart',  # אופטימיזציה להזרמה
-            '-y',  # דריסת קובץ קיים
-            output_file
-        ]
+        mode = plan_conversion(await probe_video(input_file))
+        command = build_convert_command(input_file, output_file, mode)
         
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
+        result = await ffmpeg_runner.run(command, priority=PRIORITY_NORMAL, timeout=FFMPEG_TIMEOUT)
         
-        _, stderr = process.communicate()
-        
-        if process.returncode != 0:
-            logger.error(f"שגיאה בהמרת הקובץ: {stderr.decode()}")
+        if not result.ok:
+            logger.error(f"שגיאה בהמרת הקובץ: {result.stderr_tail}")
             return False
             
         logger.info(f"הקובץ הומר בהצלחה ל-{output_file}")
@@ -36,28 +26,11 @@ def convert_to_mp4(input_file: str, output_file: str) -> bool:
         logger.error(f"שגיאה בהמרת הקובץ: {e}")
         return False
 
-def create_thumbnail(input_file: str, output_file: str, time_offset: float = 1.0) -> bool:
-    """יצירת תמונה ממוזערת מהווידאו"""
+async def create_thumbnail(input_file: str, output_file: str, time_offset: float = 1.0) -> bool:
+    """יצירת תמונה ממוזערת מהווידאו (חיפוש מהיר ל-keyframe והקטנה ל-320 פיקסלים)"""
     try:
-        command = [
-            'ffmpeg', '-i', input_file,
-            '-ss', str(time_offset),
-            '-vframes', '1',
-            '-vf', 'scale=320:-1',  # גודל קבוע לרוחב, גובה יחסי
-            '-y',
-            output_file
-        ]
-        
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        _, stderr = process.communicate()
-        
-        if process.returncode != 0:
-            logger.error(f"שגיאה ביצירת תמונה ממוזערת: {stderr.decode()}")
+        if not await thumbnail_engine.create(input_file, output_file, offsets=(time_offset, 0.0)):
+            logger.error(f"שגיאה ביצירת תמונה ממוזערת: {input_file}")
             return False
             
         logger.info(f"נוצרה תמונה ממוזערת: {output_file}")
@@ -67,18 +40,15 @@ def create_thumbnail(input_file: str, output_file: str, time_offset: float = 1.0
         logger.error(f"שגיאה ביצירת תמונה ממוזערת: {e}")
         return False
 
-def get_video_info(file_path: str) -> dict:
+async def get_video_info(file_path: str) -> dict:
     """קבלת מידע על קובץ הווידאו"""
-    try:
-        with VideoFileClip(file_path) as clip:
-            info = {
-                'duration': int(clip.duration),
-                'width': int(clip.size[0]),
-                'height': int(clip.size[1]),
-                'fps': float(clip.fps),
-                'audio': clip.audio is not None
-            }
-        return info
-    except Exception as e:
-        logger.error(f"שגיאה בקבלת מידע על הווידאו: {e}")
+    info = await probe_video(file_path)
+    if not info:
         return {}
+    return {
+        'duration': info['duration'],
+        'width': info['width'],
+        'height': info['height'],
+        'fps': info['fps'],
+        'audio': info['audio']
+    }
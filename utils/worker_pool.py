@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from typing import Callable, Coroutine, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """
+    מאגר עובדים לעיבוד עבודות במקביל
+    - מגבלה כוללת על מספר העבודות הפעילות
+    - מגבלה נפרדת לכל שלב (הורדה, המרה, העלאה) כדי ששלבים של עבודות שונות יחפפו
+    """
+
+    def __init__(self, max_jobs: int, stage_limits: Dict[str, int],
+                 on_job_done: Optional[Callable[[], None]] = None):
+        self.max_jobs = max(1, max_jobs)
+        self.stage_limits = {name: max(1, limit) for name, limit in stage_limits.items()}
+        self._stages = {name: asyncio.Semaphore(limit) for name, limit in self.stage_limits.items()}
+        self._tasks: Set[asyncio.Task] = set()
+        self.on_job_done = on_job_done
+
+        logger.info(f"WorkerPool initialized: jobs={self.max_jobs}, stages={self.stage_limits}")
+
+    @property
+    def active_jobs(self) -> int:
+        """מספר העבודות הפעילות"""
+        return len(self._tasks)
+
+    def has_capacity(self) -> bool:
+        """בדיקה אם אפשר להתחיל עבודה נוספת"""
+        return len(self._tasks) < self.max_jobs
+
+    def start(self, coro: Coroutine) -> asyncio.Task:
+        """הפעלת עבודה חדשה ברקע"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._job_finished)
+        return task
+
+    def _job_finished(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"עבודה הסתיימה בשגיאה: {task.exception()}")
+        if self.on_job_done:
+            self.on_job_done()
+
+    def stage(self, name: str) -> asyncio.Semaphore:
+        """קבלת המגבלה של שלב מסוים (לשימוש עם async with)"""
+        return self._stages[name]